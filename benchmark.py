@@ -0,0 +1,409 @@
+# benchmark.py
+"""
+生成流程基准测试：合成不同规模的配置与模板，分别计时各环节，结果输出为JSON
+
+用法:
+    python benchmark.py                          # 完整规模，结果写入 build/benchmark_results.json
+    python benchmark.py --quick                  # 小规模快速检查
+    python benchmark.py --only apply,recipe_run  # 只运行部分基准
+    python benchmark.py --baseline old.json      # 与上次结果比较，变慢超过阈值时返回非零
+
+规模维度（每次只改变一个，其余取基准值）:
+    values     每个规则的值数量
+    rules      模板中的规则数量
+    keys       模板大小（JSON键数量）
+    extra      每个规则的额外替换表大小
+    items      BatchItem 数量
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from src.core.engine import ReplacementEngine
+from src.core.localization_engine import LocalizationEngine
+from src.dao.batch_item_dao import BatchItemDAO
+from src.dao.output_writer import OutputWriter
+from src.model.config import Config
+from src.model.template import Template
+from src.service.localizer_service import LocalizerService
+from src.service.recipe_service import RecipeService
+
+RESULT_VERSION = 1
+
+BASELINE = {"values": 20, "rules": 2, "keys": 20, "extra": 10, "items": 100}
+SCALES = {
+    "values": [10, 50, 200],
+    "rules": [1, 2, 3],
+    "keys": [10, 50, 200],
+    "extra": [0, 10, 100],
+    "items": [10, 100, 1000],
+}
+QUICK_BASELINE = {"values": 5, "rules": 2, "keys": 10, "extra": 5, "items": 20}
+QUICK_SCALES = {
+    "values": [5, 20],
+    "rules": [1, 2],
+    "keys": [10, 40],
+    "extra": [0, 20],
+    "items": [20, 100],
+}
+
+# 基准名 → 受影响的规模维度（其余维度不改变结果，不重复测量）
+BENCHMARKS = {
+    "generate_combinations": ("values", "rules"),
+    "apply": ("values", "rules", "keys", "extra"),
+    "generate_batch": ("keys", "extra", "items"),
+    "output_write": ("values", "rules", "keys"),
+    "recipe_run": ("values", "rules", "keys", "extra"),
+    "localizer_run": ("keys", "extra", "items"),
+}
+
+
+# ==================== 合成输入 ====================
+
+def make_rules(params: Dict[str, int]) -> List[Dict[str, Any]]:
+    """合成替换规则：r0..rN，每个规则的值分属两个命名空间，额外替换表为通配符表"""
+    rules = []
+    for r in range(params["rules"]):
+        values = [
+            f"{'minecraft' if v % 2 == 0 else 'benchmod'}:r{r}v{v}"
+            for v in range(params["values"])
+        ]
+        extra = {"*": {f"_p{r}x{i}": f"_q{r}x{i}" for i in range(params["extra"])}} if params["extra"] else {}
+        rules.append({"type": f"r{r}", "values": values, "extra": extra})
+    return rules
+
+
+def make_recipe_template(params: Dict[str, int]) -> str:
+    """合成配方模板：每个键引用全部规则占位符，部分键含可被额外替换命中的模式"""
+    placeholders = "_".join(f"{{r{r}}}" for r in range(params["rules"]))
+    body = {}
+    for k in range(params["keys"]):
+        pattern = f"_p{k % params['rules']}x{k % params['extra']}" if params["extra"] else ""
+        body[f"key{k}"] = f"{{modid}}{placeholders}{pattern}_item{k}"
+    return json.dumps({"type": "minecraft:crafting_shaped", "result": body}, ensure_ascii=False, indent=2)
+
+
+def recipe_template_name(params: Dict[str, int]) -> str:
+    return "_".join(f"{{r{r}}}" for r in range(params["rules"])) + ".json"
+
+
+def make_localization_template(params: Dict[str, int]) -> Dict[str, str]:
+    """合成本地化模板：键引用物品ID，值引用中文名并含可被额外替换命中的模式"""
+    template = {}
+    for k in range(params["keys"]):
+        pattern = f"原木{k % params['extra']}" if params["extra"] else ""
+        template[f"block.bench.{{material_id}}_{{modid_safe}}key{k}"] = f"{{material_zh_cn}}{pattern}物品{k}"
+    return template
+
+
+def make_batch_items(params: Dict[str, int]) -> Dict[str, List[Dict[str, Any]]]:
+    replacements = {f"原木{i}": f"木{i}" for i in range(params["extra"])}
+    return {"items": [
+        {
+            "id": f"{'minecraft' if i % 2 == 0 else 'benchmod'}:item{i}",
+            "zh_cn": f"物品{i}",
+            "namespace": "minecraft:" if i % 2 == 0 else "benchmod:",
+            "replacements": replacements,
+        }
+        for i in range(params["items"])
+    ]}
+
+
+class Workspace:
+    """一组规模参数对应的临时目录：模板、配置、BatchItem 文件"""
+
+    def __init__(self, params: Dict[str, int]):
+        self.params = params
+        self.root = Path(tempfile.mkdtemp(prefix="recipe_bench_"))
+        self.template_dir = self.root / "templates"
+        self.template_dir.mkdir()
+        self.output_dir = self.root / "output"
+
+        self.recipe_name = recipe_template_name(params)
+        (self.template_dir / self.recipe_name).write_text(make_recipe_template(params), encoding="utf-8")
+        (self.template_dir / "localization.json").write_text(
+            json.dumps(make_localization_template(params), ensure_ascii=False, indent=2), encoding="utf-8")
+        (self.root / "batch_items.json").write_text(
+            json.dumps(make_batch_items(params), ensure_ascii=False), encoding="utf-8")
+
+        self.rules = make_rules(params)
+        self.recipe_config = self._write_config("recipe_config.json", [self.recipe_name])
+        self.localizer_config = self._write_config("localizer_config.json", ["localization.json"])
+
+    def _write_config(self, filename: str, template_files: List[str]) -> Path:
+        path = self.root / filename
+        data = {
+            "output_dir": str(self.output_dir),
+            "template_dir": str(self.template_dir),
+            "default_namespace": "minecraft:",
+            "template_files": template_files,
+            "replacements": self.rules,
+        }
+        path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        return path
+
+    def config(self) -> Config:
+        return Config({"default_namespace": "minecraft:", "replacements": self.rules})
+
+    def recipe_template(self) -> Template:
+        return Template(self.template_dir / self.recipe_name)
+
+    def clear_output(self) -> None:
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+
+    def cleanup(self) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+# ==================== 计时 ====================
+
+def measure(setup: Callable[[], Any], run: Callable[[Any], int], repeat: int) -> Dict[str, Any]:
+    """
+    重复执行 run(setup()) 并计时（setup 不计入）
+    run 返回本次处理的单位数（组合/文件/物品），用于计算吞吐量
+    """
+    timings = []
+    units = 0
+    for _ in range(repeat):
+        state = setup()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            units = run(state)
+            timings.append(time.perf_counter() - start)
+    best = min(timings)
+    return {
+        "seconds": best,
+        "runs": timings,
+        "units": units,
+        "units_per_sec": units / best if best > 0 else None,
+    }
+
+
+def bench_generate_combinations(ws: Workspace, repeat: int) -> Dict[str, Any]:
+    config = ws.config()
+    template = ws.recipe_template()
+    return measure(
+        lambda: ReplacementEngine(config.default_namespace, config.rules),
+        lambda engine: len(engine.generate_combinations(template)),
+        repeat,
+    )
+
+
+def bench_apply(ws: Workspace, repeat: int) -> Dict[str, Any]:
+    """渲染全部组合（每次使用新引擎，计入模板编译与分解的开销）"""
+    config = ws.config()
+    template = ws.recipe_template()
+    combos = ReplacementEngine(config.default_namespace, config.rules).generate_combinations(template)
+
+    def run(engine: ReplacementEngine) -> int:
+        for combo in combos:
+            engine.apply(template.content, combo)
+        return len(combos)
+
+    return measure(lambda: ReplacementEngine(config.default_namespace, config.rules), run, repeat)
+
+
+def bench_generate_batch(ws: Workspace, repeat: int) -> Dict[str, Any]:
+    config = ws.config()
+    items = BatchItemDAO.load(str(ws.root))
+
+    def setup() -> LocalizationEngine:
+        with contextlib.redirect_stdout(io.StringIO()):
+            engine = LocalizationEngine(config.default_namespace, config.rules, items)
+            engine.load_templates(ws.template_dir, "localization.json")
+        return engine
+
+    return measure(setup, lambda engine: len(engine.generate_batch("localization.json")), repeat)
+
+
+def bench_output_write(ws: Workspace, repeat: int) -> Dict[str, Any]:
+    """写入全部渲染结果（默认 normalized 格式，含JSON解析与重新格式化）"""
+    config = ws.config()
+    template = ws.recipe_template()
+    engine = ReplacementEngine(config.default_namespace, config.rules)
+    outputs = [
+        (engine.apply(template.path.name, combo), engine.apply(template.content, combo))
+        for combo in engine.iter_combinations(template)
+    ]
+
+    def setup() -> OutputWriter:
+        ws.clear_output()
+        writer = OutputWriter(ws.output_dir)
+        writer.begin_run()
+        return writer
+
+    def run(writer: OutputWriter) -> int:
+        for filename, content in outputs:
+            writer.write(filename.replace(":", "_"), content)
+        writer.finish()
+        return len(outputs)
+
+    return measure(setup, run, repeat)
+
+
+def bench_recipe_run(ws: Workspace, repeat: int) -> Dict[str, Any]:
+    """完整的 RecipeService 运行：加载配置、模板，渲染并写入"""
+    def setup() -> RecipeService:
+        ws.clear_output()
+        service = RecipeService()
+        service.on_progress = lambda message: None
+        return service
+
+    def run(service: RecipeService) -> int:
+        if not service.load_config_from_file(str(ws.recipe_config)) or not service.run():
+            raise RuntimeError("RecipeService 运行失败")
+        return service.output_writer.get_stats()["total"]
+
+    return measure(setup, run, repeat)
+
+
+def bench_localizer_run(ws: Workspace, repeat: int) -> Dict[str, Any]:
+    """完整的 LocalizerService 运行：加载配置、BatchItem、模板，生成并写入"""
+    def setup() -> LocalizerService:
+        ws.clear_output()
+        service = LocalizerService(config_path=str(ws.localizer_config))
+        service.set_callbacks(on_progress=lambda message: None)
+        return service
+
+    def run(service: LocalizerService) -> int:
+        if not service.reload_config() or not service.start_generation("localization.json"):
+            raise RuntimeError("LocalizerService 运行失败")
+        return service.stats["successful_items"]
+
+    return measure(setup, run, repeat)
+
+
+RUNNERS = {
+    "generate_combinations": bench_generate_combinations,
+    "apply": bench_apply,
+    "generate_batch": bench_generate_batch,
+    "output_write": bench_output_write,
+    "recipe_run": bench_recipe_run,
+    "localizer_run": bench_localizer_run,
+}
+
+
+# ==================== 执行与比较 ====================
+
+def plan_cases(baseline: Dict[str, int], scales: Dict[str, List[int]],
+               names: List[str]) -> List[Dict[str, Any]]:
+    """每个基准在其相关维度上逐一改变规模（基准值只测一次）"""
+    cases = []
+    for name in names:
+        seen = set()
+        for dimension in BENCHMARKS[name]:
+            for value in scales[dimension]:
+                params = dict(baseline, **{dimension: value})
+                key = tuple(sorted(params.items()))
+                if key in seen:
+                    continue
+                seen.add(key)
+                cases.append({"benchmark": name, "dimension": dimension, "params": params})
+    return cases
+
+
+def case_id(case: Dict[str, Any]) -> str:
+    """结果的稳定标识：基准名 + 规模参数"""
+    params = ",".join(f"{k}={v}" for k, v in sorted(case["params"].items()))
+    return f"{case['benchmark']}[{params}]"
+
+
+def run_cases(cases: List[Dict[str, Any]], repeat: int) -> List[Dict[str, Any]]:
+    results = []
+    workspaces: Dict[tuple, Workspace] = {}
+    try:
+        for case in cases:
+            key = tuple(sorted(case["params"].items()))
+            ws = workspaces.get(key)
+            if ws is None:
+                ws = workspaces[key] = Workspace(case["params"])
+            result = {"id": case_id(case), **case, **RUNNERS[case["benchmark"]](ws, repeat)}
+            results.append(result)
+            rate = f"{result['units_per_sec']:.0f}/s" if result["units_per_sec"] else "-"
+            print(f"  {result['id']:<75} {result['seconds'] * 1000:9.2f} ms  {rate}")
+    finally:
+        for ws in workspaces.values():
+            ws.cleanup()
+    return results
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: Path, threshold: float) -> List[str]:
+    """与历史结果比较，返回变慢超过阈值的基准描述"""
+    with baseline_path.open("r", encoding="utf-8") as f:
+        previous = {r["id"]: r for r in json.load(f).get("results", [])}
+
+    regressions = []
+    for result in results:
+        old = previous.get(result["id"])
+        if not old or not old.get("seconds"):
+            continue
+        ratio = result["seconds"] / old["seconds"]
+        if ratio > 1 + threshold:
+            regressions.append(f"{result['id']}: {old['seconds'] * 1000:.2f} ms → "
+                               f"{result['seconds'] * 1000:.2f} ms (x{ratio:.2f})")
+    return regressions
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="MC Recipe Generator 基准测试")
+    parser.add_argument("--output", default="build/benchmark_results.json",
+                        help="结果JSON路径（默认在 build/ 下，不计入版本库）")
+    parser.add_argument("--quick", action="store_true", help="小规模快速运行")
+    parser.add_argument("--repeat", type=int, default=3, help="每个用例重复次数（取最快一次）")
+    parser.add_argument("--only", default="", help=f"只运行指定基准，逗号分隔: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--baseline", default=None, help="历史结果JSON，用于检测性能回退")
+    parser.add_argument("--threshold", type=float, default=0.2, help="判定回退的变慢比例（默认 0.2 即 20%%）")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    names = [name.strip() for name in args.only.split(",") if name.strip()] or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        print(f"❌ 未知的基准: {', '.join(unknown)}")
+        return 2
+
+    baseline, scales = (QUICK_BASELINE, QUICK_SCALES) if args.quick else (BASELINE, SCALES)
+    cases = plan_cases(baseline, scales, names)
+    print(f"🚀 运行 {len(cases)} 个基准用例（每个重复 {args.repeat} 次）")
+    results = run_cases(cases, max(1, args.repeat))
+
+    report = {
+        "version": RESULT_VERSION,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "quick": args.quick,
+        "repeat": args.repeat,
+        "baseline": baseline,
+        "results": results,
+    }
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with output.open("w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"✅ 结果已写入: {args.output}")
+
+    if args.baseline:
+        regressions = compare(results, Path(args.baseline), args.threshold)
+        if regressions:
+            print(f"⚠️  {len(regressions)} 个用例变慢超过 {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"   {line}")
+            return 1
+        print("✅ 未发现性能回退")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,85 @@
-
 import sys
+import argparse
 from pathlib import Path
+from typing import Tuple
 from src.service.recipe_service import RecipeService  # ✅ 更新导入
 
+
+def parse_shard(text: str) -> Tuple[int, int]:
+    """解析 --shard 参数: "i/N" → (i, N)，i 从 0 开始"""
+    try:
+        index, count = (int(part) for part in text.split("/", 1))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"分片格式应为 i/N: {text}")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"分片编号越界: {text}")
+    return index, count
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="MC Recipe Generator 命令行入口")
+    parser.add_argument("config", nargs="?", default="config.json", help="配置文件路径")
+    parser.add_argument("--dry-run", action="store_true", help="预览模式，不写入文件")
+    parser.add_argument("--explain", action="store_true", help="解释模式，输出替换详情")
+    parser.add_argument("--explain-every", type=int, default=None,
+                        help="解释模式每 N 个组合记录一个（默认读取配置中的 explain_every）")
+    parser.add_argument("--explain-values", default=None,
+                        help="解释模式只记录含这些值的组合，逗号分隔（完整值或纯名称）")
+    parser.add_argument("--explain-output", default=None,
+                        help="解释事件写入 NDJSON 文件而不是日志")
+    parser.add_argument("--shard", type=parse_shard, default=None,
+                        help="只生成第 i 片（共 N 片），格式 i/N，i 从 0 开始")
+    parser.add_argument("--start-index", type=int, default=0,
+                        help="从全局组合编号开始生成（中断后续跑）")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="并行渲染进程数（默认读取配置中的 jobs）")
+    parser.add_argument("--profile", action="store_true",
+                        help="性能分析：在输出目录写入 .pstats 和折叠栈文件（可用于火焰图）")
+    parser.add_argument("--watch", action="store_true",
+                        help="监视模式：配置或模板变化时只重新生成受影响的模板（Ctrl+C 退出）")
+    parser.add_argument("--watch-interval", type=float, default=0.5,
+                        help="监视模式在没有 inotify 时的轮询间隔（秒）")
+    return parser
+
+
 def main():
     # 配置路径（默认或命令行参数）
-    config_path = sys.argv[1] if len(sys.argv) > 1 else "config.json"
-    
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.watch and (args.shard is not None or args.start_index or args.profile):
+        parser.error("--watch 不能与 --shard / --start-index / --profile 同时使用")
+
     try:
         # ✅ 更新：使用 RecipeService
-        service = RecipeService(config_path)
-        service.run(dry_run=False, explain_mode=False)
+        service = RecipeService()
+        if not service.load_config_from_file(args.config):
+            sys.exit(1)
+
+        # 命令行的解释模式选项覆盖配置（监视模式重新加载配置后仍然生效）
+        overrides = {}
+        if args.explain_every is not None:
+            overrides["explain_every"] = max(1, args.explain_every)
+        if args.explain_values is not None:
+            overrides["explain_values"] = [v.strip() for v in args.explain_values.split(",") if v.strip()]
+        if args.explain_output is not None:
+            overrides["explain_output"] = args.explain_output
+        service.override_config(**overrides)
+
+        if args.watch:
+            service.watch(args.config, dry_run=args.dry_run, explain_mode=args.explain,
+                          jobs=args.jobs, interval=args.watch_interval)
+            return
+
+        success = service.run(
+            dry_run=args.dry_run,
+            explain_mode=args.explain,
+            shard=args.shard,
+            start_index=args.start_index,
+            jobs=args.jobs,
+            profile=args.profile,
+        )
+        if not success:
+            sys.exit(1)
     except Exception as e:
         print(f"❌ 错误: {e}")
         import traceback
@@ -18,4 +87,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
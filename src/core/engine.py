@@ -1,6 +1,23 @@
 
+import hashlib
 import itertools
-from typing import Dict, List, Tuple, Optional
+import json
+import re
+from typing import Dict, Iterable, Iterator, List, Set, Tuple, Optional, Union
+
+from src.core.factorized_plan import FactorizedPlan
+from src.core.matcher import MultiReplacer
+from src.core.pattern_reach import can_occur, overlaps
+from src.core.render_plan import JSON_SIGNIFICANT, RenderPlan, is_slot_key
+from src.core.rule_index import IndexedRule, build_rule_index
+from src.core.trace import TraceEvent
+from src.model.template import Template
+
+
+def _has_brace(text: str) -> bool:
+    """文本含花括号时代入模板可能拼出新的占位符"""
+    return "{" in text or "}" in text
+
 
 class ReplacementEngine:
     """
@@ -8,46 +25,723 @@ class ReplacementEngine:
     依赖：仅依赖 model.ReplacementRule
     """
     
-    def __init__(self, default_namespace: str, rules: List):
+    def __init__(self, default_namespace: str, rules: List, constraints: Optional[List] = None):
+        """
+        参数:
+            default_namespace: 默认命名空间
+            rules: 替换规则（同类型的启用规则合并，未启用的规则忽略）
+            constraints: 组合约束（model.CombinationConstraint），枚举组合时剪枝
+        """
         self.default_ns = default_namespace
-        self.rules = {r.type: r for r in rules}  # 建立索引
+        self.rules: Dict[str, IndexedRule] = build_rule_index(rules)  # 类型 → 合并后的规则
+        self.constraints = list(constraints or [])
+        self._checks: Dict[tuple, Dict[int, List[Tuple]]] = {}  # (模板名, 规则类型) → 约束检查表
+        self._plans: Dict[str, RenderPlan] = {}  # 模板文本 → 渲染计划
+        self._resolved: Dict[str, Tuple[str, str, str]] = {}  # 值 → (名称, 命名空间, 安全前缀)
+        self._matchers: Dict[Tuple[str, str], MultiReplacer] = {}  # (规则, 值) → 替换器
+        self._digests: Dict[object, str] = {}  # 模板文本 / (规则, 值) → 内容摘要
+        self._json_safe: Dict[tuple, bool] = {}  # (模板文本, 规则, 值) → 替换后是否仍为有效JSON
+        self._factorized: Dict[tuple, Optional[FactorizedPlan]] = {}  # (模板文本, 规则类型) → 分解计划
+        self._pending_hits: Dict[Tuple[str, str, str], int] = {}  # 其他进程并入的额外替换命中
+        self._live: Dict[tuple, Optional[Dict]] = {}  # (模板文本, 规则类型) → 各规则可能命中的模式
+        self._pruned_matchers: Dict[tuple, MultiReplacer] = {}  # (规则, 值, 保留的模式) → 替换器
+        self._precompute()
 
-    def generate_combinations(self, template) -> List[Dict]:
-        """根据模板占位符生成笛卡尔积组合"""
-        needed = set(template.placeholders)
-        active_rules = [self.rules[t] for t in needed if t in self.rules]
+    def _precompute(self) -> None:
+        """预计算所有启用规则的值解析结果与合并后的替换表（与模板无关，只做一次）"""
+        for r_type, rule in self.rules.items():
+            for value in rule.values:
+                self._matcher_for(r_type, value)
+
+    def update_rules(self, rules: List, constraints: Optional[List] = None) -> Set[str]:
+        """
+        换入新的规则和约束（监视模式下配置变化时），只丢弃受影响规则类型的缓存，其余缓存保持
+        返回: 值列表或额外替换表有变化的规则类型；规则类型的先后顺序变化时为全部类型
+              （额外替换按类型顺序依次执行，顺序影响所有组合的结果）
+        """
+        old, new = self.rules, build_rule_index(rules)
+        if [t for t in old if t in new] != [t for t in new if t in old]:
+            changed = set(old) | set(new)
+        else:
+            changed = {
+                t for t in set(old) | set(new)
+                if t not in old or t not in new or not self._same_rule(old[t], new[t])
+            }
+        self.rules = new
+        self.constraints = list(constraints or [])
+        self._checks = {}  # 约束检查表按需重建，开销很小
+        
+        def unaffected(types) -> bool:
+            return changed.isdisjoint(types)
+        
+        self._matchers = {k: m for k, m in self._matchers.items() if k[0] not in changed}
+        self._pruned_matchers = {k: m for k, m in self._pruned_matchers.items() if k[0] not in changed}
+        self._digests = {k: d for k, d in self._digests.items() if isinstance(k, str) or k[0] not in changed}
+        self._json_safe = {k: v for k, v in self._json_safe.items() if k[1] not in changed}
+        self._factorized = {k: p for k, p in self._factorized.items() if unaffected(k[1])}
+        self._live = {k: v for k, v in self._live.items() if unaffected(k[1])}
+        self._precompute()
+        return changed
+
+    def retain_texts(self, texts: Iterable[str]) -> int:
+        """
+        丢弃按模板文本缓存、但已不属于这些文本的条目（渲染计划、分解计划、JSON与命中分析、文本摘要）
+        监视模式下模板每次编辑都产生新文本，每轮生成前调用，缓存不随编辑次数增长
+        保留给定文本、其格式化后的文本以及它们的子串（分解时切出的片段）
+        返回: 丢弃的条目数
+        """
+        texts = [text for text in texts if text]
+        for text in list(texts):
+            plan = self._plans.get(text)
+            normalized = plan.normalized_text if plan is not None else None
+            if normalized:
+                texts.append(normalized)
+        corpus = "\0".join(texts)
+        current: Dict[str, bool] = {}
         
+        def keep(text: str) -> bool:
+            kept = current.get(text)
+            if kept is None:
+                kept = current[text] = text in corpus
+            return kept
+        
+        before = sum(map(len, (self._plans, self._digests, self._json_safe, self._factorized, self._live)))
+        self._plans = {k: p for k, p in self._plans.items() if keep(k)}
+        self._digests = {k: d for k, d in self._digests.items() if not isinstance(k, str) or keep(k)}
+        self._json_safe = {k: v for k, v in self._json_safe.items() if keep(k[0])}
+        self._factorized = {k: p for k, p in self._factorized.items() if keep(k[0])}
+        self._live = {k: v for k, v in self._live.items() if keep(k[0])}
+        return before - sum(map(len, (self._plans, self._digests, self._json_safe, self._factorized, self._live)))
+
+    @staticmethod
+    def _same_rule(a: IndexedRule, b: IndexedRule) -> bool:
+        """合并后的两条规则是否产生相同的替换（值列表及每个值生效的额外替换表都相同）"""
+        return (a.values == b.values
+                and a.default.extra == b.default.extra
+                and all(a.extra_for(v) == b.extra_for(v) for v in a.values))
+
+    def inspect_value(self, value: str, r_type: Optional[str] = None) -> Dict[str, Dict]:
+        """
+        查看某个值的预计算结果（调试用）
+        参数:
+            value: 规则值，如 "biomesoplenty:fir"
+            r_type: 规则类型，None 表示所有列出该值的规则（都未列出时取全部规则）
+        返回:
+            {规则类型: {"name", "namespace", "safe_prefix", "replacements"}}
+            replacements 为 {旧串: {"new": 新串, "source": 来源表}}，按生效优先级合并
+            来源表: full_value（完整值）/ name（纯名称）/ wildcard（通配符）
+        """
+        if r_type is not None:
+            types = [r_type] if r_type in self.rules else []
+        else:
+            types = [t for t, rule in self.rules.items() if value in rule.values] or list(self.rules)
+        
+        report = {}
+        for t in types:
+            name, namespace, safe_prefix = self._resolve_cached(value)
+            matcher = self._matcher_for(t, value)
+            report[t] = {
+                "name": name,
+                "namespace": namespace,
+                "safe_prefix": safe_prefix,
+                "replacements": {
+                    old: {"new": new, "source": tag}
+                    for old, (new, tag) in matcher.entries.items()
+                },
+            }
+        return report
+
+    def generate_combinations(self, template) -> List[Dict]:
+        """根据模板占位符生成笛卡尔积组合（一次性物化，仅供兼容旧调用）"""
+        return list(self.iter_combinations(template))
+
+    def iter_combinations(self, template, start: int = 0, stop: Optional[int] = None,
+                          pruned: Optional[Dict[str, int]] = None) -> Iterator[Dict]:
+        """
+        惰性枚举笛卡尔积组合（内存占用与组合总数无关）
+        规则按占位符在模板中首次出现的顺序排列，保证跨进程顺序稳定
+        参数:
+            start/stop: 组合编号区间 [start, stop)，从 start 直接解码起点，不枚举之前的组合
+            pruned: 传入字典时累加各约束剪掉的组合数 {约束名: 数量}
+        """
+        for _, combo in self.iter_indexed_combinations(template, start, stop, pruned):
+            yield combo
+
+    def iter_indexed_combinations(self, template, start: int = 0, stop: Optional[int] = None,
+                                  pruned: Optional[Dict[str, int]] = None) -> Iterator[Tuple[int, Dict]]:
+        """
+        同 iter_combinations，同时给出每个组合的编号
+        编号始终是完整笛卡尔积中的位置：被约束剪掉的组合不产出，但不改变其余组合的编号，
+        因此分片和续跑编号与是否配置约束无关
+        """
+        active_rules = self._active_rules(template)
         if not active_rules:
-            return []
+            return
         
-        value_lists = [r.values for r in active_rules]
         type_names = [r.type for r in active_rules]
+        value_lists = [r.values for r in active_rules]
+        total = self.count_combinations(template)
+        start = max(start, 0)
+        stop = total if stop is None else min(stop, total)
+        checks = self._constraint_checks(template, active_rules)
+        if start == 0 and stop == total and not checks:
+            for index, combo in enumerate(itertools.product(*value_lists)):
+                yield index, dict(zip(type_names, combo))
+            return
         
-        return [
-            dict(zip(type_names, combo))
-            for combo in itertools.product(*value_lists)
-        ]
+        # 混合进制里程表：从 start 解码后逐个进位
+        radices = [len(values) for values in value_lists]
+        # 某一位之后所有位构成的子树大小，剪枝时整棵子树一起跳过
+        subtree = [1] * len(radices)
+        for pos in range(len(radices) - 2, -1, -1):
+            subtree[pos] = subtree[pos + 1] * radices[pos + 1]
+        
+        digits = self._decode_index(start, radices)
+        changed = 0  # 上次前进后发生变化的最高位，只需重新检查该位及之后生效的约束
+        index = start
+        while index < stop:
+            violated = None
+            for depth in range(changed, len(radices)):
+                for name, when, include, exclude in checks.get(depth, ()):
+                    if (all(digits[p] in allowed for p, allowed in when)
+                            and (any(digits[p] not in allowed for p, allowed in include)
+                                 or any(digits[p] in denied for p, denied in exclude))):
+                        violated = (depth, name)
+                        break
+                if violated:
+                    break
+            
+            if violated is None:
+                yield index, {t: values[d] for t, values, d in zip(type_names, value_lists, digits)}
+                pos = len(digits) - 1
+                index += 1
+            else:
+                # 剪掉当前位所在的整棵子树，直接进位到下一棵
+                pos, name = violated
+                skip = subtree[pos] - index % subtree[pos]
+                if pruned is not None:
+                    pruned[name] = pruned.get(name, 0) + min(skip, stop - index)
+                index += skip
+                for lower in range(pos + 1, len(digits)):
+                    digits[lower] = 0
+            
+            # 在 pos 位加一并向高位进位
+            while pos >= 0:
+                digits[pos] += 1
+                if digits[pos] < radices[pos]:
+                    break
+                digits[pos] = 0
+                pos -= 1
+            changed = max(pos, 0)
+
+    def _constraint_checks(self, template, active_rules: List) -> Dict[int, List[Tuple]]:
+        """
+        把作用于该模板的约束编译为按位检查表（按模板名和规则缓存）
+        返回: {生效位: [(约束名, when, include, exclude)]}，生效位为约束引用的最低位，
+              各条件为 [(位, 允许/禁止的值下标集合)]
+        """
+        if not self.constraints:
+            return {}
+        type_names = tuple(r.type for r in active_rules)
+        key = (template.path.name, type_names)
+        checks = self._checks.get(key)
+        if checks is not None:
+            return checks
+        
+        positions = {t: pos for pos, t in enumerate(type_names)}
+        checks = {}
+        for number, constraint in enumerate(self.constraints, 1):
+            if not constraint.applies_to(template.path.name):
+                continue
+            if not (constraint.include or constraint.exclude):
+                continue
+            if any(t not in positions for t in constraint.types):
+                continue
+            
+            def index_sets(condition: Dict[str, List[str]]) -> List[Tuple[int, frozenset]]:
+                return [
+                    (positions[t], self._value_indexes(active_rules[positions[t]].values, listed))
+                    for t, listed in condition.items()
+                ]
+            
+            depth = max(positions[t] for t in constraint.types)
+            checks.setdefault(depth, []).append((
+                constraint.name or f"#{number}",
+                index_sets(constraint.when),
+                index_sets(constraint.include),
+                index_sets(constraint.exclude),
+            ))
+        self._checks[key] = checks
+        return checks
+
+    def _value_indexes(self, values: List[str], listed: List[str]) -> frozenset:
+        """规则值列表中与约束列出的值（完整值或纯名称）匹配的下标"""
+        listed = set(listed)
+        return frozenset(
+            i for i, value in enumerate(values)
+            if value in listed or self._resolve_cached(value)[0] in listed
+        )
+
+    def combination_at(self, template, index: int) -> Dict:
+        """
+        按编号直接取组合（混合进制解码，首个规则为最高位）
+        与 iter_combinations 的枚举顺序一致
+        """
+        total = self.count_combinations(template)
+        if not 0 <= index < total:
+            raise IndexError(f"组合编号越界: {index} (共 {total} 个)")
+        
+        active_rules = self._active_rules(template)
+        digits = self._decode_index(index, [len(r.values) for r in active_rules])
+        return {r.type: r.values[d] for r, d in zip(active_rules, digits)}
+
+    @staticmethod
+    def _decode_index(index: int, radices: List[int]) -> List[int]:
+        """把编号解码为各规则的值下标"""
+        digits = [0] * len(radices)
+        for pos in range(len(radices) - 1, -1, -1):
+            index, digits[pos] = divmod(index, radices[pos])
+        return digits
+
+    def count_combinations(self, template) -> int:
+        """组合总数：各规则值列表长度之积，不枚举任何组合"""
+        active_rules = self._active_rules(template)
+        if not active_rules:
+            return 0
+        
+        total = 1
+        for rule in active_rules:
+            total *= len(rule.values)
+        return total
+
+    def _active_rules(self, template) -> List:
+        """模板用到的规则（按占位符出现顺序，去重）"""
+        return [self.rules[t] for t in dict.fromkeys(template.placeholders) if t in self.rules]
+
+    def compile(self, template: Union[str, Template]) -> RenderPlan:
+        """
+        编译模板为渲染计划（按文本缓存，同一模板只切分一次）
+        Template 对象上已有的计划直接复用，新编译的计划也挂到模板上（模板注册表中的模板跨引擎共享）
+        参数:
+            template: Template对象或模板文本
+        """
+        if isinstance(template, str):
+            text, cached = template, None
+        else:
+            text, cached = template.content, template.plan
+        plan = self._plans.get(text)
+        if plan is None:
+            plan = cached if cached is not None and cached.text == text else RenderPlan(text)
+            self._plans[text] = plan
+        if not isinstance(template, str):
+            template.plan = plan
+        return plan
+
+    def factorize(self, template: Union[str, Template], types: Tuple[str, ...]) -> Optional[FactorizedPlan]:
+        """
+        把模板分解为只依赖部分规则的片段，每个片段按其依赖规则的取值预先渲染
+        输出为各片段查表结果的拼接，与 apply() 逐字节一致
+        
+        片段在字面量中的每个引号之后切开；没有任何额外替换模式含引号，因此替换不会跨越切点
+        片段依赖：其中槽位对应的规则（{modid} 依赖首个规则），以及额外替换模式可能在片段中命中的规则
+        参数:
+            types: 组合中的规则类型（按组合顺序）
+        返回: 分解计划；无法分解或分解后片段总数不少于组合数一半时返回 None
+        """
+        text = template if isinstance(template, str) else template.content
+        if not types or any(t not in self.rules or t in ("modid", "modid_safe") for t in types):
+            return None
+        value_lists = {t: self.rules[t].values for t in types}
+        total = 1
+        for values in value_lists.values():
+            total *= len(values)
+        if total <= 2 * sum(len(values) for values in value_lists.values()):
+            return None
+        if self.compile(text).may_chain or not all(self._factorizable(t) for t in types):
+            return None
+        
+        live = self._live_patterns(text, tuple(types))
+        scanners = {t: self._pattern_scanner(t, live) for t in types}
+        budget = total // 2
+        fragments = []
+        fragment_hits = []  # 与 fragments 对应的预渲染命中，片段被使用时计入统计
+        for chunk in self._split_chunks(self.compile(text)):
+            deps = {key for key in chunk.slot_keys if key in value_lists}
+            if chunk.slot_keys & {"modid", "modid_safe"}:
+                deps.add(types[0])
+            # 依赖集合扩大到不再有其他规则的替换模式能命中为止
+            while True:
+                key_types = tuple(t for t in types if t in deps)
+                size = 1
+                for t in key_types:
+                    size *= len(value_lists[t])
+                budget -= size
+                if budget < 0:
+                    return None
+                table, texts, hits = self._render_fragment(chunk, types[0], key_types, value_lists, live)
+                affecting = {
+                    u for u in types
+                    if u not in deps and scanners[u] is not None
+                    and any(scanners[u].search(t) for t in texts)
+                }
+                if not affecting:
+                    break
+                budget += size
+                deps |= affecting
+            
+            # 依赖相同的相邻片段合并为一个
+            if fragments and fragments[-1][0] == key_types:
+                previous = fragments[-1][1]
+                table = {key: previous[key] + part for key, part in table.items()}
+                fragments[-1] = (key_types, table)
+                previous_hits = fragment_hits[-1]
+                fragment_hits[-1] = {
+                    key: previous_hits.get(key, []) + hits.get(key, [])
+                    for key in previous_hits.keys() | hits.keys()
+                }
+            else:
+                fragments.append((key_types, table))
+                fragment_hits.append(hits)
+        return FactorizedPlan(tuple(types), fragments, fragment_hits)
+
+    def _factorizable(self, r_type: str) -> bool:
+        """规则的所有值都能走渲染计划，且额外替换模式不含引号（保证不跨越片段切点）"""
+        if not is_slot_key(r_type):
+            return False
+        for value in self.rules[r_type].values:
+            name, namespace, _ = self._resolve_cached(value)
+            if _has_brace(name) or _has_brace(namespace):
+                return False
+            if any('"' in old for old in self._matcher_for(r_type, value).entries):
+                return False
+        return True
+
+    def _pattern_scanner(self, r_type: str, live: Optional[Dict] = None):
+        """规则所有值（在该模板中可能命中）的额外替换模式合成一个正则，用于判断是否可能命中某段文本"""
+        patterns = {
+            old
+            for value in self.rules[r_type].values
+            for old in self._live_matcher(r_type, value, live).entries
+        }
+        if not patterns:
+            return None
+        return re.compile("|".join(re.escape(old) for old in sorted(patterns, key=len, reverse=True)))
+
+    def _split_chunks(self, plan: RenderPlan) -> List[RenderPlan]:
+        """在字面量中每个引号之后切开模板（槽位名不含引号，切点不会落在槽位内）"""
+        chunks = []
+        current: List[str] = []
+        for piece in plan.pieces:
+            parts = piece.split('"')
+            for part in parts[:-1]:
+                current.append(part + '"')
+                chunks.append(self.compile("".join(current)))
+                current = []
+            if parts[-1]:
+                current.append(parts[-1])
+        if current:
+            chunks.append(self.compile("".join(current)))
+        return chunks
+
+    def _render_fragment(self, chunk: RenderPlan, first_type: str, key_types: Tuple[str, ...],
+                         value_lists: Dict[str, List[str]],
+                         live: Optional[Dict] = None) -> Tuple[Dict[Tuple[str, ...], str], set, Dict]:
+        """
+        按依赖规则的每种取值渲染片段（基础替换 + 这些规则在该模板中可能命中的额外替换）
+        预渲染不计入替换命中统计，命中单独返回，由分解计划在片段被使用时计数
+        返回: ({取值元组: 结果}, 渲染过程中出现过的所有中间文本,
+               {取值元组: [(规则类型, 值, 旧串, 次数)]}（只含有命中的取值）)
+        """
+        table = {}
+        texts = set()
+        hits = {}
+        for values in itertools.product(*(value_lists[t] for t in key_types)):
+            assignment = dict(zip(key_types, values))
+            slot_values = {t: self._resolve_cached(v)[0] for t, v in assignment.items()}
+            if first_type in assignment:
+                modid = self._resolve_cached(assignment[first_type])[1]
+                slot_values["modid"] = modid
+                slot_values["modid_safe"] = "" if modid == "minecraft:" else modid.replace(":", "_")
+            result = chunk.render(slot_values)
+            texts.add(result)
+            found = []
+            for r_type in self.rules:
+                if r_type in assignment:
+                    counts: Dict[str, int] = {}
+                    matcher = self._live_matcher(r_type, assignment[r_type], live)
+                    result = matcher.apply_uncounted(result, counts)
+                    texts.add(result)
+                    found.extend((r_type, assignment[r_type], old, n) for old, n in counts.items())
+            table[values] = result
+            if found:
+                hits[values] = found
+        return table, texts, hits
+
+    # ==================== 额外替换命中统计 ====================
 
-    def apply(self, content: str, combo: Dict, explain_log: Optional[List] = None) -> str:
-        """执行所有替换逻辑"""
+    def take_rule_hits(self) -> Dict[Tuple[str, str, str], int]:
+        """
+        取出自上次调用以来的额外替换命中 {(规则类型, 值, 旧串): 次数}，并清零计数
+        包括完整渲染中的命中、分解计划中片段被使用时的命中，以及 merge_rule_hits 并入的命中
+        渲染缓存命中的组合没有实际执行替换，不计入
+        """
+        counts = self._pending_hits
+        self._pending_hits = {}
+        matchers = itertools.chain(
+            self._matchers.items(),
+            (((r_type, value), matcher) for (r_type, value, _), matcher in self._pruned_matchers.items()),
+        )
+        for (r_type, value), matcher in matchers:
+            for old, n in matcher.hits.items():
+                key = (r_type, value, old)
+                counts[key] = counts.get(key, 0) + n
+            matcher.hits.clear()
+        for plan in self._factorized.values():
+            if plan is not None:
+                for key, n in plan.take_hits().items():
+                    counts[key] = counts.get(key, 0) + n
+        return counts
+
+    def merge_rule_hits(self, counts: Dict[Tuple[str, str, str], int]) -> None:
+        """并入其他进程（渲染进程池）取出的命中"""
+        for key, n in counts.items():
+            self._pending_hits[key] = self._pending_hits.get(key, 0) + n
+
+    def rule_hit_report(self, counts: Dict[Tuple[str, str, str], int], top: int = 10,
+                        reachable: Optional[Dict[str, Optional[Set[str]]]] = None) -> Dict:
+        """
+        把命中计数对应到配置中的额外替换条目（启用规则的 extra[键][旧串]）
+        参数:
+            reachable: 部分组合没有实际渲染时（增量跳过、沿用、渲染缓存命中、分片）传入 extra_reachability 的结果，
+                       此时计数只覆盖实际渲染的组合，"dead" 只列出可证明在任何组合中都不会命中的条目
+        返回:
+            {"entries": 条目总数, "fired": 命中过的条目数, "partial": 是否只统计了部分组合,
+             "dead": [从未命中的条目], "hot": [命中最多的 top 个条目]}
+            条目为 {"rule", "description", "key", "old", "new", "hits"}，key 为 extra 中的键（完整值/纯名称/*）
+        """
+        entries: Dict[Tuple[int, str, str], Dict] = {}
+        for r_type, indexed in self.rules.items():
+            for rule in indexed.rules:
+                for extra_key, table in rule.extra.items():
+                    for old, new in table.items():
+                        entries[(id(rule), extra_key, old)] = {
+                            "rule": r_type, "description": rule.description,
+                            "key": extra_key, "old": old, "new": new, "hits": 0,
+                        }
+        
+        for (r_type, value, old), n in counts.items():
+            if r_type not in self.rules:
+                continue
+            tag = self._matcher_for(r_type, value).entries[old][1]
+            name, namespace, _ = self._resolve_cached(value)
+            extra_key = {"full_value": f"{namespace}{name}", "name": name}.get(tag, "*")
+            rule = self.rules[r_type].sources.get(value, self.rules[r_type].default)
+            entry = entries.get((id(rule), extra_key, old))
+            if entry is not None:
+                entry["hits"] += n
+        
+        def unreachable(entry: Dict) -> bool:
+            if entry["rule"] not in reachable:
+                return True
+            patterns = reachable[entry["rule"]]
+            return patterns is not None and entry["old"] not in patterns
+        
+        ordered = list(entries.values())
+        return {
+            "entries": len(ordered),
+            "fired": sum(1 for e in ordered if e["hits"]),
+            "partial": reachable is not None,
+            "dead": [e for e in ordered if not e["hits"] and (reachable is None or unreachable(e))],
+            "hot": sorted((e for e in ordered if e["hits"]), key=lambda e: -e["hits"])[:top],
+        }
+
+    def extra_reachability(self, templates) -> Dict[str, Optional[Set[str]]]:
+        """
+        各规则的额外替换模式在这些模板的某个组合中可能命中的集合（由 _live_patterns 证明，
+        覆盖模板内容、格式化后的模板和文件名）；None 表示无法排除任何模式
+        不在任何模板中出现的规则不在结果中（其额外替换不可能命中）
+        """
+        reachable: Dict[str, Optional[Set[str]]] = {}
+        for template in templates:
+            types = tuple(r.type for r in self._active_rules(template))
+            texts = [template.content, template.path.name, self.compile(template.content).normalized_text]
+            for text in filter(None, texts):
+                live = self._live_patterns(text, types)
+                for r_type in types:
+                    kept = None if live is None else live.get(r_type)
+                    if kept is None:
+                        reachable[r_type] = None
+                    elif r_type not in reachable:
+                        reachable[r_type] = set(kept)
+                    elif reachable[r_type] is not None:
+                        reachable[r_type] |= kept
+        return reachable
+
+    def fingerprint(self, template: Template, combo: Dict) -> str:
+        """
+        输入指纹：模板名与内容、组合、组合中各值生效的额外替换表及其执行顺序
+        任一输入变化，指纹随之变化（用于增量生成）
+        """
+        digest = hashlib.sha1()
+        digest.update(template.path.name.encode("utf-8"))
+        digest.update(self._text_digest(template.content).encode("ascii"))
+        self._update_combo_digest(digest, combo)
+        return digest.hexdigest()
+
+    def render_key(self, content: str, combo: Dict) -> str:
+        """
+        渲染键：模板内容、组合、组合中各值生效的额外替换表及其执行顺序
+        与模板名无关，同一内容在不同模板间共享缓存条目
+        """
+        digest = hashlib.sha1()
+        digest.update(self._text_digest(content).encode("ascii"))
+        self._update_combo_digest(digest, combo)
+        return digest.hexdigest()
+
+    def _update_combo_digest(self, digest, combo: Dict) -> None:
+        """
+        把组合相关的输入计入摘要: 默认命名空间、组合、各值生效的额外替换表，
+        以及额外替换的执行顺序（按规则类型顺序依次执行，调整顺序会改变结果）
+        """
+        digest.update(self.default_ns.encode("utf-8"))
+        for r_type, value in combo.items():
+            digest.update(f"\0{r_type}={value}".encode("utf-8"))
+            if r_type in self.rules:
+                digest.update(self._extra_digest(r_type, value).encode("ascii"))
+        order = [r_type for r_type in self.rules if r_type in combo]
+        digest.update(("\0order=" + "\0".join(order)).encode("utf-8"))
+
+    def apply_cached(self, content: str, combo: Dict, cache) -> Tuple[str, bool]:
+        """
+        带缓存的 apply()（无解释日志）
+        参数:
+            cache: 提供 get(键) / put(键, 文本) 的缓存，如 dao.RenderCache
+        返回: (渲染结果, 是否命中缓存)
+        """
+        key = self.render_key(content, combo)
+        result = cache.get(key)
+        if result is not None:
+            return result, True
+        result = self.apply(content, combo, None)
+        cache.put(key, result)
+        return result, False
+
+    def _text_digest(self, text: str) -> str:
+        """模板文本摘要（按文本缓存）"""
+        digest = self._digests.get(text)
+        if digest is None:
+            digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+            self._digests[text] = digest
+        return digest
+
+    def _extra_digest(self, r_type: str, value: str) -> str:
+        """(规则, 值) 生效替换表的摘要（含各条目的层级与匹配优先级，二者都会改变替换结果）"""
+        key = (r_type, value)
+        digest = self._digests.get(key)
+        if digest is None:
+            payload = json.dumps(self._matcher_for(r_type, value).signature(), ensure_ascii=False)
+            digest = hashlib.sha1(payload.encode("utf-8")).hexdigest()
+            self._digests[key] = digest
+        return digest
+
+    def is_json_safe(self, content: str, combo: Dict) -> bool:
+        """
+        不解析输出即可证明渲染结果是有效JSON（按模板和值缓存，命中后只做查表）
+        条件: 模板槽位都在字符串内部且骨架有效；代入的值不含引号、反斜杠、控制字符；
+        生效的额外替换同样不含这些字符，且其模式不会出现在字符串之外和对象的键中
+        无法证明时返回 False，由调用方回退到完整解析
+        """
+        plan = self.compile(content)
+        if not plan.json_shape.safe:
+            return False
+        
+        for r_type, value in combo.items():
+            key = (content, r_type, value)
+            safe = self._json_safe.get(key)
+            if safe is None:
+                safe = self._check_json_safe(plan, r_type, value)
+                self._json_safe[key] = safe
+            if not safe:
+                return False
+        
+        # 系统占位符 {modid} 取自首个值的命名空间
+        first_type = next(iter(combo), None)
+        modid = self._resolve_cached(combo[first_type])[1] if first_type else self.default_ns
+        return not JSON_SIGNIFICANT.search(modid)
+
+    def _check_json_safe(self, plan: RenderPlan, r_type: str, value: str) -> bool:
+        """单个 (规则, 值) 在该模板中是否不会破坏JSON结构"""
+        name = self._resolve_cached(value)[0]
+        if JSON_SIGNIFICANT.search(name):
+            return False
+        if r_type not in self.rules:
+            return True
+        
+        for old, (new, _) in self._matcher_for(r_type, value).entries.items():
+            if JSON_SIGNIFICANT.search(old) or JSON_SIGNIFICANT.search(new):
+                return False
+            if any(old in run for run in plan.json_shape.outside_runs):
+                return False
+            if any(old in key for key in plan.json_shape.keys):
+                return False
+        return True
+
+    def normalized_content(self, content: str, combo: Dict) -> Optional[str]:
+        """
+        输出格式 normalized 下可直接渲染的模板：渲染它与渲染原模板后再 json.loads + json.dumps(indent=2)
+        逐字节一致时返回其文本（模板格式化只在编译时做一次），否则返回 None，由调用方回退到解析后格式化
+        格式化后的模板与原模板的字符串内容相同、字符串之外的写法不同，因此两者都要满足 is_json_safe
+        """
+        normalized = self.compile(content).normalized_text
+        if normalized is None or not self.is_json_safe(content, combo):
+            return None
+        return normalized if self.is_json_safe(normalized, combo) else None
+
+    def apply(self, content: str, combo: Dict, trace: Optional[List[TraceEvent]] = None) -> str:
+        """
+        执行所有替换逻辑
+        参数:
+            trace: 解释模式下按替换顺序追加 TraceEvent；None 时不产生任何跟踪开销
+        """
+        # 0. 可分解的模板直接查表拼接（解释模式需要逐步跟踪，走完整流程）
+        if trace is None:
+            key = (content, tuple(combo))
+            factorized = self._factorized.get(key, self)
+            if factorized is self:
+                factorized = self.factorize(content, key[1])
+                self._factorized[key] = factorized
+            if factorized is not None:
+                try:
+                    return factorized.render(combo)
+                except KeyError:
+                    pass
+        
         # 1. 解析命名空间
         type_info = self._parse_combo(combo)
         
-        # 2. 基础替换
-        result = self._apply_basic(content, combo, type_info, explain_log)
+        # 2. 基础替换（走编译后的渲染计划）
+        result = self._render_basic(self.compile(content), combo, type_info, trace)
         
-        # 3. 额外规则替换
-        result = self._apply_extra(result, combo, type_info, explain_log)
+        # 3. 额外规则替换（只用该模板中可能命中的模式）
+        result = self._apply_extra(result, combo, type_info, trace, self._live_for_combo(content, combo))
         
         return result
 
     def _parse_combo(self, combo: Dict) -> Dict[str, Tuple]:
         """解析组合中所有值的命名空间"""
         return {
-            r_type: self._resolve(value)
+            r_type: self._resolve_cached(value)
             for r_type, value in combo.items()
         }
 
+    def _resolve_cached(self, value: str) -> Tuple[str, str, str]:
+        """带缓存的 _resolve（规则值已在构造时预计算）"""
+        resolved = self._resolved.get(value)
+        if resolved is None:
+            resolved = self._resolve(value)
+            self._resolved[value] = resolved
+        return resolved
+
     def _resolve(self, value: str) -> Tuple[str, str, str]:
         """解析单个值的命名空间"""
         if ":" in value:
@@ -56,6 +750,31 @@ class ReplacementEngine:
         else:
             return value, self.default_ns, "" if self.default_ns == "minecraft:" else self.default_ns.replace(":", "_")
 
+    def _render_basic(self, plan: RenderPlan, combo: Dict, info: Dict, log: Optional[List]) -> str:
+        """
+        基础占位符替换的编译版本，输出与 _apply_basic 逐字节一致
+        替换值含花括号、或模板中槽位两侧的字面量花括号可能与值拼成新占位符时，
+        逐个 str.replace 可能出现连锁替换；规则名含空白、引号等字符时渲染计划不识别该槽位；
+        这些情况回退到 _apply_basic
+        """
+        first_type = next(iter(combo), None)
+        modid = info[first_type][1] if first_type else self.default_ns
+        modid_safe = "" if modid == "minecraft:" else modid.replace(":", "_")
+        
+        values = {r_type: name for r_type, (name, _, _) in info.items()}
+        if (plan.may_chain or _has_brace(modid) or any(_has_brace(name) for name in values.values())
+                or not all(is_slot_key(r_type) for r_type in values)):
+            return self._apply_basic(plan.text, combo, info, log)
+        values["modid"] = modid
+        values["modid_safe"] = modid_safe
+        
+        if log is not None:
+            for r_type, (name, _, _) in info.items():
+                if r_type not in ("modid", "modid_safe") and plan.has_slot(r_type):
+                    log.append(TraceEvent(r_type, "placeholder", f"{{{r_type}}}", name))
+        
+        return plan.render(values)
+
     def _apply_basic(self, content: str, combo: Dict, info: Dict, log: Optional[List]) -> str:
         """基础占位符替换 ({modid}, {tree}, 等)"""
         result = content
@@ -70,42 +789,144 @@ class ReplacementEngine:
         for r_type, (name, _, _) in info.items():
             placeholder = f"{{{r_type}}}"
             if placeholder in result and log is not None:
-                log.append(f"  → 替换 {placeholder} => {name}")
+                log.append(TraceEvent(r_type, "placeholder", placeholder, name))
             result = result.replace(placeholder, name)
         
         return result
 
-    def _apply_extra(self, content: str, combo: Dict, info: Dict, log: Optional[List]) -> str:
-        """应用额外替换规则（优先级：完整值 > 纯名称 > 通配符）"""
+    def _apply_extra(self, content: str, combo: Dict, info: Dict, log: Optional[List],
+                     live: Optional[Dict] = None) -> str:
+        """
+        应用额外替换规则（优先级：完整值 > 纯名称 > 通配符），每条规则单次扫描
+        参数:
+            live: 模板的 _live_patterns 分析结果，None 时使用完整替换表
+        """
         result = content
         
-        for r_type, rule in self.rules.items():
+        for r_type in self.rules:
             if r_type not in combo:
                 continue
             
-            name, namespace, _ = info[r_type]
+            matcher = self._live_matcher(r_type, combo[r_type], live)
+            if not matcher:
+                continue
+            if log is None:
+                result = matcher.apply(result)
+            else:
+                hits = []
+                result = matcher.apply(result, hits)
+                log.extend(TraceEvent(r_type, kind, old, new) for kind, old, new in hits)
+        
+        return result
+
+    def _matcher_for(self, r_type: str, value: str) -> MultiReplacer:
+        """获取 (规则, 值) 对应的多模式替换器（规则值已预计算，其余值首次使用时构建）"""
+        key = (r_type, value)
+        matcher = self._matchers.get(key)
+        if matcher is None:
+            name, namespace, _ = self._resolve_cached(value)
             full_value = f"{namespace}{name}"
-            extra = rule.extra
-            
-            # 优先级1：通配符（最低）
-            if "*" in extra:
-                for old, new in extra["*"].items():
-                    if old in result:
-                        if log: log.append(f"  → 通配符 [*]: {old} => {new}")
-                        result = result.replace(old, new)
-            
-            # 优先级2：纯名称匹配
-            if name in extra:
-                for old, new in extra[name].items():
-                    if old in result:
-                        if log: log.append(f"  → 纯名称 [{name}]: {old} => {new}")
-                        result = result.replace(old, new)
-            
-            # 优先级3：完整值匹配（最高）
-            if full_value in extra:
-                for old, new in extra[full_value].items():
-                    if old in result:
-                        if log: log.append(f"  → 完整值 [{full_value}]: {old} => {new}")
-                        result = result.replace(old, new)
-        
-        return result
\ No newline at end of file
+            extra = self.rules[r_type].extra_for(value)
+            matcher = MultiReplacer([
+                ("full_value", extra.get(full_value, {})),
+                ("name", extra.get(name, {})),
+                ("wildcard", extra.get("*", {})),
+            ])
+            self._matchers[key] = matcher
+        return matcher
+
+    # ==================== 编译时排除不可能命中的额外替换 ====================
+
+    def extra_pattern_counts(self, template: Template) -> Tuple[int, int]:
+        """模板编译后保留的额外替换模式数与总数（各规则累加，用于日志）"""
+        types = tuple(r.type for r in self._active_rules(template))
+        live = self._live_patterns(template.content, types) or {}
+        kept = total = 0
+        for r_type in types:
+            patterns = self._rule_patterns(r_type)
+            total += len(patterns)
+            kept += len(patterns) if live.get(r_type) is None else len(live[r_type])
+        return kept, total
+
+    def _live_patterns(self, content: str, types: Tuple[str, ...]) -> Optional[Dict[str, Optional[frozenset]]]:
+        """
+        编译时分析：组合取各规则值列表中的值时，模板中各规则的哪些额外替换模式可能命中
+        （按模板文本和规则类型缓存）
+        可能命中: 模式出现在基础替换的结果中（字面量段与各槽位候选值的任意拼接），
+                 或与排在前面的规则替换进来的新串重叠（额外替换按规则顺序依次执行）
+        返回: {规则类型: 可能命中的模式集合，None 表示全部保留}；
+              组合含未启用的规则、或基础替换需回退到逐个 str.replace 时返回 None（不做排除）
+        """
+        key = (content, types)
+        live = self._live.get(key, self)
+        if live is self:
+            live = self._analyze_live(content, types)
+            self._live[key] = live
+        return live
+
+    def _analyze_live(self, content: str, types: Tuple[str, ...]) -> Optional[Dict[str, Optional[frozenset]]]:
+        """_live_patterns 的实际分析（不缓存）"""
+        if not types or any(t not in self.rules or not is_slot_key(t) for t in types):
+            return None
+        options = {t: {self._resolve_cached(v)[0] for v in self.rules[t].values} for t in types}
+        modids = {self._resolve_cached(v)[1] for v in self.rules[types[0]].values}
+        if any(_has_brace(text) for texts in (*options.values(), modids) for text in texts):
+            return None
+        plan = self.compile(content)
+        if plan.may_chain:
+            return None
+        options["modid"] = modids
+        options["modid_safe"] = {"" if m == "minecraft:" else m.replace(":", "_") for m in modids}
+        
+        # 基础替换的结果: 字面量段原样，槽位取候选值之一（未提供值的槽位保留原文）
+        slot_at = dict(plan.slots)
+        segments = [
+            options.get(slot_at[i], (piece,)) if i in slot_at else (piece,)
+            for i, piece in enumerate(plan.pieces)
+        ]
+        
+        live = {}
+        inserted = set()  # 前面的规则可能替换进来的新串
+        for r_type in self.rules:
+            if r_type not in types:
+                continue
+            patterns = self._rule_patterns(r_type)
+            kept = frozenset(
+                old for old in patterns
+                if any(overlaps(old, new) for new in inserted) or can_occur(old, segments)
+            )
+            for value in self.rules[r_type].values:
+                entries = self._matcher_for(r_type, value).entries
+                inserted.update(entries[old][0] for old in kept if old in entries)
+            live[r_type] = None if len(kept) == len(patterns) else kept
+        return live
+
+    def _live_for_combo(self, content: str, combo: Dict) -> Optional[Dict]:
+        """组合适用的 _live_patterns 结果；组合中有不在规则值列表里的值时返回 None（使用完整替换表）"""
+        live = self._live_patterns(content, tuple(combo))
+        if live is None:
+            return None
+        for r_type, value in combo.items():
+            if value not in self.rules[r_type].sources:
+                return None
+        return live
+
+    def _rule_patterns(self, r_type: str) -> set:
+        """规则所有值的额外替换模式"""
+        return {
+            old
+            for value in self.rules[r_type].values
+            for old in self._matcher_for(r_type, value).entries
+        }
+
+    def _live_matcher(self, r_type: str, value: str, live: Optional[Dict]) -> MultiReplacer:
+        """只含模板中可能命中的模式的替换器（live 为 None 或该规则全部保留时即完整替换器）"""
+        kept = live.get(r_type) if live is not None else None
+        if kept is None:
+            return self._matcher_for(r_type, value)
+        key = (r_type, value, kept)
+        matcher = self._pruned_matchers.get(key)
+        if matcher is None:
+            matcher = self._matcher_for(r_type, value).subset(kept)
+            self._pruned_matchers[key] = matcher
+        return matcher
@@ -0,0 +1,80 @@
+from typing import Dict, List, Optional, Tuple
+
+# 片段某个取值预渲染时额外替换的命中: [(规则类型, 值, 旧串, 次数)]
+FragmentHits = List[Tuple[str, str, str, int]]
+
+
+class FactorizedPlan:
+    """
+    分解渲染计划：把模板切分为只依赖部分规则的片段，每个片段按所依赖规则的取值预先渲染好
+    渲染单个组合时只需按值查表并拼接，不再对整份模板做替换
+    片段表由 ReplacementEngine.factorize 构建并验证（与完整渲染逐字节一致）
+    预渲染时有额外替换命中的片段记录每个取值被使用的次数，用于统计替换命中
+    """
+
+    __slots__ = ("types", "fragments", "table_size", "_lookups", "_hits")
+
+    def __init__(self, types: Tuple[str, ...],
+                 fragments: List[Tuple[Tuple[str, ...], Dict[Tuple[str, ...], str]]],
+                 hits: Optional[List[Dict[Tuple[str, ...], FragmentHits]]] = None):
+        """
+        参数:
+            types: 组合中的规则类型（按组合顺序）
+            fragments: [(依赖的规则类型, {取值元组: 渲染结果})]，按模板顺序排列
+                       不依赖任何规则的片段为 ((), {(): 文本})
+            hits: 与 fragments 对应的 {取值元组: 预渲染时的额外替换命中}，只含有命中的取值
+        """
+        self.types = types
+        self.fragments = fragments
+        self.table_size = sum(len(table) for _, table in fragments)
+        # 渲染用的查表方式: (常量文本, None, None, None) / (None, 规则类型, {值: 文本}, 使用次数) /
+        # (None, 规则类型元组, {取值元组: 文本}, 使用次数)；使用次数为 None 表示片段没有额外替换命中
+        self._lookups = []
+        self._hits: List[Tuple[Dict, Dict]] = []  # [(使用次数, {查表键: 命中})]
+        for i, (key_types, table) in enumerate(fragments):
+            fragment_hits = hits[i] if hits else {}
+            usage = {} if fragment_hits else None
+            if not key_types:
+                # 常量片段有命中时也走查表（键为空元组），按渲染次数计数
+                self._lookups.append((None, (), table, usage) if fragment_hits else (table[()], None, None, None))
+            elif len(key_types) == 1:
+                self._lookups.append((None, key_types[0], {key[0]: text for key, text in table.items()}, usage))
+                fragment_hits = {key[0]: found for key, found in fragment_hits.items()}
+            else:
+                self._lookups.append((None, key_types, table, usage))
+            if usage is not None:
+                self._hits.append((usage, fragment_hits))
+
+    def render(self, combo: Dict[str, str]) -> str:
+        """
+        按组合查表拼接
+        组合中的值不在规则值列表中时抛出 KeyError，由调用方回退到完整渲染
+        """
+        parts = []
+        used = []  # 全部查表成功后再计数，回退到完整渲染时不重复计数
+        for constant, key, table, usage in self._lookups:
+            if constant is not None:
+                parts.append(constant)
+                continue
+            if key.__class__ is str:
+                lookup = combo[key]
+            else:
+                lookup = tuple([combo[t] for t in key])
+            parts.append(table[lookup])
+            if usage is not None:
+                used.append((usage, lookup))
+        for usage, lookup in used:
+            usage[lookup] = usage.get(lookup, 0) + 1
+        return "".join(parts)
+
+    def take_hits(self) -> Dict[Tuple[str, str, str], int]:
+        """取出自上次调用以来的额外替换命中 {(规则类型, 值, 旧串): 次数}，并清零使用次数"""
+        counts: Dict[Tuple[str, str, str], int] = {}
+        for usage, fragment_hits in self._hits:
+            # 使用次数按查表键记录，其中只有部分取值在预渲染时有命中
+            for lookup, uses in usage.items():
+                for r_type, value, old, n in fragment_hits.get(lookup, ()):
+                    key = (r_type, value, old)
+                    counts[key] = counts.get(key, 0) + n * uses
+            usage.clear()
+        return counts
@@ -1,10 +1,30 @@
-import json
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 from src.core.engine import ReplacementEngine
 from src.model.template import Template
 from src.model.batch_item import BatchItem
 from src.dao.batch_item_dao import BatchItemDAO
+from src.dao.template_registry import shared_registry
+
+# 进程池模式下每个工作进程持有的引擎副本（由 initializer 注入一次）
+_worker_engine: Optional["LocalizationEngine"] = None
+
+
+def _init_worker(engine: "LocalizationEngine"):
+    """进程池初始化：每个工作进程只反序列化一次引擎"""
+    global _worker_engine
+    engine.take_rule_hits()  # 丢弃随引擎一起复制过来的主进程计数
+    _worker_engine = engine
+
+
+def _generate_items(template_name: str, item_ids: List[str]) -> Tuple[List[Tuple], Dict]:
+    """工作进程任务：生成一段BatchItem，同时返回这段产生的额外替换命中"""
+    outcomes = [_worker_engine._generate_safely(item_id, template_name) for item_id in item_ids]
+    return outcomes, _worker_engine.take_rule_hits()
+
 
 class LocalizationEngine(ReplacementEngine):
     """
@@ -22,6 +42,7 @@ class LocalizationEngine(ReplacementEngine):
         super().__init__(default_namespace, rules)
         self.items = items  # 类型: Dict[str, BatchItem]
         self.templates: Dict[str, Template] = {}
+        self.errors: List[Dict[str, str]] = []  # 最近一次 generate_batch 的失败项
     
     def load_templates(self, template_dir: Path, *filenames: str):
         """
@@ -35,27 +56,20 @@ class LocalizationEngine(ReplacementEngine):
         - .json 文件：解析为字典
         - .txt / .template 文件：保持为字符串
         - 其他：保持为字符串
+        文件经模板注册表读取和解析，未变化的文件重新加载时直接复用
         """
         for filename in filenames:
-            path = template_dir / filename
-            
-            # 1. 加载原始内容
-            base_template = Template(path)
-            
-            # 2. 根据扩展名解析
-            template = Template(path)  # 创建新实例用于存储解析后内容
-            template.placeholders = base_template.placeholders  # 复用提取的占位符
-            
-            if filename.endswith('.json'):
-                # JSON 格式：解析为字典
-                template.content = json.loads(base_template.content)
-            else:
-                # 其他格式：保持字符串
-                template.content = base_template.content
-            
+            template = shared_registry.get_parsed(template_dir / filename)
             self.templates[filename] = template
             print(f"📄 加载模板: {filename} ({type(template.content).__name__})")
     
+    def template_texts(self) -> List[str]:
+        """已加载模板中交给 apply() 渲染的文本（值模板），用于 retain_texts"""
+        return [
+            value for template in self.templates.values() if isinstance(template.content, dict)
+            for value in template.content.values() if isinstance(value, str)
+        ]
+    
     def generate_for_item(self, item_id: str, template_name: str) -> Tuple[str, Dict[str, str]]:
         """
         为单个BatchItem生成完整条目
@@ -92,6 +106,14 @@ class LocalizationEngine(ReplacementEngine):
         
         return item_id, entries
     
+    def extra_reachability(self, templates=None) -> Dict[str, None]:
+        """
+        本地化组合的值取自BatchItem而不是规则值列表，无法按模板排除额外替换模式；
+        只有组合中不存在的规则类型（见 _build_combo）的额外替换不可能命中
+        """
+        combo_types = ("material_id", "material_zh_cn", "modid_safe", "category")
+        return {r_type: None for r_type in combo_types if r_type in self.rules}
+    
     def _build_combo(self, item: BatchItem) -> Dict[str, str]:
         """为apply()构建替换参数组合"""
         return {
@@ -128,26 +150,73 @@ class LocalizationEngine(ReplacementEngine):
         # 4. 移除首尾下划线
         return real_key.strip('_')
     
-    def generate_batch(self, template_name: str) -> Dict[str, Dict[str, str]]:
+    def generate_batch(self, template_name: str, workers: int = 1,
+                       executor: str = "thread", item_ids: Optional[List[str]] = None) -> Dict[str, Dict[str, str]]:
         """
         批量生成所有BatchItem的条目
         
+        参数:
+            template_name: 模板文件名
+            workers: 并发数，1 表示串行
+            executor: 并发方式，"thread"（线程池，渲染持锁执行以保证命中计数准确）或 "process"（进程池）
+            item_ids: 只生成这些BatchItem（监视模式），None 表示全部
+        
         返回:
             {
                 "minecraft:oak": {"block.pfm.oak_chair": "...", ...},
                 "minecraft:crimson": {"block.pfm.crimson_chair": "...", ...},
                 ...
             }
+            结果按 items 的原始顺序排列；失败项不中断整个流程，记录在 self.errors 中:
+            [{"item_id": ..., "template": ..., "error": 异常类型, "message": 错误信息}]
         """
+        if executor not in ("thread", "process"):
+            raise ValueError(f"未知的并发方式: {executor}（可选 thread / process）")
+        
+        item_ids = list(self.items.keys()) if item_ids is None else list(item_ids)
+        if workers <= 1 or len(item_ids) <= 1:
+            outcomes = [self._generate_safely(item_id, template_name) for item_id in item_ids]
+        elif executor == "process":
+            # 按块分发，减少进程间往返；map 保持提交顺序
+            chunk_size = max(1, len(item_ids) // (workers * 4))
+            chunks = [item_ids[i:i + chunk_size] for i in range(0, len(item_ids), chunk_size)]
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(self,)) as pool:
+                outcomes = []
+                for chunk, hits in pool.map(_generate_items, repeat(template_name), chunks):
+                    outcomes.extend(chunk)
+                    self.merge_rule_hits(hits)
+        else:
+            # 各线程共享引擎：替换器和分解计划的命中计数是共享字典上的"读-加-写"，同时渲染会丢失计数，
+            # 因此渲染时持锁（锁只在本次生成中使用，不随引擎进入进程池）
+            lock = threading.Lock()
+            
+            def generate(item_id: str):
+                with lock:
+                    return self._generate_safely(item_id, template_name)
+            
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                outcomes = list(pool.map(generate, item_ids))
+        
         results = {}
-        for item_id in self.items.keys():
-            try:
-                item_id_result, entries = self.generate_for_item(item_id, template_name)
-                results[item_id_result] = entries
-                print(f"✅ 生成成功: {item_id_result} ({len(entries)} 条)")
-            except Exception as e:
-                print(f"❌ 生成失败: {item_id}\n错误: {str(e)}")
-                # 继续生成其他项，不中断整个流程
-                continue
+        self.errors = []
+        for item_id, entries, error in outcomes:
+            if error is None:
+                results[item_id] = entries
+            else:
+                self.errors.append(error)
         
-        return results
\ No newline at end of file
+        return results
+    
+    def _generate_safely(self, item_id: str, template_name: str) -> Tuple[str, Optional[Dict[str, str]], Optional[Dict[str, Any]]]:
+        """生成单个BatchItem并捕获异常，返回 (item_id, 条目, 错误信息)"""
+        try:
+            _, entries = self.generate_for_item(item_id, template_name)
+            return item_id, entries, None
+        except Exception as e:
+            return item_id, None, {
+                "item_id": item_id,
+                "template": template_name,
+                "error": type(e).__name__,
+                "message": str(e),
+            }
@@ -0,0 +1,94 @@
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class MultiReplacer:
+    """
+    多模式替换器：把多张替换表合并成一个正则交替式，单次扫描完成全部替换
+    同一位置有多个候选时，高优先级的表先匹配；同一优先级内较长的模式先匹配
+    hits 累计每个模式的命中次数（每次命中一次字典自增，用于统计从不生效的替换）
+    """
+
+    __slots__ = ("entries", "order", "pattern", "hits")
+
+    def __init__(self, tables: List[Tuple[str, Dict[str, str]]]):
+        """
+        参数:
+            tables: [(标签, 替换表)]，按优先级从高到低排列
+                    标签用于解释跟踪，如 "full_value"
+        """
+        self.entries: Dict[str, Tuple[str, str]] = {}  # 旧串 → (新串, 标签)
+        self.hits: Dict[str, int] = {}  # 旧串 → 命中次数
+        ordered = []
+        for rank, (tag, table) in enumerate(tables):
+            for old, new in table.items():
+                # 空模式无法参与扫描；同名模式以高优先级的表为准
+                if not old or old in self.entries:
+                    continue
+                self.entries[old] = (new, tag)
+                ordered.append((rank, -len(old), old))
+        ordered.sort()
+        self.order: Tuple[str, ...] = tuple(old for _, _, old in ordered)  # 模式的实际匹配优先级
+        self.pattern = (
+            re.compile("|".join(re.escape(old) for _, _, old in ordered))
+            if ordered else None
+        )
+
+    def signature(self) -> List[Tuple[str, str, str]]:
+        """按匹配优先级排列的 (标签, 旧串, 新串)：优先级决定替换结果，用于指纹"""
+        return [(self.entries[old][1], old, self.entries[old][0]) for old in self.order]
+
+    def __bool__(self) -> bool:
+        return self.pattern is not None
+
+    def subset(self, keep: Iterable[str]) -> "MultiReplacer":
+        """只保留 keep 中的模式（优先级不变），全部保留时返回自身"""
+        keep = set(keep)
+        if all(old in keep for old in self.entries):
+            return self
+        tables: List[Tuple[str, Dict[str, str]]] = []
+        for old, (new, tag) in self.entries.items():
+            if old not in keep:
+                continue
+            if not tables or tables[-1][0] != tag:
+                tables.append((tag, {}))
+            tables[-1][1][old] = new
+        return MultiReplacer(tables)
+
+    def apply(self, text: str, log: Optional[List] = None) -> str:
+        """单次扫描执行替换，log 不为 None 时按首次命中顺序追加每个模式的 (标签, 旧串, 新串)"""
+        if self.pattern is None:
+            return text
+        if log is None:
+            return self.pattern.sub(self._substitute, text)
+
+        seen: Dict[str, None] = {}
+
+        def substitute(match):
+            old = match.group(0)
+            seen[old] = None
+            return self._substitute(match)
+
+        result = self.pattern.sub(substitute, text)
+        for old in seen:
+            new, tag = self.entries[old]
+            log.append((tag, old, new))
+        return result
+
+    def apply_uncounted(self, text: str, counts: Dict[str, int]) -> str:
+        """执行替换但不计入 hits，命中次数累加到 counts（预渲染片段时使用，片段被使用时再计数）"""
+        if self.pattern is None:
+            return text
+
+        def substitute(match):
+            old = match.group(0)
+            counts[old] = counts.get(old, 0) + 1
+            return self.entries[old][0]
+
+        return self.pattern.sub(substitute, text)
+
+    def _substitute(self, match) -> str:
+        old = match.group(0)
+        hits = self.hits
+        hits[old] = hits.get(old, 0) + 1
+        return self.entries[old][0]
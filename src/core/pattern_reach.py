@@ -0,0 +1,46 @@
+from typing import Iterable, Sequence
+
+
+def can_occur(pattern: str, segments: Sequence[Iterable[str]]) -> bool:
+    """
+    模式能否出现在拼接结果中：结果由每段的候选文本中任选一个依次连接而成
+    按 KMP 思路逐段推进"已匹配的模式前缀长度"的集合；各段的选择视为互不相关，
+    因此只会多判（保留实际不会命中的模式），不会漏判
+    参数:
+        segments: 每段的候选文本，字面量段只有一个候选
+    """
+    if not pattern:
+        return False
+    states = {0}
+    for options in segments:
+        advanced = set()
+        for state in states:
+            prefix = pattern[:state]
+            for option in options:
+                text = prefix + option
+                if pattern in text:
+                    return True
+                advanced.add(_overlap(text, pattern))
+        states = advanced
+    return False
+
+
+def overlaps(pattern: str, inserted: str) -> bool:
+    """
+    模式的某次出现能否与插入的文本有重叠（包含、被包含或首尾相接处重合）
+    插入空串（删除文本）时恒为真：两侧原本不相邻的文本接在一起，可能拼出新的命中
+    """
+    if pattern in inserted or inserted in pattern:
+        return True
+    return any(
+        pattern.endswith(inserted[:k]) or pattern.startswith(inserted[-k:])
+        for k in range(1, min(len(pattern), len(inserted)))
+    )
+
+
+def _overlap(text: str, pattern: str) -> int:
+    """text 的后缀与 pattern 的前缀的最长重合长度（小于模式长度）"""
+    for k in range(min(len(pattern) - 1, len(text)), 0, -1):
+        if text.endswith(pattern[:k]):
+            return k
+    return 0
@@ -0,0 +1,195 @@
+import json
+import re
+from typing import Dict, List, Optional, Tuple
+
+# 占位符名：不含花括号、引号、反斜杠和空白（避免把JSON对象 {...} 当成槽位）
+_SLOT_KEY = re.compile(r'[^{}"\\\s]*')
+_SLOT_PATTERN = re.compile(r'\{(' + _SLOT_KEY.pattern + r')\}')
+
+# 放进JSON字符串会改变结构或需要转义的字符
+JSON_SIGNIFICANT = re.compile(r'["\\\x00-\x1f]')
+
+# 骨架中代表槽位的字符，以及跨越槽位的 "{...}"（替换后与两侧字面量拼成新的占位符）
+_SLOT_MARK = "\ue000"
+_SPANNING_SLOT = re.compile(r'\{[^{}"\\\s]*' + _SLOT_MARK + r'[^{}"\\\s]*\}')
+# 格式化骨架时给每个槽位的编号标记（私用区字符，JSON序列化时原样输出）
+_NUMBERED_MARK = re.compile("\ue000(\\d+)\ue001")
+
+
+def is_slot_key(key: str) -> bool:
+    """该名称的占位符能否被渲染计划识别（否则需按 str.replace 逐个替换）"""
+    return _SLOT_KEY.fullmatch(key) is not None
+
+
+class JsonShape:
+    """
+    模板的JSON结构分析结果（编译时计算一次）
+    safe: 所有槽位都位于JSON字符串内部，且把槽位替换为普通文本后模板是有效JSON
+    outside_runs: 字符串之外的文本片段（额外替换的模式若出现在其中，可能破坏结构）
+    keys: 对象的键（safe 时有效；额外替换若改动键，格式化时可能合并同名键）
+    slot_in_key: 有槽位位于对象的键中（代入后可能出现同名键）
+    """
+
+    __slots__ = ("safe", "outside_runs", "keys", "slot_in_key")
+
+    def __init__(self, safe: bool, outside_runs: List[str], keys: List[str], slot_in_key: bool):
+        self.safe = safe
+        self.outside_runs = outside_runs
+        self.keys = keys
+        self.slot_in_key = slot_in_key
+
+
+class RenderPlan:
+    """
+    模板渲染计划：把模板文本一次性切分为字面量段和占位符槽位
+    渲染时只需把槽位填入对应值，再做一次 ''.join
+    """
+
+    __slots__ = ("text", "pieces", "slots", "slot_keys", "may_chain", "_json_shape", "_normalized")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.pieces: List[str] = []                # 字面量段与槽位交替排列
+        self.slots: List[Tuple[int, str]] = []     # (pieces中的下标, 占位符名)
+        self._tokenize()
+        self.slot_keys = frozenset(key for _, key in self.slots)
+        # 槽位两侧的字面量 "{"、"}" 可能与填入的值拼成新占位符，逐个 str.replace 时会被后续替换命中
+        self.may_chain = self._spans_slot()
+        self._json_shape: Optional[JsonShape] = None
+        self._normalized: Optional[str] = None  # 格式化后的模板文本（"" 表示无法格式化）
+
+    def _tokenize(self) -> None:
+        """切分模板文本（只在编译时执行一次）"""
+        pos = 0
+        for match in _SLOT_PATTERN.finditer(self.text):
+            if match.start() > pos:
+                self.pieces.append(self.text[pos:match.start()])
+            self.slots.append((len(self.pieces), match.group(1)))
+            self.pieces.append(match.group(0))     # 缺省保留原样
+            pos = match.end()
+        if pos < len(self.text):
+            self.pieces.append(self.text[pos:])
+
+    def _spans_slot(self) -> bool:
+        """字面量中是否有跨越槽位的 "{...}"（按值不含花括号、引号和空白的最坏情况判断）"""
+        if not self.slots:
+            return False
+        slot_indexes = {index for index, _ in self.slots}
+        skeleton = "".join(
+            _SLOT_MARK if index in slot_indexes else piece
+            for index, piece in enumerate(self.pieces)
+        )
+        return _SPANNING_SLOT.search(skeleton) is not None
+
+    def has_slot(self, key: str) -> bool:
+        """模板中是否包含 {key}"""
+        return key in self.slot_keys
+
+    def render(self, values: Dict[str, str]) -> str:
+        """
+        按槽位填值并拼接
+        参数:
+            values: 占位符名 → 替换值，未提供的槽位保留原文
+        """
+        if not self.slots:
+            return self.text
+        pieces = self.pieces.copy()
+        for index, key in self.slots:
+            value = values.get(key)
+            if value is not None:
+                pieces[index] = value
+        return "".join(pieces)
+
+    @property
+    def json_shape(self) -> JsonShape:
+        """JSON结构分析（首次访问时计算）"""
+        if self._json_shape is None:
+            self._json_shape = self._analyze_json()
+        return self._json_shape
+
+    @property
+    def normalized_text(self) -> Optional[str]:
+        """
+        按输出格式 normalized（json.loads 后 indent=2 重新序列化）格式化后的模板文本（首次访问时计算）
+        槽位原样保留为 {键}；字符串内容在格式化前后逐字不变，只有字符串之外的空白和写法被规范化，
+        因此只要代入的值和额外替换不触及字符串之外的文本、不改动对象的键，
+        渲染格式化后的模板与渲染后再格式化逐字节一致
+        无法保证时返回 None：骨架不安全、槽位在键中、字面量含转义序列、格式化丢掉了槽位（同名键）
+        或格式化结果中出现新的槽位（如 {}）
+        """
+        if self._normalized is None:
+            self._normalized = self._normalize() or ""
+        return self._normalized or None
+
+    def _normalize(self) -> Optional[str]:
+        """normalized_text 的实际计算（不缓存）"""
+        shape = self.json_shape
+        if not shape.safe or shape.slot_in_key:
+            return None
+        slot_keys = dict(self.slots)
+        skeleton: List[str] = []
+        for index, piece in enumerate(self.pieces):
+            if index in slot_keys:
+                skeleton.append(f"\ue000{index}\ue001")
+            elif "\\" in piece or "\ue000" in piece or "\ue001" in piece:
+                return None
+            else:
+                skeleton.append(piece)
+        text = json.dumps(json.loads("".join(skeleton)), indent=2, ensure_ascii=False)
+
+        # 每个槽位恰好出现一次且顺序不变，再换回 {键}
+        found = [int(match.group(1)) for match in _NUMBERED_MARK.finditer(text)]
+        if found != sorted(slot_keys):
+            return None
+        normalized = _NUMBERED_MARK.sub(lambda match: "{" + slot_keys[int(match.group(1))] + "}", text)
+        if [key for _, key in RenderPlan(normalized).slots] != [key for _, key in self.slots]:
+            return None
+        return normalized
+
+    def _analyze_json(self) -> JsonShape:
+        """扫描字面量段，确认每个槽位都在字符串内部，并用占位文本验证骨架、收集对象的键"""
+        slot_indexes = {index for index, _ in self.slots}
+        in_string = escaped = False
+        safe = True
+        outside_runs: List[str] = []
+        run: List[str] = []
+        skeleton: List[str] = []
+
+        for index, piece in enumerate(self.pieces):
+            if index in slot_indexes:
+                # 槽位必须在字符串内，且不能紧跟在反斜杠之后
+                if not in_string or escaped:
+                    safe = False
+                skeleton.append(_SLOT_MARK)
+                continue
+            skeleton.append(piece)
+            for ch in piece:
+                if in_string:
+                    if escaped:
+                        escaped = False
+                    elif ch == "\\":
+                        escaped = True
+                    elif ch == '"':
+                        in_string = False
+                elif ch == '"':
+                    in_string = True
+                    if run:
+                        outside_runs.append("".join(run))
+                        run = []
+                else:
+                    run.append(ch)
+        if run:
+            outside_runs.append("".join(run))
+
+        keys: List[str] = []
+
+        def collect(pairs):
+            keys.extend(key for key, _ in pairs)
+            return dict(pairs)
+
+        if safe:
+            try:
+                json.loads("".join(skeleton), object_pairs_hook=collect)
+            except ValueError:
+                safe = False
+        return JsonShape(safe, outside_runs, keys, any(_SLOT_MARK in key for key in keys))
@@ -0,0 +1,48 @@
+from typing import Dict, List
+
+
+class IndexedRule:
+    """
+    同一类型所有启用规则合并后的规则：值列表按规则顺序拼接并去重
+    每个值记住列出它的首个规则，额外替换表取自该规则
+    """
+
+    __slots__ = ("type", "values", "sources", "default", "rules", "enabled")
+
+    def __init__(self, r_type: str):
+        self.type = r_type
+        self.values: List[str] = []
+        self.sources: Dict[str, object] = {}  # 值 → 来源规则（model.ReplacementRule）
+        self.default = None  # 首个并入的规则，未列出的值使用它的额外替换表
+        self.rules: List = []  # 并入的规则（按配置顺序）
+        self.enabled = True
+
+    def add(self, rule) -> None:
+        """并入一条规则（已列出的值保留原来源）"""
+        self.rules.append(rule)
+        for value in rule.values:
+            if value not in self.sources:
+                self.sources[value] = rule
+                self.values.append(value)
+        if self.default is None:
+            self.default = rule
+
+    def extra_for(self, value: str) -> Dict[str, Dict[str, str]]:
+        """值的额外替换表：列出该值的规则；未列出的值取该类型首个启用规则"""
+        return self.sources.get(value, self.default).extra
+
+
+def build_rule_index(rules: List) -> Dict[str, IndexedRule]:
+    """
+    按类型合并所有启用的规则（类型顺序为其首个启用规则的出现顺序）
+    全部规则都未启用的类型不出现在索引中，其占位符不参与组合
+    """
+    index: Dict[str, IndexedRule] = {}
+    for rule in rules:
+        if not rule.enabled:
+            continue
+        merged = index.get(rule.type)
+        if merged is None:
+            merged = index[rule.type] = IndexedRule(rule.type)
+        merged.add(rule)
+    return index
@@ -0,0 +1,40 @@
+from typing import Dict, Iterable, NamedTuple, Optional
+
+
+class TraceEvent(NamedTuple):
+    """
+    解释模式中的一次替换
+    kind: placeholder（占位符）/ full_value（完整值额外替换）/ name（纯名称额外替换）/ wildcard（通配符额外替换）
+    """
+    rule: str   # 规则类型
+    kind: str
+    old: str    # 占位符或被替换的模式
+    new: str
+
+
+class TraceSampler:
+    """
+    解释模式采样：决定哪些组合需要记录替换过程（未选中的组合走快速路径，不产生任何开销）
+    可序列化，随引擎一起发送到渲染进程
+    """
+
+    __slots__ = ("every", "values")
+
+    def __init__(self, every: int = 1, values: Optional[Iterable[str]] = None):
+        """
+        参数:
+            every: 每 every 个组合记录一个（按模板内的组合编号）
+            values: 只记录包含这些值（完整值或纯名称）的组合，为空时不限
+        """
+        self.every = max(1, every)
+        self.values = frozenset(values or ())
+
+    def wants(self, index: int, combo: Dict[str, str]) -> bool:
+        if index % self.every:
+            return False
+        if not self.values:
+            return True
+        return any(
+            value in self.values or value.split(":", 1)[-1] in self.values
+            for value in combo.values()
+        )
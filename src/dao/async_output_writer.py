@@ -0,0 +1,110 @@
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from src.dao.output_writer import OutputWriter
+
+
+class AsyncOutputWriter(OutputWriter):
+    """
+    异步输出写入器：调用方只负责格式化，磁盘写入交给后台写线程
+    待写队列有上限，队列满时 write() 阻塞（背压），内存占用不随输出数量增长
+    同名文件总由同一个写线程按提交顺序写入，结果与同步写入一致
+    stats["seconds"]["write"] 为各写线程写入耗时之和（与生成并行，可能超过墙钟时间）
+    写入失败不中断生成，记录在 stats["errors"] 中:
+    [{"filename": ..., "error": 异常类型, "message": 错误信息}]
+    """
+
+    _STOP = object()  # 写线程退出信号
+
+    def __init__(self, output_dir: Path, threads: int = 2, queue_size: int = 256, **kwargs):
+        """
+        参数:
+            threads: 写线程数
+            queue_size: 待写队列上限（同时驻留内存的输出数）
+            其余参数同 OutputWriter
+        """
+        super().__init__(output_dir, **kwargs)
+        self.threads = max(1, threads)
+        # 每个写线程一条队列，总容量为 queue_size
+        per_thread = max(1, queue_size // self.threads)
+        self._queues: List[queue.Queue] = [queue.Queue(maxsize=per_thread) for _ in range(self.threads)]
+        self._workers: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def write(self, filename: str, content: str, dry_run: bool = False,
+              input_hash: Optional[str] = None, json_checked: bool = False) -> Path:
+        """格式化后放入待写队列，立即返回（队列满时等待）"""
+        if dry_run:
+            return super().write(filename, content, dry_run, input_hash, json_checked)
+
+        with self._lock:
+            self.stats["total"] += 1
+            self.stats["regenerated"] += 1
+        output_path = self._output_path(filename)
+        started = time.perf_counter()
+        text = self._format(content, json_checked)
+        with self._lock:
+            self.stats["seconds"]["validate"] += time.perf_counter() - started
+            self.stats["bytes"] += len(text.encode("utf-8"))
+
+        # 先占位，清单条目顺序与提交顺序一致，不受写线程完成顺序影响
+        if self.manifest is not None:
+            self.manifest.keep(filename)
+
+        self._start_workers()
+        self._queues[hash(filename) % self.threads].put((filename, output_path, text, input_hash))
+        return output_path
+
+    def flush(self) -> None:
+        """等待队列中的输出全部写完，并停止写线程"""
+        if not self._workers:
+            return
+        for tasks in self._queues:
+            tasks.put(self._STOP)
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+
+    # ==================== 内部实现 ====================
+
+    def _start_workers(self) -> None:
+        """首次写入时启动写线程（flush 后再次写入会重新启动）"""
+        if self._workers:
+            return
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        for i, tasks in enumerate(self._queues):
+            worker = threading.Thread(target=self._drain, args=(tasks,),
+                                      name=f"output-writer-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def _drain(self, tasks: queue.Queue) -> None:
+        """写线程主循环：逐个取出待写输出，直到收到退出信号"""
+        while True:
+            task = tasks.get()
+            if task is self._STOP:
+                return
+            filename, output_path, text, input_hash = task
+            started = time.perf_counter()
+            try:
+                output_hash, written = self._store(filename, output_path, text)
+            except Exception as e:
+                with self._lock:
+                    self.stats["errors"].append({
+                        "filename": filename,
+                        "error": type(e).__name__,
+                        "message": str(e),
+                    })
+                    # 写入失败的文件不进入清单，下次运行会重新生成
+                    if self.manifest is not None:
+                        self.manifest.files.pop(filename, None)
+                continue
+
+            with self._lock:
+                if not written:
+                    self.stats["skipped_writes"] += 1
+                self._record(filename, input_hash, output_hash, output_path)
+                self.stats["seconds"]["write"] += time.perf_counter() - started
@@ -0,0 +1,125 @@
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+class BuildManifest:
+    """
+    构建清单：记录每个输出文件的输入指纹与输出摘要，用于增量生成和跳过相同写入
+    文件格式: {"version": 1, "settings": 写入设置, "files": {文件名: {"input": 输入指纹, "output": 内容摘要, "size": 字节数}}}
+    多个组合产出同名文件时（以最后一个为准），"input" 为最后一个的指纹，
+    "shadowed" 按顺序记录被覆盖的其余组合的指纹
+    写入设置（如输出格式）变化时，旧清单作废
+    persist=False 时清单只保存在内存中（不读写文件），在同一写入器的多次运行之间保持
+    """
+
+    FILENAME = ".recipe_manifest.json"
+    VERSION = 1
+
+    def __init__(self, output_dir: Path, settings: Optional[Dict] = None, persist: bool = True):
+        self.output_dir = output_dir
+        self.settings = settings or {}
+        self.persist = persist
+        self.path = output_dir / self.FILENAME
+        self.files: Dict[str, Dict[str, str]] = {}
+        self._seen: Dict[str, None] = {}  # 本次运行产出的文件（保持顺序）
+        self._inputs: Dict[str, List[str]] = {}  # 本次运行各文件依次由哪些输入产出
+
+    def rebase(self, output_dir: Path) -> None:
+        """切换清单所在目录（暂存输出时指向暂存目录）"""
+        self.output_dir = output_dir
+        self.path = output_dir / self.FILENAME
+
+    def load(self) -> None:
+        """加载清单；不存在或格式不符时视为空清单（全部重新生成）；只在内存中时沿用上次保存的条目"""
+        self._seen = {}
+        self._inputs = {}
+        if not self.persist:
+            return
+        self.files = {}
+        if not self.path.exists():
+            return
+        try:
+            with self.path.open("r", encoding="utf-8") as f:
+                raw_data = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"⚠️  构建清单无法读取，将全部重新生成: {self.path} ({e})")
+            return
+        if (raw_data.get("version") == self.VERSION
+                and raw_data.get("settings", {}) == self.settings
+                and isinstance(raw_data.get("files"), dict)):
+            self.files = raw_data["files"]
+
+    def save(self, keep_unseen: bool = False) -> None:
+        """
+        保存清单
+        参数:
+            keep_unseen: 保留本次未产出的条目（分片/续跑等只覆盖部分组合的运行）
+        """
+        names = self.files if keep_unseen else self._seen
+        files = {name: self.files[name] for name in names if name in self.files}
+        if not self.persist:
+            self.files = files
+            return
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        data = {"version": self.VERSION, "settings": self.settings, "files": files}
+        # 先写临时文件再替换：不会留下半截清单，也不会改动与其共享的硬链接
+        temp_path = self.path.with_name(self.FILENAME + ".tmp")
+        with temp_path.open("w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(temp_path, self.path)
+
+    def fresh_inputs(self) -> Dict[str, Tuple[str, ...]]:
+        """上次记录且输出文件仍存在的 {文件名: 依次产出该文件的输入指纹}（最后一个决定文件内容）"""
+        return {
+            name: (*entry.get("shadowed", ()), entry["input"])
+            for name, entry in self.files.items()
+            if "input" in entry and (self.output_dir / name).exists()
+        }
+
+    def get(self, filename: str) -> Optional[Dict[str, str]]:
+        return self.files.get(filename)
+
+    def record(self, filename: str, input_hash: Optional[str],
+               output_hash: Optional[str] = None, size: Optional[int] = None) -> None:
+        """记录本次产出的文件及其输入指纹、输出摘要"""
+        self._seen[filename] = None
+        entry = {}
+        if input_hash is not None:
+            self._set_input(entry, self._add_input(filename, input_hash))
+        if output_hash is not None:
+            entry["output"] = output_hash
+            entry["size"] = size
+        # 没有指纹和摘要时也保留条目：清理过期输出只依据清单中记录过的文件
+        self.files[filename] = entry
+
+    def keep(self, filename: str, input_hash: Optional[str] = None) -> None:
+        """记录本次产出但未重新生成的文件（沿用原条目，input_hash 为本次产出它的输入）"""
+        self._seen[filename] = None
+        entry = self.files.get(filename)
+        if input_hash is not None and entry is not None:
+            self._set_input(entry, self._add_input(filename, input_hash))
+
+    def _add_input(self, filename: str, input_hash: str) -> List[str]:
+        """追加本次产出该文件的输入（同一输入重新写入时不重复记录）"""
+        inputs = self._inputs.setdefault(filename, [])
+        if not inputs or inputs[-1] != input_hash:
+            inputs.append(input_hash)
+        return inputs
+
+    @staticmethod
+    def _set_input(entry: Dict, inputs: List[str]) -> None:
+        entry["input"] = inputs[-1]
+        if len(inputs) > 1:
+            entry["shadowed"] = inputs[:-1]
+        else:
+            entry.pop("shadowed", None)
+
+    def is_produced(self, filename: str) -> bool:
+        """本次运行是否产出了该文件"""
+        return filename in self._seen
+
+    def stale(self) -> List[str]:
+        """上次产出但本次未产出的文件"""
+        return [name for name in self.files if name not in self._seen]
@@ -0,0 +1,154 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# 文件签名: (修改时间 ns, 大小)；None 表示文件不存在
+Signature = Optional[Tuple[int, int]]
+
+# inotify 事件: 修改、属性、写入关闭、移入移出、创建删除、被监视目录自身删除或移动
+_IN_MASK = 0x2 | 0x4 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200 | 0x400 | 0x800
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+
+
+class FileWatcher:
+    """
+    文件监视：监视若干文件和目录（只看目录下一层的文件），返回发生变化的文件
+    Linux 下用 inotify 等待事件（通过 ctypes 调用 libc，无额外依赖），其他平台按间隔比较 stat；
+    两种方式都以 (修改时间, 大小) 快照的差异为准，inotify 只负责及时唤醒
+    """
+
+    def __init__(self, paths: Iterable[Path], interval: float = 0.5, settle: float = 0.05):
+        """
+        参数:
+            paths: 监视的文件或目录（文件可以暂不存在，创建后即报告变化）
+            interval: 轮询间隔（秒）；使用 inotify 时为检查停止信号的间隔
+            settle: 发现变化后等待写入平稳的时间（编辑器保存时常分多次写入或先删后建）
+        """
+        self.paths = [Path(os.path.abspath(p)) for p in paths]
+        self.interval = interval
+        self.settle = settle
+        self._snapshot = self._scan()
+        self._inotify = _Inotify.create(self._directories())
+        self.backend = "inotify" if self._inotify is not None else "polling"
+
+    def wait(self, stop: Optional[threading.Event] = None, timeout: Optional[float] = None) -> Set[Path]:
+        """
+        阻塞到有文件变化，返回变化的文件（新增、修改、删除）
+        stop 被设置或超时时返回空集合
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while stop is None or not stop.is_set():
+            step = self.interval
+            if deadline is not None:
+                step = min(step, max(0.0, deadline - time.monotonic()))
+            if self._inotify is not None:
+                woken = self._inotify.wait(step)
+            elif stop is not None:
+                woken = not stop.wait(step)
+            else:
+                time.sleep(step)
+                woken = True
+
+            changed = self._changes() if woken else set()
+            if changed:
+                while True:
+                    time.sleep(self.settle)
+                    more = self._changes()
+                    if not more:
+                        return changed
+                    changed |= more
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+        return set()
+
+    def close(self) -> None:
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def _changes(self) -> Set[Path]:
+        """重新扫描并与上次快照比较"""
+        snapshot = self._scan()
+        previous = self._snapshot
+        self._snapshot = snapshot
+        return {
+            path for path in snapshot.keys() | previous.keys()
+            if snapshot.get(path) != previous.get(path)
+        }
+
+    def _scan(self) -> Dict[Path, Signature]:
+        snapshot: Dict[Path, Signature] = {}
+        for path in self.paths:
+            if path.is_dir():
+                try:
+                    with os.scandir(path) as entries:
+                        for entry in entries:
+                            if entry.is_file():
+                                snapshot[Path(entry.path)] = _signature(entry.stat())
+                except OSError:
+                    pass
+            else:
+                try:
+                    snapshot[path] = _signature(os.stat(path))
+                except OSError:
+                    snapshot[path] = None
+        return snapshot
+
+    def _directories(self) -> List[Path]:
+        """inotify 需要监视的目录：监视的目录本身，以及监视的文件所在目录（编辑器常以替换方式保存）"""
+        directories = [path if path.is_dir() else path.parent for path in self.paths]
+        return list(dict.fromkeys(directories))
+
+
+def _signature(stat: os.stat_result) -> Signature:
+    return stat.st_mtime_ns, stat.st_size
+
+
+class _Inotify:
+    """libc inotify 的最小封装：只用于等待事件，事件内容不解析"""
+
+    def __init__(self, fd: int):
+        self.fd = fd
+
+    @classmethod
+    def create(cls, directories: List[Path]) -> Optional["_Inotify"]:
+        """创建并监视目录，当前平台不支持或失败时返回 None（调用方改为轮询）"""
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            init, add_watch = libc.inotify_init1, libc.inotify_add_watch
+        except (OSError, AttributeError):
+            return None
+        add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+
+        fd = init(_IN_NONBLOCK | _IN_CLOEXEC)
+        if fd < 0:
+            return None
+        for directory in directories:
+            if add_watch(fd, os.fsencode(directory), _IN_MASK) < 0:
+                os.close(fd)
+                return None
+        return cls(fd)
+
+    def wait(self, timeout: float) -> bool:
+        """等待事件并清空事件队列，返回是否有事件"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self) -> None:
+        os.close(self.fd)
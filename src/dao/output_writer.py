@@ -1,38 +1,280 @@
-
+import hashlib
 import json
+import os
+import time
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
+
+from src.dao.build_manifest import BuildManifest
+from src.dao.staging import StagingDirectory
 
 class OutputWriter:
-    """输出写入器：只负责写入文件和统计"""
-    
-    def __init__(self, output_dir: Path):
+    """
+    输出写入器：只负责写入文件和统计
+    stats["seconds"] 累计各环节耗时: validate（JSON校验与格式化）、write（写入磁盘）、
+    finalize（finish 中的清单保存、清理与暂存提交）；stats["bytes"] 为产出内容的字节数
+    """
+
+    OUTPUT_FORMATS = ("normalized", "raw")
+
+    def __init__(self, output_dir: Path, incremental: bool = False,
+                 write_if_changed: bool = False, prune: bool = False,
+                 output_format: str = "normalized", staged: bool = False,
+                 persist_manifest: bool = True):
+        """
+        参数:
+            output_dir: 输出目录
+            incremental: 增量生成，输入指纹未变化的输出由调用方跳过
+            write_if_changed: 内容与已有文件相同时跳过写入（不改动 mtime）
+            prune: 运行结束时删除本次不再产出的输出文件
+            output_format: normalized - 按 indent=2 格式化（默认），已按格式化模板渲染的内容不再解析
+                           raw - 原样写入渲染结果，已证明有效的内容不再解析
+            staged: 先写入目标目录旁的暂存目录，全部成功后才换入目标位置（fsync 在提交时统一执行）
+            persist_manifest: False 时构建清单只保存在内存中，不在输出目录留下清单文件
+                              （监视模式临时启用增量生成时使用）
+        """
+        if output_format not in self.OUTPUT_FORMATS:
+            raise ValueError(f"未知的输出格式: {output_format}（可选 {' / '.join(self.OUTPUT_FORMATS)}）")
         self.output_dir = output_dir
-        self.stats = {"total": 0}
-    
-    def write(self, filename: str, content: str, dry_run: bool = False) -> Path:
-        """写入输出文件"""
+        self.output_format = output_format
+        self.incremental = incremental
+        self.write_if_changed = write_if_changed
+        self.prune = prune
+        self.staging: Optional[StagingDirectory] = StagingDirectory(output_dir) if staged else None
+        self._written: List[Path] = []  # 暂存模式下本次新写入的文件，提交时统一 fsync
+        # 上述任一功能都依赖构建清单
+        self.manifest: Optional[BuildManifest] = (
+            BuildManifest(output_dir, settings={"output_format": output_format}, persist=persist_manifest)
+            if (incremental or write_if_changed or prune) else None
+        )
+        self.stats = self._empty_stats()
+
+    @staticmethod
+    def _empty_stats() -> Dict:
+        return {"total": 0, "unchanged": 0, "regenerated": 0, "removed": 0,
+                "skipped_writes": 0, "pruned": 0, "parsed": 0, "errors": [],
+                "committed": None, "bytes": 0,
+                "seconds": {"validate": 0.0, "write": 0.0, "finalize": 0.0}}
+
+    def begin_run(self) -> Dict[str, Tuple[str, ...]]:
+        """
+        开始一次运行：重置统计、准备暂存目录并加载构建清单
+        返回: 可跳过的 {文件名: 依次产出该文件的输入指纹}（未启用增量时为空）
+        """
+        self.stats = self._empty_stats()
+        if self.staging is not None:
+            self._written = []
+            self._rebase(self.staging.stage())
+        if self.manifest is None:
+            return {}
+        self.manifest.load()
+        return self.manifest.fresh_inputs() if self.incremental else {}
+
+    def mark_unchanged(self, filename: str, input_hash: Optional[str]) -> Path:
+        """记录输入未变化、无需重新生成的文件"""
+        self.stats["total"] += 1
+        self.stats["unchanged"] += 1
+        if self.manifest is not None:
+            self.manifest.keep(filename, input_hash)
+        return self.output_dir / filename
+
+    def write(self, filename: str, content: str, dry_run: bool = False,
+              input_hash: Optional[str] = None, json_checked: bool = False) -> Path:
+        """
+        写入输出文件
+        参数:
+            input_hash: 该文件的输入指纹，增量模式下记入清单
+            json_checked: 调用方已证明内容是有效JSON且符合输出格式（跳过解析与格式化）
+        """
         self.stats["total"] += 1
-        
+        self.stats["regenerated"] += 1
+        output_path = self._output_path(filename)
+
         if dry_run:
-            return self.output_dir / filename
-        
-        # 确保目录存在
-        self.output_dir.mkdir(parents=True, exist_ok=True)
-        
+            if self.manifest is not None:
+                self.manifest.record(filename, input_hash)
+            return output_path
+
+        started = time.perf_counter()
+        text = self._format(content, json_checked)
+        formatted = time.perf_counter()
+        output_hash, written = self._store(filename, output_path, text)
+        if not written:
+            self.stats["skipped_writes"] += 1
+        self._record(filename, input_hash, output_hash, output_path)
+        self.stats["seconds"]["validate"] += formatted - started
+        self.stats["seconds"]["write"] += time.perf_counter() - formatted
+        self.stats["bytes"] += len(text.encode("utf-8"))
+        return output_path
+
+    def write_data(self, filename: str, data, dry_run: bool = False) -> Path:
+        """把数据序列化为 indent=2 的JSON写入（不经过模板渲染，如本地化结果）"""
+        self.stats["total"] += 1
+        self.stats["regenerated"] += 1
+        output_path = self._output_path(filename)
+        if dry_run:
+            return output_path
+
+        started = time.perf_counter()
+        text = json.dumps(data, ensure_ascii=False, indent=2)
+        output_hash, written = self._store(filename, output_path, text)
+        if not written:
+            self.stats["skipped_writes"] += 1
+        self._record(filename, None, output_hash, output_path)
+        self.stats["seconds"]["write"] += time.perf_counter() - started
+        self.stats["bytes"] += len(text.encode("utf-8"))
+        return output_path
+
+    def flush(self) -> None:
+        """等待所有写入完成（同步写入器无需等待）"""
+
+    def abort(self) -> None:
+        """运行未完成（取消/出错）时调用：结束未完成的写入，不保存清单；暂存模式下丢弃暂存目录"""
+        self.flush()
+        self._discard_staging()
+
+    def finish(self, dry_run: bool = False, partial: bool = False) -> None:
+        """
+        结束一次运行：统计/清理本次不再产出的文件并保存清单
+        暂存模式下所有文件都写入成功才提交，否则丢弃暂存目录（stats["committed"]）
+        参数:
+            partial: 本次只覆盖部分组合（分片/续跑），保留未产出的条目且不清理
+        """
+        self.flush()
+        started = time.perf_counter()
+        if self.manifest is not None:
+            if partial:
+                if not dry_run:
+                    self.manifest.save(keep_unseen=True)
+            else:
+                stale = self.manifest.stale()
+                self.stats["removed"] = len(stale)
+                if self.prune:
+                    self.stats["pruned"] = self._prune(stale, dry_run)
+                if not dry_run:
+                    self.manifest.save()
+
+        if self.staging is not None:
+            if dry_run or self.stats["errors"]:
+                self._discard_staging()
+                self.stats["committed"] = False if self.stats["errors"] else None
+            else:
+                if self.manifest is not None and self.manifest.persist:
+                    self._written.append(self.manifest.path)
+                self.staging.commit(self._written)
+                self._rebase(self.staging.target)
+                self.stats["committed"] = True
+        self.stats["seconds"]["finalize"] += time.perf_counter() - started
+
+    def get_stats(self) -> Dict:
+        """获取统计信息"""
+        stats = self.stats.copy()
+        stats["errors"] = list(self.stats["errors"])
+        stats["seconds"] = dict(self.stats["seconds"])
+        return stats
+
+    # ==================== 内部实现 ====================
+
+    def _output_path(self, filename: str) -> Path:
+        """输出文件的目标路径"""
+        return self.output_dir / filename
+
+    def _rebase(self, output_dir: Path) -> None:
+        """切换实际写入的目录（暂存目录 / 目标目录）"""
+        self.output_dir = output_dir
+        if self.manifest is not None:
+            self.manifest.rebase(output_dir)
+
+    def _discard_staging(self) -> None:
+        if self.staging is not None:
+            self.staging.discard()
+            self._written = []
+            self._rebase(self.staging.target)
+
+    def _format(self, content: str, json_checked: bool) -> str:
+        """验证JSON格式并按输出格式生成最终文本"""
+        if json_checked:
+            return content
+
         # 验证JSON格式
+        self.stats["parsed"] += 1
         try:
             data = json.loads(content)
         except json.JSONDecodeError as e:
             raise ValueError(f"生成的内容不是有效JSON: {e}")
-        
+
+        if self.output_format == "raw":
+            return content
+        return json.dumps(data, indent=2, ensure_ascii=False)
+
+    def _store(self, filename: str, output_path: Path, text: str) -> Tuple[Optional[str], bool]:
+        """
+        把最终文本写入磁盘
+        返回: (输出摘要, 是否实际写入)；未启用跳过相同写入时摘要为 None
+        """
+        output_hash = None
+        if self.write_if_changed:
+            output_hash = hashlib.sha1(text.encode("utf-8")).hexdigest()
+            if self._is_identical(filename, output_path, text, output_hash):
+                return output_hash, False
+
+        # 确保目录存在
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+
+        if self.staging is not None:
+            # 暂存文件可能是目标文件的硬链接，先断开再写
+            try:
+                output_path.unlink()
+            except FileNotFoundError:
+                pass
+            self._written.append(output_path)
+
         # 写入文件
-        output_path = self.output_dir / filename
         with output_path.open("w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-        
-        return output_path
-    
-    def get_stats(self) -> Dict:
-        """获取统计信息"""
-        return self.stats.copy()
\ No newline at end of file
+            f.write(text)
+        return output_hash, True
+
+    def _record(self, filename: str, input_hash: Optional[str],
+                output_hash: Optional[str], output_path: Path) -> None:
+        """把本次产出写入清单（跳过相同写入时需要输出摘要和文件大小）"""
+        if self.manifest is None:
+            return
+        size = output_path.stat().st_size if output_hash is not None else None
+        self.manifest.record(filename, input_hash, output_hash, size)
+
+    def _is_identical(self, filename: str, output_path: Path, text: str, output_hash: str) -> bool:
+        """
+        判断已有文件内容是否与新内容相同
+        先比较大小；清单中有输出摘要时直接比较摘要，否则读取文件比较
+        """
+        try:
+            size = output_path.stat().st_size
+        except FileNotFoundError:
+            return False
+
+        entry = self.manifest.get(filename) if self.manifest is not None else None
+        if entry and "output" in entry and entry.get("size") == size:
+            return entry["output"] == output_hash
+
+        # 文本模式写入，Windows 下换行会扩展为 \r\n
+        expected = len(text.encode("utf-8"))
+        if os.linesep != "\n":
+            expected += text.count("\n") * (len(os.linesep) - 1)
+        if size != expected:
+            return False
+        return output_path.read_text(encoding="utf-8") == text
+
+    def _prune(self, stale, dry_run: bool) -> int:
+        """
+        删除不再产出的文件：只删除上次清单记录为产出、本次未产出的文件
+        清单之外的文件（用户放在输出目录中的其他文件）一律不动
+        """
+        pruned = 0
+        for name in stale:
+            path = self.output_dir / name
+            if not path.is_file():
+                continue
+            if not dry_run:
+                path.unlink()
+            pruned += 1
+        return pruned
@@ -0,0 +1,108 @@
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+
+class RenderCache:
+    """
+    磁盘渲染缓存：按渲染键（模板内容、组合、生效额外替换表的摘要）保存 apply() 的结果
+    每个条目一个文件（<键前两位>/<键>），写入时先写临时文件再替换，多个进程可同时读写
+    命中时刷新条目 mtime，trim() 按 mtime 从旧到新淘汰，直到总大小不超过上限（LRU）
+    命中/未命中计数只统计本进程，工作进程的计数由调用方通过 merge_stats 汇总
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = 256 * 1024 * 1024):
+        """
+        参数:
+            cache_dir: 缓存目录
+            max_bytes: 缓存总大小上限（字节）
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.stats = self._empty_stats()
+        self._stored = False  # 上次 trim 之后是否写入过新条目
+
+    @staticmethod
+    def _empty_stats() -> Dict[str, int]:
+        return {"hits": 0, "misses": 0, "stores": 0, "evicted": 0}
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存的渲染结果，未命中返回 None"""
+        path = self._path(key)
+        try:
+            text = path.read_text(encoding="utf-8")
+        except (OSError, UnicodeDecodeError):
+            self.stats["misses"] += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.stats["hits"] += 1
+        return text
+
+    def put(self, key: str, text: str) -> None:
+        """保存渲染结果（写入失败只影响缓存，不影响生成）"""
+        path = self._path(key)
+        temp_path = path.with_name(f"{key}.{os.getpid()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # newline="" 保证读回的文本与写入的逐字节一致
+            with temp_path.open("w", encoding="utf-8", newline="") as f:
+                f.write(text)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"⚠️  渲染缓存写入失败: {path} ({e})")
+            return
+        self.stats["stores"] += 1
+        self._stored = True
+
+    def trim(self, force: bool = False) -> int:
+        """
+        按 LRU 淘汰条目直到总大小不超过上限
+        参数:
+            force: 本进程未写入新条目时也扫描（默认跳过，避免每次预览都遍历缓存目录）
+        返回: 淘汰的条目数
+        """
+        if not (self._stored or force) or not self.cache_dir.is_dir():
+            return 0
+        self._stored = False
+
+        entries = []
+        total = 0
+        for path in self.cache_dir.glob("*/*"):
+            if path.suffix == ".tmp":
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        evicted = 0
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        self.stats["evicted"] += evicted
+        return evicted
+
+    def reset_stats(self) -> None:
+        self.stats = self._empty_stats()
+
+    def merge_stats(self, stats: Dict[str, int]) -> None:
+        """并入其他进程的计数（进程池渲染时）"""
+        for name, count in stats.items():
+            self.stats[name] = self.stats.get(name, 0) + count
+        if stats.get("stores"):
+            self._stored = True
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / key
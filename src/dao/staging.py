@@ -0,0 +1,107 @@
+import os
+import shutil
+from pathlib import Path
+from typing import Iterable
+
+
+class StagingDirectory:
+    """
+    暂存输出目录：运行期间写入目标目录旁的暂存目录，全部成功后再换入目标位置
+    暂存目录开始时是目标目录的硬链接副本（不支持硬链接时复制），未重写的文件无需复制内容；
+    重写文件前必须先删除暂存中的旧链接，避免修改目标目录中的同一文件
+    fsync 只在提交时统一执行一次
+    提交在两次重命名之间中断时目标目录缺失、旧输出只在备份目录中：下次暂存或提交前先把备份换回
+    """
+
+    def __init__(self, target: Path):
+        self.target = target
+        self.path = target.parent / f".{target.name}.staging"
+        self.backup = target.parent / f".{target.name}.old"
+
+    def stage(self) -> Path:
+        """创建暂存目录（清理上次中断遗留的暂存、恢复中断提交的备份），返回暂存目录路径"""
+        self.discard()
+        self.recover()
+        self.target.parent.mkdir(parents=True, exist_ok=True)
+        if self.target.is_dir():
+            shutil.copytree(self.target, self.path, copy_function=self._link_or_copy,
+                            ignore=self._ignore_staging)
+        else:
+            self.path.mkdir()
+        return self.path
+
+    def commit(self, written: Iterable[Path]) -> None:
+        """
+        提交：统一 fsync 本次写入的文件和目录，再把暂存目录换入目标位置
+        参数:
+            written: 本次新写入的文件（沿用的硬链接与目标目录共享数据，无需再次同步）
+        """
+        directories = {self.path}
+        for path in written:
+            _fsync_file(path)
+            directories.add(path.parent)
+        for directory in sorted(directories):
+            _fsync_dir(directory)
+
+        # 目录不能直接覆盖非空目录：先把旧目录移开，再换入暂存目录
+        # 备份只在目标目录存在时才是多余的（上次提交完成后未及删除）
+        self.recover()
+        if self.backup.exists():
+            shutil.rmtree(self.backup)
+        if self.target.exists():
+            os.rename(self.target, self.backup)
+        os.rename(self.path, self.target)
+        _fsync_dir(self.target.parent)
+        shutil.rmtree(self.backup, ignore_errors=True)
+
+    def recover(self) -> bool:
+        """目标目录缺失而备份存在（上次提交在两次重命名之间中断）时把备份换回，返回是否恢复"""
+        if self.target.exists() or not self.backup.is_dir():
+            return False
+        os.rename(self.backup, self.target)
+        _fsync_dir(self.target.parent)
+        print(f"⚠️  上次提交未完成，已从备份恢复输出目录: {self.target}")
+        return True
+
+    def discard(self) -> None:
+        """丢弃暂存目录，目标目录保持不变"""
+        if self.path.exists():
+            shutil.rmtree(self.path)
+
+    @staticmethod
+    def _link_or_copy(src: str, dst: str) -> None:
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+
+    @staticmethod
+    def _ignore_staging(directory: str, names):
+        """不复制嵌套输出目录（如 localization）自己的暂存/备份目录"""
+        return [name for name in names
+                if name.startswith(".") and name.endswith((".staging", ".old"))]
+
+
+def _fsync_file(path: Path) -> None:
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _fsync_dir(path: Path) -> None:
+    """同步目录项（Windows 不支持打开目录，忽略）"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
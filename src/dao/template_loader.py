@@ -1,13 +1,15 @@
 
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
+from src.dao.template_registry import TemplateRegistry, shared_registry
 from src.model.template import Template
 
 class TemplateLoader:
-    """模板加载器：只负责从磁盘加载模板文件"""
+    """模板加载器：只负责从磁盘加载模板文件（经模板注册表，未变化的文件不重复读取）"""
     
-    def __init__(self, template_dir: Path):
+    def __init__(self, template_dir: Path, registry: Optional[TemplateRegistry] = None):
         self.template_dir = template_dir
+        self.registry = registry if registry is not None else shared_registry
         self._validate_directory()
     
     def _validate_directory(self) -> None:
@@ -36,7 +38,7 @@ class TemplateLoader:
         for name in filenames:
             path = self.template_dir / name
             try:
-                templates[name] = Template(path)
+                templates[name] = self.registry.get(path)
             except FileNotFoundError:
                 print(f"⚠️  模板不存在: {path}")
             except (PermissionError, UnicodeDecodeError) as e:
@@ -47,7 +49,7 @@ class TemplateLoader:
         """加载单个模板"""
         path = self.template_dir / filename
         try:
-            return Template(path)
+            return self.registry.get(path)
         except FileNotFoundError:
             raise FileNotFoundError(f"模板不存在: {path}")
         except (PermissionError, UnicodeDecodeError) as e:
@@ -0,0 +1,90 @@
+import copy
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from src.model.template import Template
+
+# 文件签名: (修改时间 ns, 大小)
+Signature = Tuple[int, int]
+
+
+class _Entry:
+    __slots__ = ("signature", "template", "parsed")
+
+    def __init__(self, signature: Signature, template: Template):
+        self.signature = signature
+        self.template = template
+        self.parsed: Optional[Template] = None  # 内容解析为JSON对象的副本（首次需要时生成）
+
+
+class TemplateRegistry:
+    """
+    模板注册表：按 (路径, 修改时间, 大小) 缓存已加载的模板
+    同一文件只读取一次，占位符在加载时提取，渲染计划由引擎编译后挂在模板上一并缓存；
+    每次获取只做一次 stat，文件变化后才重新读取
+    返回的模板在多次加载、多个服务之间共享，调用方不应修改
+    """
+
+    def __init__(self):
+        self._entries: Dict[Path, _Entry] = {}
+        self._lock = threading.Lock()
+        self.stats = {"reads": 0, "reuses": 0}
+
+    def get(self, path: Path) -> Template:
+        """获取模板（未变化时直接返回缓存），异常同 Template"""
+        return self._entry(path).template
+
+    def get_parsed(self, path: Path) -> Template:
+        """
+        获取内容已解析的模板：.json 文件的内容为JSON对象，其他文件保持字符串
+        解析结果随原模板缓存，文件未变化时不重复解析
+        """
+        entry = self._entry(path)
+        with self._lock:
+            if entry.parsed is None:
+                parsed = copy.copy(entry.template)
+                parsed.plan = None
+                if path.name.endswith(".json"):
+                    parsed.content = json.loads(entry.template.content)
+                entry.parsed = parsed
+            return entry.parsed
+
+    def invalidate(self, path: Optional[Path] = None) -> None:
+        """丢弃某个模板（None 表示全部）的缓存，下次获取时重新读取"""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(self._key(path), None)
+
+    def _entry(self, path: Path) -> _Entry:
+        key = self._key(path)
+        try:
+            # 先取签名再读内容：读取期间文件被修改时，下次获取会因签名不同重新读取
+            stat = os.stat(key)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"模板文件不存在: {path}")
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.signature == signature:
+                self.stats["reuses"] += 1
+                return entry
+
+        entry = _Entry(signature, Template(path))
+        with self._lock:
+            self._entries[key] = entry
+            self.stats["reads"] += 1
+        return entry
+
+    @staticmethod
+    def _key(path: Path) -> Path:
+        return Path(os.path.abspath(path))
+
+
+# 进程内共享的注册表：重新加载配置后新建的 TemplateLoader 和各服务都使用它
+shared_registry = TemplateRegistry()
@@ -0,0 +1,59 @@
+import json
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, TextIO, Tuple
+
+
+class TraceRecorder:
+    """
+    解释模式跟踪记录：保存采样组合的结构化替换事件
+    未指定输出文件时事件保存在环形缓冲区中（超过上限丢弃最旧的），由调用方定期取出展示；
+    指定输出文件时逐条写入 NDJSON，不占用内存、不进入日志
+    NDJSON 每行: {"template", "index", "rule", "kind", "old", "new"}
+    """
+
+    def __init__(self, capacity: int = 200, output_path: Optional[Path] = None):
+        """
+        参数:
+            capacity: 环形缓冲区可保留的事件数
+            output_path: NDJSON 输出文件，None 表示保存在缓冲区
+        """
+        self.capacity = max(1, capacity)
+        self.output_path = output_path
+        self.recorded = 0  # 本次运行记录的事件总数
+        self.dropped = 0   # 因超出缓冲区上限被丢弃的事件数
+        self._buffer: Deque[Tuple[str, int, tuple]] = deque(maxlen=self.capacity)
+        self._file: Optional[TextIO] = None
+
+    def record(self, template: str, index: int, events: List[tuple]) -> None:
+        """记录一个组合的替换事件（TraceEvent 或等价元组）"""
+        self.recorded += len(events)
+        if self.output_path is not None:
+            if self._file is None:
+                self.output_path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = self.output_path.open("w", encoding="utf-8")
+            for rule, kind, old, new in events:
+                self._file.write(json.dumps({
+                    "template": template, "index": index,
+                    "rule": rule, "kind": kind, "old": old, "new": new,
+                }, ensure_ascii=False) + "\n")
+            return
+
+        self.dropped += max(0, len(self._buffer) + len(events) - self.capacity)
+        for event in events:
+            self._buffer.append((template, index, event))
+
+    def drain(self) -> List[Tuple[str, int, tuple]]:
+        """取出并清空缓冲区中的事件 [(模板名, 组合编号, 事件)]"""
+        events = list(self._buffer)
+        self._buffer.clear()
+        return events
+
+    def summary(self) -> Dict:
+        return {"recorded": self.recorded, "dropped": self.dropped,
+                "output": str(self.output_path) if self.output_path else None}
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
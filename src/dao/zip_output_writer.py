@@ -0,0 +1,152 @@
+import os
+import time
+import zipfile
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from src.dao.output_writer import OutputWriter
+
+
+class ZipOutputWriter(OutputWriter):
+    """
+    压缩包输出写入器：把输出直接写入单个 .zip（如数据包）中的指定目录
+    同名文件与写入目录时一样以最后一次为准，因此条目先暂存，
+    finish() 时一次性流式写入临时文件并替换原压缩包；运行未完成时原压缩包保持不变
+    时间戳、权限等元数据固定，全部条目按名称排序写入，相同输入得到逐字节相同的压缩包
+    （与配方、语言文件哪个服务最后写入无关）
+    压缩包中其他目录的已有条目（如另一服务写入的语言文件）原样保留；
+    分片/续跑等只覆盖部分组合的运行还保留本目录中本次未重新写入的条目
+    沿用的输出（mark_unchanged，如监视模式下未受影响的模板）从原压缩包复制对应条目
+    """
+
+    # zip 能表示的最早时间，作为所有条目的固定时间戳
+    FIXED_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+    def __init__(self, archive_path: Path, entry_dir: str,
+                 output_format: str = "normalized", compresslevel: int = 6):
+        """
+        参数:
+            archive_path: 压缩包路径
+            entry_dir: 输出在压缩包中的目录，如 "data/minecraft/recipes"
+            output_format: 同 OutputWriter
+            compresslevel: deflate 压缩级别
+        增量生成、跳过相同写入、清理过期输出不适用于压缩包（每次运行重写整个目录）
+        """
+        super().__init__(archive_path.parent, output_format=output_format)
+        self.archive_path = archive_path
+        self.entry_dir = entry_dir.strip("/")
+        self.compresslevel = compresslevel
+        self._entries: Dict[str, bytes] = {}  # 条目名 → 内容
+        self._previous: Optional[zipfile.ZipFile] = None  # 本次运行中打开的原压缩包（复制沿用的条目）
+
+    @property
+    def temp_path(self) -> Path:
+        return self.archive_path.with_name(self.archive_path.name + ".tmp")
+
+    def begin_run(self) -> Dict[str, Tuple[str, ...]]:
+        """开始一次运行：丢弃上次未完成的临时文件"""
+        self.abort()
+        return super().begin_run()
+
+    def mark_unchanged(self, filename: str, input_hash: Optional[str]) -> Path:
+        """沿用上次的输出：从原压缩包复制条目（原压缩包中没有该条目时无法沿用，不写入）"""
+        output_path = super().mark_unchanged(filename, input_hash)
+        name = self._entry_name(filename)
+        data = self._previous_entry(name)
+        if data is not None:
+            self._entries[name] = data
+        else:
+            print(f"⚠️  原压缩包中没有可沿用的条目: {name}")
+        return output_path
+
+    def finish(self, dry_run: bool = False, partial: bool = False) -> None:
+        """一次性写出压缩包并替换原文件（预览模式下不生成）；partial 时保留本目录中本次未重新写入的条目"""
+        super().finish(dry_run, partial)
+        self._close_previous()
+        if dry_run:
+            self.abort()
+            return
+
+        started = time.perf_counter()
+        self.archive_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            with zipfile.ZipFile(self.temp_path, "w", zipfile.ZIP_DEFLATED,
+                                 compresslevel=self.compresslevel) as archive:
+                entries = dict(self._preserved_entries(partial))
+                entries.update(self._entries)
+                for name in sorted(entries):
+                    self._add(archive, name, entries[name])
+            os.replace(self.temp_path, self.archive_path)
+        finally:
+            self.abort()
+            # 条目在此时才真正写入压缩包
+            self.stats["seconds"]["write"] += time.perf_counter() - started
+
+    def abort(self) -> None:
+        """放弃本次暂存的条目，保留原压缩包"""
+        self._close_previous()
+        self._entries = {}
+        if self.temp_path.exists():
+            self.temp_path.unlink()
+
+    # ==================== 内部实现 ====================
+
+    def _output_path(self, filename: str) -> Path:
+        """条目的显示路径: 压缩包路径/条目名"""
+        return self.archive_path / self._entry_name(filename)
+
+    def _entry_name(self, filename: str) -> str:
+        return f"{self.entry_dir}/{filename}" if self.entry_dir else filename
+
+    def _previous_entry(self, name: str) -> Optional[bytes]:
+        """原压缩包中的条目内容（首次调用时打开原压缩包，finish/abort 时关闭）"""
+        if self._previous is None:
+            if not self.archive_path.is_file():
+                return None
+            try:
+                self._previous = zipfile.ZipFile(self.archive_path)
+            except zipfile.BadZipFile as e:
+                print(f"⚠️  原压缩包无法读取: {self.archive_path} ({e})")
+                return None
+        try:
+            return self._previous.read(name)
+        except KeyError:
+            return None
+
+    def _close_previous(self) -> None:
+        if self._previous is not None:
+            self._previous.close()
+            self._previous = None
+
+    def _preserved_entries(self, partial: bool):
+        """
+        原压缩包中需要保留的条目：不属于本写入器目录的条目，
+        以及 partial（只覆盖部分组合）时本目录中本次未重新写入的条目
+        """
+        if not self.archive_path.is_file():
+            return
+        prefix = f"{self.entry_dir}/" if self.entry_dir else ""
+        if not prefix and not partial:
+            return
+        try:
+            with zipfile.ZipFile(self.archive_path) as previous:
+                for info in previous.infolist():
+                    if info.filename in self._entries:
+                        continue
+                    if partial or not info.filename.startswith(prefix):
+                        yield info.filename, previous.read(info)
+        except zipfile.BadZipFile as e:
+            print(f"⚠️  原压缩包无法读取，将重新生成: {self.archive_path} ({e})")
+
+    def _add(self, archive: zipfile.ZipFile, name: str, data: bytes) -> None:
+        """写入一个元数据固定的条目"""
+        info = zipfile.ZipInfo(name, date_time=self.FIXED_DATE_TIME)
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.create_system = 3                 # 固定为 Unix，避免不同平台结果不同
+        info.external_attr = 0o644 << 16
+        archive.writestr(info, data, compresslevel=self.compresslevel)
+
+    def _store(self, filename: str, output_path: Path, text: str) -> Tuple[Optional[str], bool]:
+        """暂存条目（同名覆盖，位置保持首次写入时的顺序）"""
+        self._entries[self._entry_name(filename)] = text.encode("utf-8")
+        return None, True
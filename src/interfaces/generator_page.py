@@ -45,6 +45,11 @@ class GeneratorPage(BasePage):
             ft.Checkbox(label="解释模式", value=False)
         )
         
+        watch_switch = self.add_component(
+            "watch_switch",
+            ft.Switch(label="监视模式", value=False, on_change=self._handle_watch)
+        )
+        
         generate_btn = self.add_component(
             "generate_btn",
             ft.ElevatedButton(
@@ -94,7 +99,7 @@ class GeneratorPage(BasePage):
             content=ft.Column([
                 ft.Text("⚙️ 配方生成器", size=24, weight=ft.FontWeight.BOLD),
                 load_btn,
-                ft.Row([dry_run_checkbox, explain_checkbox], spacing=20),
+                ft.Row([dry_run_checkbox, explain_checkbox, watch_switch], spacing=20),
                 ft.Row([generate_btn, cancel_btn, open_btn], spacing=10),
             ], spacing=15),
             padding=20,
@@ -146,6 +151,30 @@ class GeneratorPage(BasePage):
             cancel_btn.disabled = True
             self.page.update()
     
+    def _handle_watch(self, e: ft.ControlEvent):
+        """监视开关 - 打开后配置或模板变化时自动重新生成受影响的模板"""
+        watch_switch = self.get_component("watch_switch")
+        generate_btn = self.get_component("generate_btn")
+        
+        if not watch_switch.value:
+            self.recipe_service.stop_watch()
+            generate_btn.disabled = False
+            self.log_message("👀 监视已关闭", is_info=True)
+            self.page.update()
+            return
+        
+        generate_btn.disabled = True
+        self.page.update()
+        success = self.recipe_service.start_watch(
+            dry_run=self.get_component("dry_run_checkbox").value,
+            explain_mode=self.get_component("explain_checkbox").value
+        )
+        if not success:
+            self.log_message("❌ 监视启动失败，请检查配置", is_error=True)
+            watch_switch.value = False
+            generate_btn.disabled = False
+            self.page.update()
+    
     def _handle_open_output_dir(self, e: ft.ControlEvent):
         """打开输出目录"""
         try:
@@ -171,9 +200,9 @@ class GeneratorPage(BasePage):
         """完成回调"""
         self._on_progress(f"\n✅ 生成完成！总计: {stats['total']} 个文件")
         
-        # 恢复按钮
+        # 恢复按钮（监视中保持禁用）
         generate_btn = self.get_component("generate_btn")
-        generate_btn.disabled = False
+        generate_btn.disabled = self.recipe_service.is_watching
         cancel_btn = self.get_component("cancel_btn")
         cancel_btn.disabled = True
         
@@ -190,9 +219,9 @@ class GeneratorPage(BasePage):
         """错误回调"""
         self._on_progress(f"\n❌ 错误: {error}")
         
-        # 恢复按钮
+        # 恢复按钮（监视中保持禁用）
         generate_btn = self.get_component("generate_btn")
-        generate_btn.disabled = False
+        generate_btn.disabled = self.recipe_service.is_watching
         cancel_btn = self.get_component("cancel_btn")
         cancel_btn.disabled = True
         self.page.update()
@@ -129,6 +129,11 @@ class LocalizerPage(BasePage):
             ft.Checkbox(label="解释模式（显示详细替换）", value=False)
         )
         
+        watch_switch = self.add_component(
+            "watch_switch",
+            ft.Switch(label="监视模式", value=False, on_change=self._handle_watch)
+        )
+        
         generate_btn = self.add_component(
             "generate_btn",
             ft.ElevatedButton(
@@ -154,7 +159,7 @@ class LocalizerPage(BasePage):
         control_panel = ft.Container(
             content=ft.Column([
                 ft.Text("⚙️ 生成控制", size=16, weight=ft.FontWeight.BOLD),
-                ft.Row([dry_run_checkbox, explain_checkbox], spacing=20),
+                ft.Row([dry_run_checkbox, explain_checkbox, watch_switch], spacing=20),
                 ft.Row([generate_btn, open_output_btn], spacing=10)
             ], spacing=15),
             padding=20,
@@ -374,6 +379,30 @@ class LocalizerPage(BasePage):
         generate_btn.disabled = False
         self.page.update()
     
+    def _handle_watch(self, e: ft.ControlEvent):
+        """监视开关 - 打开后配置、BatchItem或模板变化时自动重新生成受影响的BatchItem"""
+        watch_switch = self.get_component("watch_switch")
+        generate_btn = self.get_component("generate_btn")
+        
+        if not watch_switch.value:
+            self.localizer_service.stop_watch()
+            generate_btn.disabled = False
+            self.log_message("👀 监视已关闭", is_info=True)
+            self.page.update()
+            return
+        
+        dropdown = self.get_component("template_dropdown")
+        success = bool(dropdown.value) and self.localizer_service.start_watch(
+            template_name=dropdown.value,
+            dry_run=self.get_component("dry_run_checkbox").value,
+            explain_mode=self.get_component("explain_checkbox").value
+        )
+        if not success:
+            self.log_message("❌ 监视启动失败，请先加载配置并选择模板", is_error=True)
+            watch_switch.value = False
+        generate_btn.disabled = success
+        self.page.update()
+    
     def _handle_open_output_dir(self, e: ft.ControlEvent):
         """打开输出目录"""
         try:
@@ -402,18 +431,18 @@ class LocalizerPage(BasePage):
         
         self._update_stats()
         
-        # 恢复按钮
+        # 恢复按钮（监视中保持禁用）
         generate_btn = self.get_component("generate_btn")
-        generate_btn.disabled = False
+        generate_btn.disabled = self.localizer_service.is_watching
         self.page.update()
     
     def _on_error(self, error: Exception):
         """错误回调"""
         self.log_message(f"❌ 错误: {error}", is_error=True)
         
-        # 恢复按钮
+        # 恢复按钮（监视中保持禁用）
         generate_btn = self.get_component("generate_btn")
-        generate_btn.disabled = False
+        generate_btn.disabled = self.localizer_service.is_watching
         self.page.update()
     
     # ==================== 辅助方法 ====================
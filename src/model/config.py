@@ -41,6 +41,51 @@ class ReplacementRule:
         }
 
 
+@dataclass
+class CombinationConstraint:
+    """
+    组合约束模型：在枚举笛卡尔积时剪掉无意义的搭配
+    when 中的每个规则都取到列出的值时约束生效（when 为空表示总是生效），此时：
+        include: 规则只能取列出的值
+        exclude: 规则不能取列出的值
+    值可以写完整值（"minecraft:oak"）或纯名称（"oak"）
+    templates 为空表示作用于所有模板；约束引用的规则不全在模板中时不作用于该模板
+    """
+    name: str = ""
+    when: Dict[str, List[str]] = field(default_factory=dict)
+    include: Dict[str, List[str]] = field(default_factory=dict)
+    exclude: Dict[str, List[str]] = field(default_factory=dict)
+    templates: List[str] = field(default_factory=list)
+    enabled: bool = True
+    description: str = ""
+
+    @classmethod
+    def create(cls, data: Dict[str, Any]) -> 'CombinationConstraint':
+        """工厂方法：只提取已定义的字段，忽略未知参数"""
+        field_names = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in data.items() if k in field_names})
+
+    @property
+    def types(self) -> List[str]:
+        """约束引用的规则类型"""
+        return list(dict.fromkeys([*self.when, *self.include, *self.exclude]))
+
+    def applies_to(self, template_name: str) -> bool:
+        return self.enabled and (not self.templates or template_name in self.templates)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """序列化为字典，用于JSON输出"""
+        return {
+            "name": self.name,
+            "when": self.when,
+            "include": self.include,
+            "exclude": self.exclude,
+            "templates": self.templates,
+            "enabled": self.enabled,
+            "description": self.description
+        }
+
+
 class Config:
     """配置数据容器"""
     
@@ -49,10 +94,34 @@ class Config:
         self.template_dir = raw_data.get("template_dir", "./templates")
         self.default_namespace = raw_data.get("default_namespace", "minecraft:")
         self._template_files = raw_data.get("template_files", [])
+        self.jobs = max(1, int(raw_data.get("jobs", 1)))  # 并行渲染进程数，1 表示串行
+        self.executor = raw_data.get("executor", "process")  # 本地化并发方式: process / thread
+        self.incremental = bool(raw_data.get("incremental", False))  # 增量生成（跳过输入未变化的输出）
+        self.write_if_changed = bool(raw_data.get("write_if_changed", False))  # 内容相同时不重写文件
+        self.prune_stale = bool(raw_data.get("prune_stale", False))  # 清理不再产出的输出文件
+        self.output_format = raw_data.get("output_format", "normalized")  # normalized: 重新格式化 / raw: 原样写入
+        self.writer_threads = max(0, int(raw_data.get("writer_threads", 0)))  # 后台写线程数，0 表示同步写入
+        self.write_queue_size = max(1, int(raw_data.get("write_queue_size", 256)))  # 待写队列上限
+        self.staged_output = bool(raw_data.get("staged_output", False))  # 先写暂存目录，成功后整体换入
+        self.output_archive = raw_data.get("output_archive") or None  # 输出压缩包路径，未设置时写入目录
+        self.archive_namespace = raw_data.get("archive_namespace") or None  # 压缩包中的命名空间，默认取 default_namespace
+        self.archive_recipe_dir = raw_data.get("archive_recipe_dir", "data/{namespace}/recipes")
+        self.archive_lang_dir = raw_data.get("archive_lang_dir", "assets/{namespace}/lang")
+        self.render_cache_dir = raw_data.get("render_cache_dir") or None  # 磁盘渲染缓存目录，未设置时不缓存
+        self.render_cache_max_mb = max(1, int(raw_data.get("render_cache_max_mb", 256)))  # 渲染缓存大小上限（MB）
+        self.explain_every = max(1, int(raw_data.get("explain_every", 1)))  # 解释模式每 N 个组合记录一个
+        self.explain_values = list(raw_data.get("explain_values", []))  # 解释模式只记录含这些值的组合，空表示不限
+        self.explain_buffer = max(1, int(raw_data.get("explain_buffer", 200)))  # 解释事件环形缓冲区上限
+        self.explain_output = raw_data.get("explain_output") or None  # 解释事件写入的 NDJSON 文件，未设置时输出到日志
+        self.rule_report = raw_data.get("rule_report") or None  # 额外替换命中报告的JSON路径，未设置时只输出到日志
         self._rules = [
             ReplacementRule.create(rule)
             for rule in raw_data.get("replacements", [])
         ]
+        self.constraints = [
+            CombinationConstraint.create(constraint)
+            for constraint in raw_data.get("constraints", [])
+        ]
 
     @classmethod
     def from_dict(cls, raw_data: Dict[str, Any]) -> 'Config':
@@ -68,6 +137,17 @@ class Config:
             raise NotADirectoryError(f"模板目录路径不是有效目录: {self.template_dir}")
         return dir_path
 
+    def archive_entry_dir(self, kind: str) -> str:
+        """
+        压缩包中的输出目录
+        参数:
+            kind: "recipes" 或 "lang"
+        返回: 如 "data/minecraft/recipes"（命名空间为空时使用 minecraft）
+        """
+        namespace = self.archive_namespace or self.default_namespace.rstrip(":") or "minecraft"
+        pattern = self.archive_recipe_dir if kind == "recipes" else self.archive_lang_dir
+        return pattern.format(namespace=namespace)
+
     @property
     def output_dir_path(self) -> Path:
         """返回: Path对象（已验证存在性）"""
@@ -150,7 +230,28 @@ class Config:
             "template_dir": self.template_dir,
             "default_namespace": self.default_namespace,
             "template_files": self.template_files,
-            "replacements": [rule.to_dict() for rule in self.rules]
+            "jobs": self.jobs,
+            "executor": self.executor,
+            "incremental": self.incremental,
+            "write_if_changed": self.write_if_changed,
+            "prune_stale": self.prune_stale,
+            "output_format": self.output_format,
+            "writer_threads": self.writer_threads,
+            "write_queue_size": self.write_queue_size,
+            "staged_output": self.staged_output,
+            "output_archive": self.output_archive,
+            "archive_namespace": self.archive_namespace,
+            "archive_recipe_dir": self.archive_recipe_dir,
+            "archive_lang_dir": self.archive_lang_dir,
+            "render_cache_dir": self.render_cache_dir,
+            "render_cache_max_mb": self.render_cache_max_mb,
+            "explain_every": self.explain_every,
+            "explain_values": self.explain_values,
+            "explain_buffer": self.explain_buffer,
+            "explain_output": self.explain_output,
+            "rule_report": self.rule_report,
+            "replacements": [rule.to_dict() for rule in self.rules],
+            "constraints": [constraint.to_dict() for constraint in self.constraints]
         }
 
     # ========== 新增：便捷的修改方法 ==========
@@ -10,6 +10,7 @@ class Template:
         self.path = path
         self.content = ""
         self.placeholders = []
+        self.plan = None  # 渲染计划（引擎首次编译时填入，随模板一起缓存）
         
         # 初始化时加载内容并提取占位符
         self._load_content()
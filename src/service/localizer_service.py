@@ -1,12 +1,20 @@
 
-import json
+import os
+import threading
+import time
 from pathlib import Path
-from typing import Optional, Dict, Any, List, Callable
+from typing import Optional, Dict, Any, List, Callable, Set
 from src.core.localization_engine import LocalizationEngine
 from src.dao.batch_item_dao import BatchItemDAO
 from src.dao.template_loader import TemplateLoader
 from src.dao.config_dao import ConfigDAO
+from src.dao.file_watcher import FileWatcher
+from src.dao.output_writer import OutputWriter
+from src.dao.zip_output_writer import ZipOutputWriter
 from src.model.batch_item import BatchItem
+from src.service.stage_timer import StageTimer
+from src.service.profiling import run_profiled
+from src.service.rule_report import format_rule_report, save_rule_report
 
 class LocalizerService:
     """
@@ -14,6 +22,8 @@ class LocalizerService:
     职责：配置管理、BatchItem加载、模板加载、引擎调用、结果输出
     """
     
+    PROFILE_NAME = "localizer_profile"  # 性能分析结果文件名前缀
+    
     def __init__(self, config_path: str = "config.json"):
         self.config_path = Path(config_path)
         self.config = None
@@ -32,8 +42,16 @@ class LocalizerService:
             "successful_items": 0,
             "failed_items": 0,
             "total_entries": 0,
-            "template_files": 0
+            "template_files": 0,
+            "errors": [],
+            "timings": StageTimer().report()
         }
+        self._timer = StageTimer()        # 最近一次生成的分阶段计时
+        self._config_load_seconds = 0.0   # 最近一次加载配置（含BatchItem）的耗时
+        self._template_load_seconds = 0.0  # 最近一次加载模板的耗时
+        self._writer: Optional[OutputWriter] = None  # 最近一次生成使用的写入器
+        self._results: Dict[str, Dict[str, Dict[str, str]]] = {}  # 各模板最近一次的生成结果（监视模式合并用）
+        self._watch_stop: Optional[threading.Event] = None  # 监视模式的停止信号（未监视时为 None）
     
     def set_callbacks(self, 
                      on_progress: Optional[Callable[[str], None]] = None,
@@ -61,6 +79,7 @@ class LocalizerService:
         """
         try:
             # 1. 加载配置
+            started = time.perf_counter()
             self._log("📄 正在加载配置文件...")
             self.config = ConfigDAO.load(str(self.config_path))
             
@@ -69,6 +88,8 @@ class LocalizerService:
             config_dir = self.config_path.parent
             self.batch_items = BatchItemDAO.load(str(config_dir))
             
+            self._results = {}
+            
             # 3. 初始化模板加载器
             self.template_loader = TemplateLoader(self.config.template_dir_path)
             
@@ -79,7 +100,10 @@ class LocalizerService:
                 items=self.batch_items
             )
             
+            self._config_load_seconds = time.perf_counter() - started
+            
             # 5. 加载模板
+            started = time.perf_counter()
             if not self.config.template_files:
                 self._log("⚠️ 未配置模板文件，请先添加模板", is_error=True)
                 return False
@@ -88,6 +112,7 @@ class LocalizerService:
                 self.config.template_dir_path,
                 *self.config.template_files
             )
+            self._template_load_seconds = time.perf_counter() - started
             
             # 更新统计
             self.stats["template_files"] = len(self.config.template_files)
@@ -104,13 +129,18 @@ class LocalizerService:
             return False
     
     def start_generation(self, template_name: str, dry_run: bool = False, 
-                        explain_mode: bool = False) -> bool:
+                        explain_mode: bool = False, jobs: Optional[int] = None,
+                        executor: Optional[str] = None, profile: bool = False) -> bool:
         """
         启动批量生成流程
         参数:
             template_name: 模板文件名
             dry_run: 预览模式（不写入文件）
             explain_mode: 解释模式（显示详细替换过程）
+            jobs: 并发数，None 时使用配置中的 jobs
+            executor: 并发方式 thread / process，None 时使用配置中的 executor
+            profile: 在 cProfile 下运行，结果（.pstats 和折叠栈）写入输出目录
+                     （只分析当前线程，进程池模式下的工作进程不在结果中）
         返回: 是否成功启动
         """
         if not self.engine or not self.config:
@@ -121,6 +151,23 @@ class LocalizerService:
             self._log(f"❌ 模板不存在: {template_name}", is_error=True)
             return False
         
+        args = (template_name, dry_run, explain_mode, jobs, executor)
+        if not profile:
+            return self._run_generation(*args)
+        
+        success, paths = run_profiled(lambda: self._run_generation(*args),
+                                      self.config.output_dir_path, self.PROFILE_NAME)
+        self._log(f"🔬 性能分析结果: {paths['pstats']}")
+        self._log(f"   折叠栈（火焰图）: {paths['collapsed']}")
+        return success
+    
+    def _run_generation(self, template_name: str, dry_run: bool, explain_mode: bool,
+                        jobs: Optional[int], executor: Optional[str],
+                        item_ids: Optional[Set[str]] = None) -> bool:
+        """
+        执行生成（参数同 start_generation）
+        item_ids: 只重新生成这些BatchItem（监视模式），其余沿用上次的结果；None 表示全部生成
+        """
         try:
             self._log(f"\n🚀 开始生成: 模板 '{template_name}'")
             if dry_run:
@@ -128,21 +175,50 @@ class LocalizerService:
             if explain_mode:
                 self._log("🔍 解释模式已启用（显示详细替换过程）")
             
-            # 重置统计
+            # 重置统计（配置与模板在 reload_config 中加载，计入本次运行）
+            self._timer = StageTimer()
+            self._timer.add("config_load", self._config_load_seconds)
+            self._timer.add("template_load", self._template_load_seconds)
+            self._writer = None
             self.stats["successful_items"] = 0
             self.stats["failed_items"] = 0
             self.stats["total_entries"] = 0
+            self.stats["errors"] = []
+            
+            # 执行生成（只统计本次运行的额外替换命中）
+            self.engine.take_rule_hits()
+            selected = None
+            if item_ids is not None:
+                selected = [item_id for item_id in self.engine.items if item_id in item_ids]
+                self._log(f"🔁 只重新生成 {len(selected)} 个BatchItem")
+            with self._timer.stage("render"):
+                results = self.engine.generate_batch(
+                    template_name,
+                    workers=jobs or self.config.jobs,
+                    executor=executor or self.config.executor,
+                    item_ids=selected
+                )
+            if item_ids is not None:
+                results = self._merge_results(template_name, results, item_ids)
+            self._results[template_name] = results
             
-            # 执行生成
-            results = self.engine.generate_batch(template_name)
+            # 失败项汇总（不中断流程）
+            for error in self.engine.errors:
+                self._log(f"生成失败: {error['item_id']} ({error['error']}: {error['message']})", is_error=True)
             
             # 处理结果
             if not dry_run:
-                self._save_results(results, template_name)
+                self._save_results(results, template_name, item_ids)
             
             # 更新统计
             self.stats["successful_items"] = len(results)
+            self.stats["failed_items"] = len(self.engine.errors)
+            self.stats["errors"] = list(self.engine.errors)
             self.stats["total_entries"] = sum(len(entries) for entries in results.values())
+            with self._timer.stage("summary"):
+                self.stats["rule_hits"] = self._report_rule_hits(partial=item_ids is not None)
+            self._timer.finish()
+            self.stats["timings"] = self._timing_report()
             
             # 完成回调
             if self._on_complete:
@@ -157,36 +233,237 @@ class LocalizerService:
                 self._on_error(ex)
             return False
     
-    def _save_results(self, results: Dict[str, Dict[str, str]], template_name: str):
-        """保存生成结果到文件"""
-        output_dir = self.config.output_dir_path / "localization"
-        output_dir.mkdir(parents=True, exist_ok=True)
-        
-        # 为每个BatchItem生成独立文件
-        for item_id, entries in results.items():
-            if not entries:
-                continue
-            
-            # 生成文件名: oak.json, crimson.json 等
-            item_key = item_id.split(":")[-1]
-            filename = f"{item_key}.json"
-            filepath = output_dir / filename
+    @property
+    def status(self) -> Dict[str, Any]:
+        """统计信息与最近一次生成的分阶段计时（生成进行中时为当前进度）"""
+        return {**self.stats, "errors": list(self.stats["errors"]), "timings": self._timing_report()}
+    
+    def _report_rule_hits(self, partial: bool = False) -> Dict[str, Any]:
+        """
+        汇总本次生成的额外替换命中，输出从未命中和最常命中的条目
+        partial: 只重新生成了部分BatchItem，只把可证明不会命中的条目列为从未命中
+        """
+        reachable = self.engine.extra_reachability() if partial else None
+        report = self.engine.rule_hit_report(self.engine.take_rule_hits(), reachable=reachable)
+        lines = format_rule_report(report)
+        if lines:
+            self._log("\n".join(lines))
+        saved = save_rule_report(report, self.config.rule_report)
+        if saved:
+            self._log(f"  命中报告已写入: {saved}")
+        return report
+    
+    def _timing_report(self) -> Dict[str, Any]:
+        """各阶段耗时与吞吐量（校验、写入、收尾阶段取自写入器统计）"""
+        outputs = output_bytes = 0
+        if self._writer is not None:
+            writer_stats = self._writer.stats
+            self._timer.seconds.update(writer_stats["seconds"])
+            outputs, output_bytes = writer_stats["total"], writer_stats["bytes"]
+        return self._timer.report(outputs, output_bytes)
+    
+    def _save_results(self, results: Dict[str, Dict[str, str]], template_name: str,
+                      item_ids: Optional[Set[str]] = None):
+        """
+        保存生成结果到文件（或数据包压缩包的语言目录）
+        item_ids: 只写入这些BatchItem的文件（汇总文件总是重写）；压缩包整体重写，忽略此参数
+        """
+        writer = self._writer = self._create_writer()
+        writer.begin_run()
+        if self.config.output_archive:
+            item_ids = None
+        try:
+            # 为每个BatchItem生成独立文件
+            for item_id, entries in results.items():
+                if not entries:
+                    continue
+                if item_ids is not None and item_id not in item_ids:
+                    continue
+                
+                # 生成文件名: oak.json, crimson.json 等
+                item_key = item_id.split(":")[-1]
+                filename = f"{item_key}.json"
+                writer.write_data(filename, entries)
+                
+                self._log(f"  💾 已保存: {filename} ({len(entries)} 条)")
             
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(entries, f, ensure_ascii=False, indent=2)
+            # 生成汇总文件
+            summary_name = f"_all_{template_name.replace('.json', '')}.json"
+            with self._timer.stage("summary"):
+                all_entries = {}
+                for entries in results.values():
+                    all_entries.update(entries)
             
-            self._log(f"  💾 已保存: {filename} ({len(entries)} 条)")
+            writer.write_data(summary_name, all_entries)
+            writer.finish()
+        except Exception:
+            writer.abort()
+            raise
+        
+        stats = writer.get_stats()
+        for error in stats["errors"]:
+            self._log(f"写入失败: {error['filename']} ({error['error']}: {error['message']})", is_error=True)
+        if stats["committed"] is False:
+            self._log("暂存输出已丢弃，输出目录保持不变", is_error=True)
+        self._log(f"  📊 汇总文件: {summary_name} ({len(all_entries)} 条总计)")
+    
+    def _merge_results(self, template_name: str, results: Dict[str, Dict[str, str]],
+                       item_ids: Set[str]) -> Dict[str, Dict[str, str]]:
+        """把重新生成的结果并入上次的结果（按BatchItem顺序；已移除或本次失败的项不保留）"""
+        previous = self._results.get(template_name, {})
+        merged = {}
+        for item_id in self.engine.items:
+            if item_id in item_ids:
+                if item_id in results:
+                    merged[item_id] = results[item_id]
+            elif item_id in previous:
+                merged[item_id] = previous[item_id]
+        return merged
+    
+    # ==================== 监视模式 ====================
+    
+    def watch(self, template_name: str, dry_run: bool = False, explain_mode: bool = False,
+              jobs: Optional[int] = None, executor: Optional[str] = None, interval: float = 0.5) -> bool:
+        """
+        监视模式（阻塞，直到 stop_watch 或 Ctrl+C）：先完整生成一次，之后配置文件、batch_items.json
+        或模板目录变化时，只重新生成变化的BatchItem（规则或模板变化时为全部BatchItem），其余沿用上次的结果
+        引擎（只丢弃变化规则的缓存）和模板注册表在两次生成之间保持
+        已移除的BatchItem不再出现在汇总文件中，其单独文件保留在输出目录
+        参数:
+            interval: 没有 inotify 时的轮询间隔（秒）
+        返回: 是否成功启动
+        """
+        if not self.engine and not self.reload_config():
+            return False
+        if template_name not in self.engine.templates:
+            self._log(f"❌ 模板不存在: {template_name}", is_error=True)
+            return False
         
-        # 生成汇总文件
-        summary_file = output_dir / f"_all_{template_name.replace('.json', '')}.json"
-        all_entries = {}
-        for entries in results.values():
-            all_entries.update(entries)
+        stop = self._watch_stop = self._watch_stop or threading.Event()
+        watcher = self._create_watcher(interval)
+        self._log(f"👀 监视模式（{watcher.backend}）: {self.config_path} | {self._batch_items_path()} | {self.config.template_dir}")
+        args = (template_name, dry_run, explain_mode, jobs, executor)
+        try:
+            self._run_generation(*args)
+            while not stop.is_set():
+                changed = watcher.wait(stop)
+                if not changed:
+                    continue
+                started = time.perf_counter()
+                template_dir = self.config.template_dir
+                item_ids = self._apply_changes(changed, template_name)
+                if self.config.template_dir != template_dir:
+                    watcher.close()
+                    watcher = self._create_watcher(interval)
+                if item_ids is not None and not item_ids:
+                    continue
+                # 丢弃已编辑掉的旧版本模板文本的缓存
+                self.engine.retain_texts(self.engine.template_texts())
+                self._run_generation(*args, item_ids)
+                self._log(f"⚡ 本次更新耗时 {time.perf_counter() - started:.3f}s")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
+            self._watch_stop = None
+            self._log("👀 监视已停止")
+        return True
+    
+    def start_watch(self, template_name: str, dry_run: bool = False, explain_mode: bool = False,
+                    jobs: Optional[int] = None, executor: Optional[str] = None) -> bool:
+        """在后台线程启动监视模式（供Page调用），参数同 watch"""
+        if self._watch_stop is not None:
+            self._log("⚠️ 监视模式已在运行")
+            return False
+        self._watch_stop = threading.Event()
+        thread = threading.Thread(
+            target=self.watch,
+            args=(template_name, dry_run, explain_mode, jobs, executor),
+            daemon=True
+        )
+        thread.start()
+        return True
+    
+    def stop_watch(self):
+        """停止监视（正在进行的生成会先完成）"""
+        if self._watch_stop is not None:
+            self._watch_stop.set()
+    
+    @property
+    def is_watching(self) -> bool:
+        return self._watch_stop is not None
+    
+    def _batch_items_path(self) -> Path:
+        return self.config_path.parent / BatchItemDAO.DEFAULT_FILENAME
+    
+    def _create_watcher(self, interval: float) -> FileWatcher:
+        """监视配置文件、batch_items.json 和模板目录"""
+        return FileWatcher([self.config_path, self._batch_items_path(), self.config.template_dir_path], interval)
+    
+    def _apply_changes(self, changed: Set[Path], template_name: str) -> Optional[Set[str]]:
+        """
+        按变化的文件更新配置、BatchItem和模板
+        返回: 需要重新生成的BatchItem（含已移除的项）；None 表示全部重新生成
+        """
+        self._log(f"\n🔄 文件变化: {', '.join(sorted(path.name for path in changed))}")
+        regenerate_all = False
+        if Path(os.path.abspath(self.config_path)) in changed:
+            try:
+                config = ConfigDAO.load(str(self.config_path))
+            except Exception as ex:
+                self._log(f"配置无效，继续使用上一版: {ex}", is_error=True)
+                return set()
+            current, updated = self.config.to_dict(), config.to_dict()
+            current.pop("replacements")
+            updated.pop("replacements")
+            if current != updated:
+                self._log("⚙️  设置已变化，重新加载")
+                return None if self.reload_config() else set()
+            changed_types = self.engine.update_rules(config.rules)
+            self.config = config
+            if changed_types:
+                self._log(f"  规则变化: {', '.join(sorted(changed_types))}")
+                regenerate_all = True
         
-        with open(summary_file, 'w', encoding='utf-8') as f:
-            json.dump(all_entries, f, ensure_ascii=False, indent=2)
+        affected: Set[str] = set()
+        if Path(os.path.abspath(self._batch_items_path())) in changed:
+            try:
+                items = BatchItemDAO.load(str(self.config_path.parent))
+            except Exception as ex:
+                self._log(f"BatchItem配置无效，继续使用上一版: {ex}", is_error=True)
+                items = self.batch_items
+            previous = self.batch_items
+            updated_ids = {
+                item_id for item_id, item in items.items()
+                if item_id not in previous or previous[item_id].to_dict() != item.to_dict()
+            }
+            removed_ids = previous.keys() - items.keys()
+            if updated_ids or removed_ids:
+                self._log(f"  BatchItem变化: 新增或修改 {len(updated_ids)} 个，移除 {len(removed_ids)} 个")
+            affected = updated_ids | removed_ids
+            self.batch_items = self.engine.items = items
+            self.stats["total_items"] = len(items)
         
-        self._log(f"  📊 汇总文件: {summary_file.name} ({len(all_entries)} 条总计)")
+        template_dir = Path(os.path.abspath(self.config.template_dir_path))
+        templates = [
+            path.name for path in changed
+            if path.parent == template_dir and path.name in self.config.template_files
+        ]
+        if templates:
+            self.engine.load_templates(self.config.template_dir_path, *templates)
+            regenerate_all = regenerate_all or template_name in templates
+        
+        if regenerate_all:
+            return None
+        if not affected:
+            self._log("  没有受影响的BatchItem")
+        return affected
+    
+    def _create_writer(self) -> OutputWriter:
+        """按配置创建输出写入器：目录 output/localization 或压缩包的语言目录"""
+        if self.config.output_archive:
+            return ZipOutputWriter(Path(self.config.output_archive), self.config.archive_entry_dir("lang"))
+        return OutputWriter(self.config.output_dir_path / "localization", staged=self.config.staged_output)
     
     def get_batch_items_by_category(self, category: str = "material") -> List[BatchItem]:
         """按类别获取BatchItem列表"""
@@ -201,5 +478,7 @@ class LocalizerService:
     def get_output_directory(self) -> str:
         """获取输出目录路径"""
         if self.config:
+            if self.config.output_archive:
+                return str(Path(self.config.output_archive))
             return str(self.config.output_dir_path / "localization")
         return "./output/localization"
\ No newline at end of file
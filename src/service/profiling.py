@@ -0,0 +1,89 @@
+import cProfile
+import pstats
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+# pstats 中的函数标识: (文件名, 行号, 函数名)
+FunctionKey = Tuple[str, int, str]
+
+
+def run_profiled(func: Callable[[], Any], output_dir: Path, name: str) -> Tuple[Any, Dict[str, Path]]:
+    """
+    在 cProfile 下执行 func，把结果写入输出目录（func 抛出异常时同样写出）
+    只记录调用线程；进程池工作进程和后台写线程不在其中
+    参数:
+        output_dir: 结果目录
+        name: 文件名前缀，生成 <name>.pstats 和 <name>.collapsed.txt
+    返回:
+        (func 的返回值, {"pstats": 路径, "collapsed": 路径})
+    """
+    profiler = cProfile.Profile()
+    try:
+        result = profiler.runcall(func)
+    finally:
+        paths = write_profile(profiler, output_dir, name)
+    return result, paths
+
+
+def write_profile(profiler: cProfile.Profile, output_dir: Path, name: str) -> Dict[str, Path]:
+    """写出 .pstats（供 pstats/snakeviz 等读取）和折叠栈文本（供 flamegraph.pl/speedscope 读取）"""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    stats_path = output_dir / f"{name}.pstats"
+    collapsed_path = output_dir / f"{name}.collapsed.txt"
+
+    profiler.dump_stats(str(stats_path))
+    stats = pstats.Stats(profiler)
+    with collapsed_path.open("w", encoding="utf-8") as f:
+        for stack, microseconds in collapse_stacks(stats.stats):
+            f.write(f"{';'.join(stack)} {microseconds}\n")
+    return {"pstats": stats_path, "collapsed": collapsed_path}
+
+
+def collapse_stacks(raw_stats: Dict, min_microseconds: int = 1) -> List[Tuple[List[str], int]]:
+    """
+    把 cProfile 的调用图展开为折叠栈: [(从根到叶的函数名列表, 自身耗时微秒)]
+    cProfile 只记录 调用方→被调用方 的边，不记录完整调用栈；
+    展开时按每条边的累计耗时占比分摊被调用函数的自身耗时和下游调用，递归调用只展开一次
+    """
+    callees: Dict[FunctionKey, List[Tuple[FunctionKey, float]]] = {}
+    roots = []
+    for func, (_, _, _, _, callers) in raw_stats.items():
+        if not callers:
+            roots.append(func)
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+
+    stacks: Dict[Tuple[str, ...], float] = {}
+
+    def visit(func: FunctionKey, share: float, path: Tuple[str, ...], active: frozenset) -> None:
+        own = raw_stats[func][2]
+        path = path + (_label(func),)
+        active = active | {func}
+        stacks[path] = stacks.get(path, 0.0) + own * share
+        for callee, edge_cumulative in callees.get(func, ()):
+            if callee in active:
+                continue
+            callee_cumulative = raw_stats[callee][3]
+            if callee_cumulative <= 0:
+                continue
+            child_share = edge_cumulative * share / callee_cumulative
+            if edge_cumulative * share * 1e6 >= min_microseconds:
+                visit(callee, child_share, path, active)
+
+    for root in sorted(roots, key=lambda f: -raw_stats[f][3]):
+        visit(root, 1.0, (), frozenset())
+
+    return [
+        (list(stack), int(round(seconds * 1e6)))
+        for stack, seconds in stacks.items()
+        if seconds * 1e6 >= min_microseconds
+    ]
+
+
+def _label(func: FunctionKey) -> str:
+    """函数的折叠栈标签: 函数名 (文件名:行号)，内置函数只有名称"""
+    filename, line, name = func
+    if filename == "~" and line == 0:
+        return name
+    return f"{name} ({Path(filename).name}:{line})".replace(";", ",")
+
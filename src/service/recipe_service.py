@@ -6,22 +6,135 @@ RecipeService - 配方生成服务（架构图中的GeneratorService）
 """
 
 import threading
+import itertools
 import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, Any, Optional, Callable, List, Tuple
+from typing import Dict, Any, Optional, Callable, List, NamedTuple, Set, Tuple
 from io import StringIO
 
 from src.model.config import Config
 from src.dao.config_dao import ConfigDAO
 from src.dao.template_loader import TemplateLoader
 from src.dao.output_writer import OutputWriter
+from src.dao.async_output_writer import AsyncOutputWriter
+from src.dao.zip_output_writer import ZipOutputWriter
+from src.dao.render_cache import RenderCache
+from src.dao.trace_recorder import TraceRecorder
+from src.dao.file_watcher import FileWatcher
+from src.model.template import Template
 from src.core.engine import ReplacementEngine
+from src.core.trace import TraceEvent, TraceSampler
 from src.service.settings_service import SettingsService
+from src.service.stage_timer import StageTimer
+from src.service.profiling import run_profiled
+from src.service.rule_report import format_rule_report, save_rule_report
+
+
+# ==================== 组合渲染（串行与进程池共用） ====================
+
+# 每个工作进程只接收一次的引擎、模板和增量快照（由进程池 initializer 注入）
+_worker_engine: Optional[ReplacementEngine] = None
+_worker_templates: Dict[str, Any] = {}
+_worker_fresh: Dict[str, Tuple[str, ...]] = {}
+_worker_cache: Optional[RenderCache] = None
+
+
+class RenderedOutput(NamedTuple):
+    """单个组合的渲染结果"""
+    filename: str
+    content: Optional[str]            # None 表示输入未变化、跳过渲染
+    trace: Optional[List[TraceEvent]]  # 解释模式下被采样组合的替换事件
+    input_hash: Optional[str]
+    json_checked: bool = False        # 已在编译期证明是有效JSON且符合输出格式，写入时无需解析
+
+
+def _render_combo(engine: ReplacementEngine, template, combo: Dict, traced: bool,
+                  fresh: Optional[Dict[str, Tuple[str, ...]]] = None, output_format: Optional[str] = None,
+                  cache: Optional[RenderCache] = None) -> RenderedOutput:
+    """
+    渲染单个组合
+    traced 为 True 时记录替换事件（解释模式下被采样的组合）
+    fresh 为上次运行的 {文件名: 依次产出该文件的输入指纹}；指纹在其中时跳过渲染，内容返回 None
+    （同名文件以最后一个产出为准，由调用方按本次的产出顺序决定是否补渲染）
+    output_format 为写入器的输出格式时尝试免解析证明输出有效: raw 时原样可写，
+    normalized 时改为渲染编译期格式化好的模板；None 表示不尝试
+    cache 为磁盘渲染缓存（记录替换事件的组合需要逐步跟踪，不走缓存）
+    """
+    filename = engine.apply(template.path.name, combo, None)
+    filename = filename.replace(":", "_").replace("/", "_").replace("\\", "_")
+    
+    input_hash = None
+    if fresh is not None:
+        input_hash = engine.fingerprint(template, combo)
+        if input_hash in fresh.get(filename, ()):
+            return RenderedOutput(filename, None, None, input_hash)
+    
+    source, json_checked = template.content, False
+    if output_format == "normalized":
+        normalized = engine.normalized_content(template.content, combo)
+        if normalized is not None:
+            source, json_checked = normalized, True
+    elif output_format == "raw":
+        json_checked = engine.is_json_safe(template.content, combo)
+    
+    trace = [] if traced else None
+    if cache is not None and trace is None:
+        content, _ = engine.apply_cached(source, combo, cache)
+    else:
+        content = engine.apply(source, combo, trace)
+    return RenderedOutput(filename, content, trace, input_hash, json_checked)
+
+
+def _init_worker(engine: ReplacementEngine, templates: Dict[str, Any],
+                 fresh: Optional[Dict[str, Tuple[str, ...]]] = None, cache: Optional[RenderCache] = None):
+    """进程池初始化：每个工作进程反序列化一次预编译的引擎"""
+    global _worker_engine, _worker_templates, _worker_fresh, _worker_cache
+    engine.take_rule_hits()  # 丢弃随引擎一起复制过来的主进程计数
+    _worker_engine = engine
+    _worker_templates = templates
+    _worker_fresh = fresh
+    _worker_cache = cache
+
+
+def _render_chunk(template_name: str, start: int, stop: int, sampler: Optional[TraceSampler],
+                  output_format: Optional[str]) -> Tuple[List[Tuple[int, RenderedOutput]], Dict[str, Any]]:
+    """
+    工作进程任务：按编号区间渲染一段组合
+    sampler 为解释模式的采样器（None 表示不记录替换事件）
+    返回: ([(局部编号, 渲染结果)], 本段统计)
+          本段统计: {"pruned": {约束名: 剪掉的组合数}, "cache": 渲染缓存计数,
+                    "seconds": {"enumerate": 秒, "render": 秒}, "rule_hits": 额外替换命中}
+    """
+    template = _worker_templates[template_name]
+    pruned: Dict[str, int] = {}
+    if _worker_cache is not None:
+        _worker_cache.reset_stats()
+    timer = StageTimer()
+    results = []
+    combos = timer.timed("enumerate", _worker_engine.iter_indexed_combinations(template, start, stop, pruned))
+    for index, combo in combos:
+        with timer.stage("render"):
+            traced = sampler is not None and sampler.wants(index, combo)
+            results.append((index, _render_combo(_worker_engine, template, combo, traced,
+                                                 _worker_fresh, output_format, _worker_cache)))
+    return results, {
+        "pruned": pruned,
+        "cache": _worker_cache.stats if _worker_cache is not None else {},
+        "seconds": {"enumerate": timer.seconds["enumerate"], "render": timer.seconds["render"]},
+        "rule_hits": _worker_engine.take_rule_hits(),
+    }
 
 
 class RecipeService:
     """配方生成服务"""
     
+    PARALLEL_CHUNK_SIZE = 256  # 并行渲染时每个任务的最大组合数
+    PROFILE_NAME = "recipe_profile"  # 性能分析结果文件名前缀
+    
     def __init__(self, settings_service: Optional['SettingsService'] = None):
 
         # 依赖注入
@@ -32,6 +145,7 @@ class RecipeService:
         self.engine: Optional[ReplacementEngine] = None
         self.template_loader: Optional[TemplateLoader] = None
         self.output_writer: Optional[OutputWriter] = None
+        self.render_cache: Optional[RenderCache] = None
         
         # 业务状态（生成任务的生命周期）
         self._is_running = False          # 任务是否在运行
@@ -39,6 +153,22 @@ class RecipeService:
         self._processed_count = 0         # 已处理数量
         self._current_template_name = ""  # 当前模板名
         self._total_templates = 0         # 总模板数
+        self._next_index = 0              # 下一个待处理的全局组合编号（续跑用）
+        self._jobs = 1                    # 本次任务的渲染进程数
+        self._fresh: Optional[Dict[str, Tuple[str, ...]]] = None  # 增量模式下可跳过的 {文件名: 输入指纹}
+        self._written: Set[str] = set()  # 本次运行已写入的文件名（同名文件以最后一个产出为准）
+        self._shadowed: Dict[str, Tuple[str, int, str]] = {}  # 沿用但上次被其他组合覆盖的文件 → (模板名, 局部编号, 输入指纹)
+        self._pruned: Dict[str, int] = {}  # 本次任务各约束剪掉的组合数
+        self._timer = StageTimer()        # 本次任务的分阶段计时
+        self._config_load_seconds = 0.0   # 最近一次加载配置的耗时
+        self._worker_seconds: Dict[str, float] = {}  # 并行渲染时各工作进程累计的忙碌时间
+        self._sampler: Optional[TraceSampler] = None    # 解释模式的组合采样器
+        self._tracer: Optional[TraceRecorder] = None    # 解释模式的替换事件记录
+        self._outputs: Dict[str, List[str]] = {}  # 各模板最近一次完整处理产出的文件名（监视模式沿用）
+        self._config_path: Optional[str] = None   # 最近一次加载的配置文件
+        self._watch_stop: Optional[threading.Event] = None  # 监视模式的停止信号（未监视时为 None）
+        self._watch_incremental = False  # 监视期间临时启用增量生成（不改动配置）
+        self.config_overrides: Dict[str, Any] = {}  # 命令行覆盖的配置项（重新加载配置后重新应用）
         
         # 业务回调（通知外部状态变化）
         self.on_progress: Optional[Callable[[str], None]] = None
@@ -66,8 +196,10 @@ class RecipeService:
                 print("⚠️  配置为空")
                 return False
             
+            started = time.perf_counter()
             self.config = Config.from_dict(config_dict)
             self._initialize_components()
+            self._config_load_seconds = time.perf_counter() - started
             self._log("✅ 配置已从SettingsService同步")
             return True
         except Exception as ex:
@@ -77,47 +209,64 @@ class RecipeService:
     def load_config_from_file(self, config_path: str = "config.json") -> bool:
         """从文件加载配置（备用方法）"""
         try:
+            started = time.perf_counter()
             self.config = ConfigDAO.load(config_path)
+            self._apply_overrides(self.config)
+            self._config_path = config_path
             self._initialize_components()
+            self._config_load_seconds = time.perf_counter() - started
             return True
         except Exception as ex:
             print(f"❌ 加载配置文件失败: {ex}")
             return False
     
-    def start_generation(self, dry_run: bool = False, explain_mode: bool = False) -> bool:
+    def override_config(self, **values: Any) -> None:
+        """覆盖配置项（如命令行的解释模式选项），监视模式重新加载配置后仍然生效"""
+        self.config_overrides.update(values)
+        if self.config is not None:
+            self._apply_overrides(self.config)
+    
+    def _apply_overrides(self, config: Config) -> None:
+        for key, value in self.config_overrides.items():
+            setattr(config, key, value)
+    
+    def start_generation(self, dry_run: bool = False, explain_mode: bool = False,
+                         shard: Optional[Tuple[int, int]] = None, start_index: int = 0,
+                         jobs: Optional[int] = None, profile: bool = False) -> bool:
         """
         开始生成配方（核心方法）
         参数:
             dry_run: 预览模式
             explain_mode: 解释模式
+            shard: 分片 (i, N)，只生成全部组合中的第 i 片（i 从 0 开始）
+            start_index: 从全局组合编号 start_index 开始（用于中断后续跑）
+            jobs: 并行渲染进程数，None 时使用配置中的 jobs
+            profile: 在 cProfile 下运行，结果（.pstats 和折叠栈）写入输出目录
         返回:
             是否成功启动
         """
-        if self._is_running:
-            self._log("⚠️ 任务已在运行中")
-            return False
-        
-        if not self.config or not self.config.template_files:
-            self._log("❌ 未加载配置或未选择模板")
+        if not self._prepare_run(shard, start_index):
             return False
         
-        # 重置状态
-        self._is_running = True
-        self._cancel_requested = False
-        self._processed_count = 0
-        self._current_template_name = ""
-        self._total_templates = len(self.config.template_files)
-        
         # 在后台线程执行
         thread = threading.Thread(
-            target=self._run_internal,
-            args=(dry_run, explain_mode),
+            target=self._run_maybe_profiled,
+            args=(profile, dry_run, explain_mode, shard, start_index, jobs),
             daemon=True
         )
         thread.start()
         
         return True
     
+    def run(self, dry_run: bool = False, explain_mode: bool = False,
+            shard: Optional[Tuple[int, int]] = None, start_index: int = 0,
+            jobs: Optional[int] = None, profile: bool = False) -> bool:
+        """同步执行生成（命令行使用），参数同 start_generation"""
+        if not self._prepare_run(shard, start_index):
+            return False
+        
+        return self._run_maybe_profiled(profile, dry_run, explain_mode, shard, start_index, jobs)
+    
     def cancel_generation(self):
         """取消生成"""
         self._cancel_requested = True
@@ -142,6 +291,8 @@ class RecipeService:
             "processed_count": self._processed_count,
             "current_template": self._current_template_name,
             "total_templates": self._total_templates,
+            "next_index": self._next_index,
+            "timings": self._timing_report(),
         }
     
     def set_callbacks(
@@ -168,23 +319,25 @@ class RecipeService:
         
         try:
             # 调用DAO直接加载模板
-            templates = self.template_loader.load_all(self.config.template_files[:1])
+            templates = self._load_templates(self.config.template_files[:1])
             if not templates:
                 return []
             
             # 生成预览
             previews = []
             first_template = list(templates.values())[0]
-            combos = self.engine.generate_combinations(first_template)
+            combos = self.engine.iter_combinations(first_template)
             
-            for combo in combos[:limit]:
+            for combo in itertools.islice(combos, limit):
                 # 生成文件名
                 filename = self.engine.apply(first_template.path.name, combo, None)
                 filename = filename.replace(":", "_")
                 
                 # 生成内容
-                explain_log = []  # 预览时不需要解释
-                content = self.engine.apply(first_template.content, combo, explain_log)
+                if self.render_cache is not None:
+                    content, _ = self.engine.apply_cached(first_template.content, combo, self.render_cache)
+                else:
+                    content = self.engine.apply(first_template.content, combo, None)
                 
                 # 格式化内容
                 try:
@@ -195,6 +348,8 @@ class RecipeService:
                 
                 previews.append((filename, formatted))
             
+            if self.render_cache is not None:
+                self.render_cache.trim()
             return previews
             
         except Exception as ex:
@@ -205,98 +360,660 @@ class RecipeService:
         """获取当前输出目录"""
         return self.config.output_dir if self.config else "./output"
     
+    # ==================== 监视模式 ====================
+    
+    def watch(self, config_path: Optional[str] = None, dry_run: bool = False,
+              explain_mode: bool = False, jobs: Optional[int] = None, interval: float = 0.5) -> bool:
+        """
+        监视模式（阻塞，直到 stop_watch 或 Ctrl+C）：先完整生成一次，之后配置文件或模板目录变化时
+        只重新生成受影响的模板，其余模板沿用上次的输出
+        引擎（只丢弃变化规则的缓存）、模板注册表和渲染缓存在两次生成之间保持；
+        监视期间启用增量生成（不改动配置，监视结束后恢复），受影响模板中输入未变化的组合同样跳过
+        参数:
+            config_path: 配置文件，None 时使用最近一次加载的配置文件
+            interval: 没有 inotify 时的轮询间隔（秒）
+        返回: 是否成功启动
+        """
+        settings_path = self.settings_service.config_path if self.settings_service else None
+        config_path = config_path or self._config_path or settings_path or "config.json"
+        if self.config is None and not self.load_config_from_file(config_path):
+            return False
+        if not self.config.incremental:
+            self._watch_incremental = True
+            self.output_writer = self._create_output_writer()
+        
+        stop = self._watch_stop = self._watch_stop or threading.Event()
+        watcher = self._create_watcher(config_path, interval)
+        self._log(f"👀 监视模式（{watcher.backend}）: {config_path} | {self.config.template_dir}")
+        try:
+            self._watch_run(dry_run, explain_mode, jobs)
+            while not stop.is_set():
+                changed = watcher.wait(stop)
+                if not changed:
+                    continue
+                started = time.perf_counter()
+                template_dir = self.config.template_dir
+                only = self._apply_changes(changed, config_path)
+                if self.config.template_dir != template_dir:
+                    watcher.close()
+                    watcher = self._create_watcher(config_path, interval)
+                if only is not None and not only:
+                    continue
+                self._watch_run(dry_run, explain_mode, jobs, only)
+                self._log(f"⚡ 本次更新耗时 {time.perf_counter() - started:.3f}s")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
+            self._watch_stop = None
+            if self._watch_incremental:
+                # 恢复按配置创建的写入器，之后的普通运行不再增量生成
+                self._watch_incremental = False
+                self.output_writer = self._create_output_writer()
+            self._log("👀 监视已停止")
+        return True
+    
+    def start_watch(self, config_path: Optional[str] = None, dry_run: bool = False,
+                    explain_mode: bool = False, jobs: Optional[int] = None) -> bool:
+        """在后台线程启动监视模式（供Page调用），参数同 watch"""
+        if self._watch_stop is not None:
+            self._log("⚠️ 监视模式已在运行")
+            return False
+        if self._is_running:
+            self._log("⚠️ 任务已在运行中")
+            return False
+        self._watch_stop = threading.Event()
+        thread = threading.Thread(
+            target=self.watch,
+            args=(config_path, dry_run, explain_mode, jobs),
+            daemon=True
+        )
+        thread.start()
+        return True
+    
+    def stop_watch(self):
+        """停止监视（正在进行的生成会先完成）"""
+        if self._watch_stop is not None:
+            self._watch_stop.set()
+    
+    @property
+    def is_watching(self) -> bool:
+        return self._watch_stop is not None
+    
     # ==================== 内部实现 ====================
     
-    def _run_internal(self, dry_run: bool, explain_mode: bool):
-        """内部同步执行（在后台线程）"""
+    def _prepare_run(self, shard: Optional[Tuple[int, int]], start_index: int) -> bool:
+        """校验参数并重置任务状态"""
+        if self._is_running:
+            self._log("⚠️ 任务已在运行中")
+            return False
+        
+        if not self.config or not self.config.template_files:
+            self._log("❌ 未加载配置或未选择模板")
+            return False
+        
+        if shard is not None:
+            index, count = shard
+            if count < 1 or not 0 <= index < count:
+                self._log(f"❌ 无效分片: {index}/{count}")
+                return False
+        
+        if start_index < 0:
+            self._log(f"❌ 无效起始编号: {start_index}")
+            return False
+        
+        # 重置状态
+        self._is_running = True
+        self._cancel_requested = False
+        self._processed_count = 0
+        self._current_template_name = ""
+        self._total_templates = len(self.config.template_files)
+        self._next_index = start_index
+        self._pruned = {}
+        self._timer = StageTimer()
+        self._timer.add("config_load", self._config_load_seconds)
+        self._worker_seconds = {}
+        return True
+    
+    def _run_maybe_profiled(self, profile: bool, *args) -> bool:
+        """
+        执行 _run_internal，profile 为 True 时在 cProfile 下执行并写出结果
+        只分析运行生成的线程：并行渲染的工作进程和后台写线程不在结果中
+        """
+        if not profile:
+            return self._run_internal(*args)
+        
+        if self.config.output_archive:
+            profile_dir = Path(self.config.output_archive).parent
+        else:
+            profile_dir = Path(self.config.output_dir)
+        success, paths = run_profiled(lambda: self._run_internal(*args), profile_dir, self.PROFILE_NAME)
+        self._log(f"🔬 性能分析结果: {paths['pstats']}")
+        self._log(f"   折叠栈（火焰图）: {paths['collapsed']}")
+        return success
+    
+    def _run_internal(self, dry_run: bool, explain_mode: bool,
+                      shard: Optional[Tuple[int, int]] = None, start_index: int = 0,
+                      jobs: Optional[int] = None, only: Optional[Set[str]] = None) -> bool:
+        """
+        内部同步执行（在后台线程），返回是否完整执行
+        only: 只处理这些模板（监视模式），其余模板沿用上次完整处理的输出；None 表示全部处理
+        """
+        pool = None
         try:
             self._log("\n🚀 开始生成配方...")
             
             # 1. 调用DAO加载模板
-            templates = self.template_loader.load_all(self.config.template_files)
+            with self._timer.stage("template_load"):
+                templates = self._load_templates(self.config.template_files)
+                if self.is_watching:
+                    # 丢弃已编辑掉的旧版本模板文本的缓存（监视期间内存不随编辑次数增长）
+                    self.engine.retain_texts(
+                        text for template in templates.values() for text in (template.content, template.path.name)
+                    )
             if not templates:
                 self._log("⚠️  没有可用的模板，请检查配置。")
-                return
+                return False
             
             self._log(f"📂 加载了 {len(templates)} 个模板")
             
-            # 2. 处理每个模板
+            # 2. 计算本次负责的全局组合编号区间
+            ranges = self._plan_ranges(templates, shard, start_index)
+            
+            # 增量模式：加载构建清单（解释模式需要完整日志，不跳过）
+            fresh = self.output_writer.begin_run()
+            self._fresh = fresh if self.output_writer.incremental and not explain_mode else None
+            self._written = set()
+            self._shadowed = {}
+            self._start_trace(explain_mode)
+            self.engine.take_rule_hits()  # 只统计本次运行（丢弃预览等产生的计数）
+            if self.render_cache is not None:
+                self.render_cache.reset_stats()
+            
+            # 3. 多进程时只序列化一次引擎和模板
+            jobs = max(1, jobs or self.config.jobs)
+            self._jobs = jobs
+            if jobs > 1:
+                pool = ProcessPoolExecutor(
+                    max_workers=jobs,
+                    initializer=_init_worker,
+                    initargs=(self.engine, templates, self._fresh, self.render_cache)
+                )
+                self._log(f"⚙️  并行渲染: {jobs} 个进程")
+            
+            # 4. 处理每个模板
             for filename, template in templates.items():
                 if self._cancel_requested:
-                    self._log("\n🛑 任务已取消")
                     break
                 
+                offset, start, stop = ranges[filename]
                 self._current_template_name = filename
-                self._process_template(template, dry_run, explain_mode)
+                if (only is not None and filename not in only and filename in self._outputs
+                        and self._written.isdisjoint(self._outputs[filename])):
+                    self._carry_forward(filename)
+                else:
+                    self._process_template(template, dry_run, explain_mode, offset, start, stop, pool)
                 self._processed_count += 1
             
-            # 3. 完成统计
+            if self._shadowed and not self._cancel_requested:
+                self._render_shadowed(templates, dry_run)
+            
+            if self._cancel_requested:
+                self.output_writer.abort()
+                self._log("\n🛑 任务已取消")
+                self._log(f"   续跑起始编号: {self._next_index}")
+            
+            # 5. 完成统计
             if not self._cancel_requested:
+                self.output_writer.finish(dry_run, partial=shard is not None or start_index > 0)
+                summary_started = time.perf_counter()
                 stats = self.output_writer.get_stats()
                 self._log(f"\n" + "="*50)
                 self._log(f"🎯 生成完成")
                 self._log(f"   总计: {stats['total']} 个文件")
+                if self.output_writer.incremental:
+                    self._log(f"   未变化: {stats['unchanged']} | 重新生成: {stats['regenerated']} | 已移除: {stats['removed']}")
+                if self.output_writer.write_if_changed:
+                    self._log(f"   内容相同未写入: {stats['skipped_writes']} 个文件")
+                if self.output_writer.prune:
+                    self._log(f"   已清理过期输出: {stats['pruned']} 个文件")
+                self._log(f"   需解析校验: {stats['parsed']} 个文件（其余已在编译期证明有效）")
+                cache_stats = None
+                if self.render_cache is not None:
+                    self.render_cache.trim()
+                    cache_stats = dict(self.render_cache.stats)
+                    self._log(f"   渲染缓存: 命中 {cache_stats['hits']} | 未命中 {cache_stats['misses']} | 淘汰 {cache_stats['evicted']}")
+                if self._pruned:
+                    self._log(f"   约束剪枝: {sum(self._pruned.values())} 个组合")
+                    for name, count in self._pruned.items():
+                        self._log(f"      {name}: {count}")
+                if stats["errors"]:
+                    self._log(f"   写入失败: {len(stats['errors'])} 个文件", is_error=True)
+                    for error in stats["errors"]:
+                        self._log(f"      {error['filename']}: [{error['error']}] {error['message']}", is_error=True)
+                if stats["committed"] is False:
+                    self._log("   ⚠️ 存在写入失败，暂存输出已丢弃，输出目录保持不变", is_error=True)
                 self._log("="*50)
                 
                 if dry_run:
                     self._log("\n⚠️  预览模式，未实际写入文件")
                 
+                # 增量跳过、沿用、渲染缓存命中或分片/续跑时有组合未实际渲染，命中计数不完整
+                skipped_renders = (stats["unchanged"] > 0 or bool(cache_stats and cache_stats["hits"])
+                                   or shard is not None or start_index > 0)
+                rule_hits = self._report_rule_hits(templates.values() if skipped_renders else None)
+                self._timer.add("summary", time.perf_counter() - summary_started)
+                self._timer.finish()
+                timings = self._timing_report()
+                self._log_timings(timings)
+                
                 if self.on_complete:
-                    self.on_complete(stats)
+                    self.on_complete({**stats, "pruned_combinations": dict(self._pruned),
+                                      "render_cache": cache_stats, "timings": timings,
+                                      "rule_hits": rule_hits})
+                return not stats["errors"]
+            
+            return False
                 
         except Exception as e:
+            self.output_writer.abort()
             self._log(f"\n❌ 错误: {e}", is_error=True)
+            self._log(f"   续跑起始编号: {self._next_index}")
             if self.on_error:
                 self.on_error(e)
+            return False
         finally:
+            # 出错时也要等待已提交的写入结束，避免后台线程残留
+            self.output_writer.flush()
+            if pool is not None:
+                pool.shutdown(wait=True)
+            self._finish_trace()
+            self._timer.finish()
             self._is_running = False
             self._current_template_name = ""
     
-    def _process_template(self, template, dry_run: bool, explain_mode: bool):
-        """处理单个模板"""
+    def _plan_ranges(self, templates: Dict[str, Any], shard: Optional[Tuple[int, int]],
+                     start_index: int) -> Dict[str, Tuple[int, int, int]]:
+        """
+        把所有模板的组合按模板顺序首尾相接编成全局编号，计算每个模板的局部区间
+        返回:
+            {模板名: (全局偏移, 局部起点, 局部终点)}
+        """
+        counts = {name: self.engine.count_combinations(t) for name, t in templates.items()}
+        grand_total = sum(counts.values())
+        
+        low, high = 0, grand_total
+        if shard is not None:
+            index, count = shard
+            low, high = grand_total * index // count, grand_total * (index + 1) // count
+            self._log(f"🧩 分片 {index}/{count}: 组合编号 [{low}, {high})，共 {grand_total} 个")
+        if start_index:
+            low = max(low, start_index)
+            self._log(f"⏩ 从组合编号 {start_index} 开始")
+        self._next_index = low
+        
+        ranges = {}
+        offset = 0
+        for name, total in counts.items():
+            start = min(max(low - offset, 0), total)
+            stop = max(min(high - offset, total), start)
+            ranges[name] = (offset, start, stop)
+            offset += total
+        return ranges
+    
+    def _process_template(self, template, dry_run: bool, explain_mode: bool,
+                          offset: int = 0, start: int = 0, stop: Optional[int] = None,
+                          pool: Optional[ProcessPoolExecutor] = None):
+        """处理单个模板（只处理局部编号 [start, stop) 内的组合）"""
         self._log(f"\n📄 处理模板: {template.path.name}")
         
-        # 调用Engine生成组合
-        combos = self.engine.generate_combinations(template)
+        # 调用Engine统计组合数（不物化组合列表）
+        total = self.engine.count_combinations(template)
         
-        if not combos:
+        if not total:
             self._log(f"   ⚠️  没有生成任何组合")
+            self._outputs[template.path.name] = []
             return
         
-        self._log(f"   生成 {len(combos)} 个组合")
+        stop = total if stop is None else stop
+        if (start, stop) == (0, total):
+            self._log(f"   生成 {total} 个组合")
+        elif start >= stop:
+            self._log(f"   ⏭️  不在本次编号区间内，跳过 {total} 个组合")
+            return
+        else:
+            self._log(f"   生成 {stop - start}/{total} 个组合 (编号 {offset + start} ~ {offset + stop - 1})")
+
+        kept, patterns = self.engine.extra_pattern_counts(template)
+        if kept < patterns:
+            self._log(f"   额外替换: 保留 {kept}/{patterns} 个模式（其余在该模板中不可能命中）")
+
+        # 惰性渲染每个组合（并行时按提交顺序取回，保证输出顺序确定）
+        # 被约束剪掉的组合不产出，编号仍为完整笛卡尔积中的位置
+        output_format = self.output_writer.output_format
+        sampler = self._sampler if explain_mode else None
+        produced: Optional[List[str]] = [] if (start, stop) == (0, total) else None
+        if pool is None:
+            rendered = self._render_serial(template, start, stop, sampler, output_format)
+        else:
+            rendered = self._render_parallel(pool, template.path.name, start, stop, sampler, output_format)
         
-        # 处理每个组合
-        for combo in combos:
-            if self._cancel_requested:
-                break
-            
-            # 生成文件名和内容
-            filename = self.engine.apply(template.path.name, combo, None)
-            filename = filename.replace(":", "_").replace("/", "_").replace("\\", "_")
-            
-            explain_log = [] if explain_mode else None
-            content = self.engine.apply(template.content, combo, explain_log)
-            
-            # 调用DAO写入文件
-            self.output_writer.write(filename, content, dry_run)
-            self._processed_count += 1
-            self._log(f"   📄 {'[预览] ' if dry_run else ''}{filename}")
-            
-            # 解释模式日志
-            if explain_log:
-                self._log(f"\n   📝 组合详情: {combo}")
-                for log in explain_log:
-                    self._log(f"      {log}")
+        try:
+            for local_index, (filename, content, trace, input_hash, json_checked) in rendered:
+                if self._cancel_requested:
+                    break
+                
+                index = offset + local_index
+                self._processed_count += 1
+                self._next_index = index + 1
+                
+                if produced is not None:
+                    produced.append(filename)
+                
+                # 输入未变化：沿用已有文件（本次已被前面的同名输出覆盖时，重新渲染以本组合为准）
+                if content is None:
+                    if filename not in self._written:
+                        self._keep_unchanged(template.path.name, local_index, filename, input_hash)
+                        continue
+                    _, content, _, _, json_checked = self._render_again(template, local_index, output_format)
+                
+                # 调用DAO写入文件
+                self._shadowed.pop(filename, None)
+                self._written.add(filename)
+                self.output_writer.write(filename, content, dry_run, input_hash, json_checked)
+                self._log(f"   📄 {'[预览] ' if dry_run else ''}{filename}")
+                
+                # 解释模式：只记录结构化事件，模板处理完后统一输出
+                if trace:
+                    self._tracer.record(template.path.name, index, trace)
+            if produced is not None and not self._cancel_requested:
+                self._outputs[template.path.name] = produced
+        finally:
+            rendered.close()
+            if sampler is not None:
+                self._flush_trace()
+    
+    def _keep_unchanged(self, template_name: str, local_index: int, filename: str, input_hash: str):
+        """
+        沿用输入未变化的文件
+        上次该文件最终由别的组合产出时，本组合若是本次最后一个产出者，运行结束时需要补渲染
+        """
+        self.output_writer.mark_unchanged(filename, input_hash)
+        if self._fresh[filename][-1] == input_hash:
+            self._shadowed.pop(filename, None)
+        else:
+            self._shadowed[filename] = (template_name, local_index, input_hash)
+    
+    def _render_again(self, template, local_index: int, output_format: Optional[str]) -> RenderedOutput:
+        """在当前进程重新渲染一个被增量跳过的组合"""
+        combo = self.engine.combination_at(template, local_index)
+        return _render_combo(self.engine, template, combo, False, None, output_format, self.render_cache)
+    
+    def _render_shadowed(self, templates: Dict[str, Any], dry_run: bool):
+        """补渲染：本次最后产出的组合与上次不同、内容却被沿用的同名文件"""
+        output_format = self.output_writer.output_format
+        for filename, (template_name, local_index, input_hash) in self._shadowed.items():
+            output = self._render_again(templates[template_name], local_index, output_format)
+            self.output_writer.write(filename, output.content, dry_run, input_hash, output.json_checked)
+            self._log(f"   📄 {'[预览] ' if dry_run else ''}{filename}（同名输出以最后一个为准）")
+        self._shadowed = {}
+    
+    def _carry_forward(self, template_name: str):
+        """沿用模板上一次的全部输出（监视模式下未受影响的模板不重新枚举）"""
+        outputs = self._outputs[template_name]
+        for filename in outputs:
+            self.output_writer.mark_unchanged(filename, None)
+        self._log(f"\n⏭️  {template_name}: 未受影响，沿用 {len(outputs)} 个输出")
+    
+    def _watch_run(self, dry_run: bool, explain_mode: bool, jobs: Optional[int],
+                   only: Optional[Set[str]] = None) -> bool:
+        """监视模式下执行一次生成"""
+        if not self._prepare_run(None, 0):
+            return False
+        return self._run_internal(dry_run, explain_mode, None, 0, jobs, only)
+    
+    def _create_watcher(self, config_path: str, interval: float) -> FileWatcher:
+        """监视配置文件和模板目录"""
+        return FileWatcher([Path(config_path), self.config.template_dir_path], interval)
+    
+    def _apply_changes(self, changed: Set[Path], config_path: str) -> Optional[Set[str]]:
+        """
+        按变化的文件更新配置和引擎
+        返回: 需要重新生成的模板；None 表示配置的其他部分有变化，已重新初始化，需要完整生成
+        """
+        self._log(f"\n🔄 文件变化: {', '.join(sorted(path.name for path in changed))}")
+        affected: Set[str] = set()
+        if Path(os.path.abspath(config_path)) in changed:
+            try:
+                config = ConfigDAO.load(config_path)
+            except Exception as ex:
+                self._log(f"⚠️  配置无效，继续使用上一版: {ex}", is_error=True)
+                return set()
+            self._apply_overrides(config)
+            affected = self._update_config(config)
+            if affected is None:
+                return None
+        
+        template_dir = Path(os.path.abspath(self.config.template_dir_path))
+        affected |= {
+            path.name for path in changed
+            if path.parent == template_dir and path.name in self.config.template_files
+        }
+        if not affected:
+            self._log("   没有受影响的模板")
+        return affected
+    
+    def _update_config(self, config: Config) -> Optional[Set[str]]:
+        """
+        换入新配置：只有规则、约束或模板列表变化时保留引擎等组件（引擎只丢弃变化规则的缓存），
+        返回受影响的模板；其他设置变化时重新初始化全部组件并返回 None
+        """
+        def settings(c: Config) -> Dict[str, Any]:
+            data = c.to_dict()
+            for key in ("replacements", "constraints", "template_files"):
+                data.pop(key)
+            return data
+        
+        old = self.config
+        if settings(old) != settings(config):
+            self.config = config
+            self._initialize_components()
+            self._log("⚙️  设置已变化，重新初始化并完整生成")
+            return None
+        
+        changed_types = self.engine.update_rules(config.rules, config.constraints)
+        constraints_changed = (
+            [c.to_dict() for c in old.constraints] != [c.to_dict() for c in config.constraints]
+        )
+        self.config = config
+        if changed_types:
+            self._log(f"   规则变化: {', '.join(sorted(changed_types))}")
+        if constraints_changed:
+            self._log("   约束变化")
+        
+        templates = self.template_loader.load_all(config.template_files)
+        return set(config.template_files) - set(old.template_files) | {
+            name for name, template in templates.items()
+            if constraints_changed or not changed_types.isdisjoint(template.placeholders)
+        }
+    
+    def _start_trace(self, explain_mode: bool):
+        """解释模式：按配置创建采样器和事件记录"""
+        self._sampler = self._tracer = None
+        if not explain_mode:
+            return
+        self._sampler = TraceSampler(self.config.explain_every, self.config.explain_values)
+        output = Path(self.config.explain_output) if self.config.explain_output else None
+        self._tracer = TraceRecorder(self.config.explain_buffer, output)
+    
+    def _flush_trace(self):
+        """把缓冲区中的替换事件作为一条日志输出（写入 NDJSON 时缓冲区为空）"""
+        events = self._tracer.drain()
+        if not events:
+            return
+        lines = []
+        last_index = None
+        for template_name, index, (rule, kind, old, new) in events:
+            if index != last_index:
+                lines.append(f"   📝 {template_name} #{index}")
+                last_index = index
+            lines.append(f"      → {rule} [{kind}] {old} => {new}")
+        self._log("\n" + "\n".join(lines))
+    
+    def _finish_trace(self):
+        """结束解释跟踪：关闭 NDJSON 文件并输出统计"""
+        if self._tracer is None:
+            return
+        self._tracer.close()
+        summary = self._tracer.summary()
+        message = f"📝 解释跟踪: 记录 {summary['recorded']} 个替换事件"
+        if summary["output"]:
+            message += f"，已写入 {summary['output']}"
+        elif summary["dropped"]:
+            message += f"，超出缓冲区上限丢弃 {summary['dropped']} 个"
+        self._log(message)
+        self._tracer = None
+    
+    def _render_serial(self, template, start: int, stop: int,
+                       sampler: Optional[TraceSampler], output_format: Optional[str]):
+        """在当前进程逐个枚举并渲染组合（枚举与渲染分别计时）"""
+        combos = self._timer.timed(
+            "enumerate", self.engine.iter_indexed_combinations(template, start, stop, self._pruned))
+        for index, combo in combos:
+            started = time.perf_counter()
+            traced = sampler is not None and sampler.wants(index, combo)
+            output = _render_combo(self.engine, template, combo, traced, self._fresh,
+                                   output_format, self.render_cache)
+            self._timer.add("render", time.perf_counter() - started)
+            yield index, output
+    
+    def _render_parallel(self, pool: ProcessPoolExecutor, template_name: str,
+                         start: int, stop: int, sampler: Optional[TraceSampler], output_format: Optional[str]):
+        """
+        把编号区间切块分发到进程池，按顺序逐个产出渲染结果
+        同时在途的块数有上限；取消或提前结束时撤销尚未开始的块
+        等待结果的时间计入 render 阶段，工作进程的枚举/渲染时间另计入 worker_seconds
+        """
+        workers = self._jobs
+        chunk_size = max(1, min(self.PARALLEL_CHUNK_SIZE, (stop - start) // (workers * 4)))
+        chunk_starts = iter(range(start, stop, chunk_size))
+        pending = deque()
+        
+        def submit_next() -> bool:
+            chunk_start = next(chunk_starts, None)
+            if chunk_start is None:
+                return False
+            chunk_stop = min(chunk_start + chunk_size, stop)
+            pending.append(pool.submit(_render_chunk, template_name, chunk_start, chunk_stop,
+                                       sampler, output_format))
+            return True
+        
+        try:
+            while len(pending) < workers * 2 and submit_next():
+                pass
+            while pending:
+                if self._cancel_requested:
+                    return
+                with self._timer.stage("render"):
+                    results, chunk_stats = pending.popleft().result()
+                submit_next()
+                for name, value in chunk_stats["seconds"].items():
+                    self._worker_seconds[name] = self._worker_seconds.get(name, 0.0) + value
+                for name, count in chunk_stats["pruned"].items():
+                    self._pruned[name] = self._pruned.get(name, 0) + count
+                if self.render_cache is not None:
+                    self.render_cache.merge_stats(chunk_stats["cache"])
+                self.engine.merge_rule_hits(chunk_stats["rule_hits"])
+                yield from results
+        finally:
+            for future in pending:
+                future.cancel()
+    
+    def _report_rule_hits(self, skipped_from=None) -> Dict[str, Any]:
+        """
+        汇总本次运行的额外替换命中，输出从未命中和最常命中的条目
+        skipped_from: 有组合未实际渲染时传入全部模板，只把可证明不会命中的条目列为从未命中
+        """
+        reachable = self.engine.extra_reachability(skipped_from) if skipped_from is not None else None
+        report = self.engine.rule_hit_report(self.engine.take_rule_hits(), reachable=reachable)
+        lines = format_rule_report(report)
+        if lines:
+            self._log("\n" + "\n".join(lines))
+        saved = save_rule_report(report, self.config.rule_report)
+        if saved:
+            self._log(f"   命中报告已写入: {saved}")
+        return report
+    
+    def _timing_report(self) -> Dict[str, Any]:
+        """各阶段耗时与吞吐量（写入器负责的校验、写入、收尾阶段取自写入器统计）"""
+        outputs = output_bytes = 0
+        if self.output_writer is not None:
+            writer_stats = self.output_writer.stats
+            self._timer.seconds.update(writer_stats["seconds"])
+            outputs, output_bytes = writer_stats["total"], writer_stats["bytes"]
+        return self._timer.report(outputs, output_bytes, self._worker_seconds)
+    
+    def _log_timings(self, timings: Dict[str, Any]):
+        """输出分阶段耗时"""
+        stages = " | ".join(f"{name} {seconds:.3f}s" for name, seconds in timings["stages"].items() if seconds)
+        self._log(f"⏱️  总耗时 {timings['total_seconds']:.3f}s: {stages}")
+        self._log(f"   吞吐量: {timings['outputs_per_sec']:.1f} 个文件/s, {timings['bytes_per_sec'] / 1024:.1f} KB/s")
+    
+    def _load_templates(self, filenames: List[str]) -> Dict[str, Template]:
+        """加载模板（注册表中未变化的模板不读磁盘）并编译渲染计划（已编译过的直接复用）"""
+        templates = self.template_loader.load_all(filenames)
+        for template in templates.values():
+            self.engine.compile(template)
+        return templates
     
     def _initialize_components(self):
         """初始化核心组件"""
         if not self.config:
             return
         
-        # 调用DAO创建组件
-        self.engine = ReplacementEngine(self.config.default_namespace, self.config.rules)
+        # 调用DAO创建组件（新的写入器和引擎不再沿用之前的输出记录）
+        self._outputs = {}
+        self.engine = ReplacementEngine(self.config.default_namespace, self.config.rules,
+                                        self.config.constraints)
         self.template_loader = TemplateLoader(Path(self.config.template_dir))
-        self.output_writer = OutputWriter(Path(self.config.output_dir))
+        self.render_cache = (
+            RenderCache(Path(self.config.render_cache_dir), self.config.render_cache_max_mb * 1024 * 1024)
+            if self.config.render_cache_dir else None
+        )
+        self.output_writer = self._create_output_writer()
+    
+    def _create_output_writer(self) -> OutputWriter:
+        """
+        按配置创建输出写入器（监视期间总是启用增量生成）
+        只因监视而启用的构建清单只保存在内存中，监视结束后不会被之后的运行读取
+        """
+        watch_only_manifest = self._watch_incremental and not (
+            self.config.incremental or self.config.write_if_changed or self.config.prune_stale
+        )
+        writer_options = dict(
+            persist_manifest=not watch_only_manifest,
+            incremental=self.config.incremental or self._watch_incremental,
+            write_if_changed=self.config.write_if_changed,
+            prune=self.config.prune_stale,
+            output_format=self.config.output_format,
+            staged=self.config.staged_output
+        )
+        if self.config.output_archive:
+            # 直接写入数据包压缩包（整体重写，不做增量）
+            return ZipOutputWriter(
+                Path(self.config.output_archive),
+                self.config.archive_entry_dir("recipes"),
+                output_format=self.config.output_format
+            )
+        if self.config.writer_threads > 0:
+            # 渲染与磁盘写入重叠：写入交给后台线程
+            return AsyncOutputWriter(
+                Path(self.config.output_dir),
+                threads=self.config.writer_threads,
+                queue_size=self.config.write_queue_size,
+                **writer_options
+            )
+        return OutputWriter(Path(self.config.output_dir), **writer_options)
     
     def _log(self, message: str, is_error: bool = False):
         """日志输出（带回调）"""
@@ -0,0 +1,43 @@
+import json
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+def format_rule_report(report: Dict, dead_limit: int = 20) -> List[str]:
+    """把 ReplacementEngine.rule_hit_report 的结果格式化为日志行（从未命中的条目最多列出 dead_limit 条）"""
+    if not report["entries"]:
+        return []
+    dead = report["dead"]
+    if report.get("partial"):
+        # 部分组合未渲染：命中数不完整，只列出可证明不会命中的条目
+        lines = [f"🎯 额外替换命中（部分组合未渲染，只统计实际渲染的组合）: "
+                 f"{report['fired']}/{report['entries']} 条生效，{len(dead)} 条不可能命中"]
+        dead_title = "   在任何组合中都不可能命中（可删除）:"
+    else:
+        lines = [f"🎯 额外替换命中: {report['fired']}/{report['entries']} 条生效，{len(dead)} 条本次从未命中"]
+        dead_title = "   从未命中（可考虑删除）:"
+    if report["hot"]:
+        lines.append("   最常命中:")
+        lines += [f"      {_describe(e)}  ×{e['hits']}" for e in report["hot"]]
+    if dead:
+        lines.append(dead_title)
+        lines += [f"      {_describe(e)}" for e in dead[:dead_limit]]
+        if len(dead) > dead_limit:
+            lines.append(f"      ... 另有 {len(dead) - dead_limit} 条")
+    return lines
+
+
+def save_rule_report(report: Dict, path: Optional[str]) -> Optional[Path]:
+    """把完整报告写入JSON文件（未配置路径时不写）"""
+    if not path:
+        return None
+    report_path = Path(path)
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    with report_path.open("w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return report_path
+
+
+def _describe(entry: Dict) -> str:
+    source = f" ({entry['description']})" if entry["description"] else ""
+    return f"{entry['rule']}{source} [{entry['key']}] {entry['old']} => {entry['new']}"
@@ -19,6 +19,7 @@ class SettingsService:
         
         # 核心数据：配置对象
         self.config: Optional[Config] = None
+        self.config_path: Optional[str] = None  # 最近一次加载的配置文件
         
         # 扫描状态
         self.is_scanning = False
@@ -35,6 +36,7 @@ class SettingsService:
         返回:
             成功返回True，失败返回False
         """
+        self.config_path = config_path
         try:
             self.config = ConfigDAO.load(config_path)
             self.last_scan_error = None  # 清除错误状态
@@ -0,0 +1,78 @@
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+
+class StageTimer:
+    """
+    分阶段计时：累计一次运行中各阶段的墙钟时间，并计算吞吐量
+    阶段可以多次进入（如逐个组合的渲染），时间累加
+    """
+
+    # 报告中的阶段顺序（未出现的阶段记为 0）
+    STAGES = ("config_load", "template_load", "enumerate", "render",
+              "validate", "write", "finalize", "summary")
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {stage: 0.0 for stage in self.STAGES}
+        self._started = time.perf_counter()
+        self._finished: Optional[float] = None
+
+    @contextmanager
+    def stage(self, name: str):
+        """计时一个代码块并累加到阶段 name"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name: str, seconds: float) -> None:
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    def timed(self, name: str, iterator: Iterator[Any]) -> Iterator[Any]:
+        """包装迭代器：每次取下一个元素的时间累加到阶段 name（消费者的处理时间不计入）"""
+        iterator = iter(iterator)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(name, time.perf_counter() - started)
+                return
+            self.add(name, time.perf_counter() - started)
+            yield item
+
+    def finish(self) -> None:
+        """结束计时（之后的报告使用固定的总时长，重复调用无效）"""
+        if self._finished is None:
+            self._finished = time.perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        """运行开始至今（或结束时）的墙钟时间，不含运行前已计入的阶段"""
+        return (self._finished or time.perf_counter()) - self._started
+
+    def report(self, outputs: int = 0, output_bytes: int = 0,
+               extra: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+        """
+        生成计时报告
+        参数:
+            outputs/output_bytes: 产出的文件数与字节数，用于计算吞吐量
+            extra: 附加的非墙钟计时（如各工作进程累计的忙碌时间）
+        返回:
+            {"stages": {阶段: 秒}, "total_seconds", "outputs", "bytes",
+             "outputs_per_sec", "bytes_per_sec"}
+        """
+        total = self.elapsed + self.seconds.get("config_load", 0.0)
+        report = {
+            "stages": {name: round(seconds, 6) for name, seconds in self.seconds.items()},
+            "total_seconds": round(total, 6),
+            "outputs": outputs,
+            "bytes": output_bytes,
+            "outputs_per_sec": round(outputs / total, 2) if total > 0 else 0.0,
+            "bytes_per_sec": round(output_bytes / total, 2) if total > 0 else 0.0,
+        }
+        if extra:
+            report["worker_seconds"] = {name: round(seconds, 6) for name, seconds in extra.items()}
+        return report
@@ -0,0 +1,62 @@
+import itertools
+
+import pytest
+
+from src.core.engine import ReplacementEngine
+from src.model.config import CombinationConstraint, ReplacementRule
+from src.model.template import Template
+
+RULES = [
+    {"type": "a", "values": ["x", "y", "z"]},
+    {"type": "b", "values": ["p", "q"]},
+    {"type": "c", "values": ["u", "v", "w", "t"]},
+    {"type": "d", "values": ["m", "n"]},
+]
+
+
+def brute_force(template_name, types, constraints, start, stop):
+    """枚举完整笛卡尔积，逐个组合按约束语义过滤（保留完整编号）"""
+    value_lists = [next(r["values"] for r in RULES if r["type"] == t) for t in types]
+    kept = []
+    for index, values in enumerate(itertools.product(*value_lists)):
+        combo = dict(zip(types, values))
+        if start <= index < (stop if stop is not None else float("inf")) and all(
+            allows(constraint, template_name, combo) for constraint in constraints
+        ):
+            kept.append((index, combo))
+    return kept
+
+
+def allows(constraint, template_name, combo):
+    if not constraint.applies_to(template_name) or any(t not in combo for t in constraint.types):
+        return True
+    if not all(combo[t] in values for t, values in constraint.when.items()):
+        return True
+    return (all(combo[t] in values for t, values in constraint.include.items())
+            and not any(combo[t] in values for t, values in constraint.exclude.items()))
+
+
+@pytest.mark.parametrize("constraints", [
+    [{"when": {"a": ["x"]}, "exclude": {"b": ["p"]}}],
+    [{"include": {"c": ["u", "v"]}}],
+    [{"when": {"a": ["y"], "b": ["q"]}, "include": {"c": ["w"]}},
+     {"when": {"c": ["u"]}, "exclude": {"a": ["z", "x"]}}],
+    # 引用模板中没有的规则、只作用于其他模板、未启用：都不剪枝
+    [{"when": {"d": ["m"]}, "exclude": {"a": ["x"]}},
+     {"exclude": {"b": ["q"]}, "templates": ["other.json"]},
+     {"exclude": {"c": ["t"]}, "enabled": False}],
+])
+@pytest.mark.parametrize("start, stop", [(0, None), (5, 17)])
+def test_constraint_pruning_matches_brute_force(tmp_path, constraints, start, stop):
+    template_path = tmp_path / "{a}_{b}.json"
+    template_path.write_text('{"v": "{a}{b}{c}"}', encoding="utf-8")
+    template = Template(template_path)
+    models = [CombinationConstraint.create(c) for c in constraints]
+    engine = ReplacementEngine("minecraft:", [ReplacementRule.create(r) for r in RULES], models)
+    
+    pruned = {}
+    actual = list(engine.iter_indexed_combinations(template, start, stop, pruned))
+    expected = brute_force(template_path.name, ("a", "b", "c"), models, start, stop)
+    assert actual == expected
+    total = len(range(24)[start:stop])
+    assert sum(pruned.values()) == total - len(expected)
@@ -0,0 +1,102 @@
+import json
+
+import pytest
+
+from src.core.engine import ReplacementEngine
+from src.dao.render_cache import RenderCache
+from src.model.config import ReplacementRule
+from src.model.template import Template
+
+
+def make_engine(*rules, namespace="minecraft:"):
+    return ReplacementEngine(namespace, [ReplacementRule.create(rule) for rule in rules])
+
+
+@pytest.mark.parametrize("content, combo, expected", [
+    # 值中的 "}" 与模板字面量 "{" 拼成 {b}，逐个替换时会被随后的 b 命中
+    ("{{a}", {"a": "b}", "b": "X"}, "X"),
+    # 模板字面量花括号夹住槽位，代入后拼成 {b}
+    ("{{a}}", {"a": "b", "b": "X"}, "X"),
+    # 值中的 "{" 与模板字面量 "}" 拼成 {b}
+    ("{a}b}", {"a": "{", "b": "X"}, "X"),
+    # 排在后面的规则拼出的占位符不会再被前面的规则替换
+    ("{{b}}", {"a": "X", "b": "a"}, "{a}"),
+])
+def test_basic_replacement_matches_sequential_replace(content, combo, expected):
+    engine = make_engine(*({"type": t, "values": [v]} for t, v in combo.items()))
+    assert engine.apply(content, combo) == expected
+
+
+A_THEN_B = [{"type": "a", "values": ["x"], "extra": {"*": {"xy": "1"}}},
+            {"type": "b", "values": ["y"], "extra": {"*": {"y": "2"}}}]
+# 同一条目在完整值键和纯名称键之间移动：完整值层级优先，替换结果不同
+FULL_VALUE_FIRST = [{"type": "a", "values": ["m:x"], "extra": {"m:x": {"ab": "X"}, "x": {"abc": "Y"}}}]
+NAME_FIRST = [{"type": "a", "values": ["m:x"], "extra": {"x": {"ab": "X"}, "m:x": {"abc": "Y"}}}]
+
+
+@pytest.mark.parametrize("first, second, content, combo", [
+    # 额外替换按规则顺序执行
+    (A_THEN_B, A_THEN_B[::-1], '{"v": "{a}{b}"}', {"a": "x", "b": "y"}),
+    (FULL_VALUE_FIRST, NAME_FIRST, '{"v": "abc{a}"}', {"a": "m:x"}),
+])
+def test_fingerprint_changes_with_rule_order(tmp_path, first, second, content, combo):
+    template_path = tmp_path / "{a}.json"
+    template_path.write_text(content, encoding="utf-8")
+    template = Template(template_path)
+    forward, backward = make_engine(*first), make_engine(*second)
+    # 结果不同时，指纹和渲染键也必须不同
+    assert forward.apply(template.content, combo) != backward.apply(template.content, combo)
+    assert forward.fingerprint(template, combo) != backward.fingerprint(template, combo)
+    assert forward.render_key(template.content, combo) != backward.render_key(template.content, combo)
+
+
+@pytest.mark.parametrize("content, extra", [
+    ('{"type":"x","key":{"#":{"item":"{modid}{a}_log"}},"n":[1.0,2e3]}', {"_log": "_wood"}),
+    ('{"a": "{a}", "list": [ "{b}", 1 ]}', {"x": "y"}),
+    # 额外替换的模式出现在对象的键中：不走格式化模板
+    ('{"x_a": "{a}", "y_a": "{b}"}', {"x_": "y_"}),
+    # 字面量含转义序列：不走格式化模板
+    ('{"a": "\\u0041{a}"}', {}),
+])
+def test_normalized_template_matches_parse_and_dump(content, extra):
+    engine = make_engine({"type": "a", "values": ["ns:x"], "extra": {"*": extra}},
+                         {"type": "b", "values": ["y"]})
+    combo = {"a": "ns:x", "b": "y"}
+    expected = json.dumps(json.loads(engine.apply(content, combo)), indent=2, ensure_ascii=False)
+    normalized = engine.normalized_content(content, combo)
+    if normalized is not None:
+        assert engine.apply(normalized, combo) == expected
+    assert (normalized is None) == ("x_a" in content or "\\u" in content)
+
+
+def test_render_cache_does_not_return_render_of_other_extra_priority(tmp_path):
+    cache = RenderCache(tmp_path / "cache")
+    content, combo = '{"v": "abc{a}"}', {"a": "m:x"}
+    first, hit = make_engine(*FULL_VALUE_FIRST).apply_cached(content, combo, cache)
+    assert not hit
+    # 跨进程共享的缓存：另一份配置只是把条目移到了纯名称键，不能命中上一次的结果
+    second, hit = make_engine(*NAME_FIRST).apply_cached(content, combo, cache)
+    assert not hit
+    assert (first, second) == ('{"v": "Xcx"}', '{"v": "Yx"}')
+    again, hit = make_engine(*NAME_FIRST).apply_cached(content, combo, cache)
+    assert hit and again == second
+
+
+def test_retain_texts_drops_caches_of_edited_templates():
+    engine = make_engine({"type": "a", "values": [f"v{i}" for i in range(8)], "extra": {"*": {"_x": "_y"}}},
+                         {"type": "b", "values": [f"w{i}" for i in range(8)]})
+    versions = [f'{{"a": "{{a}}_x", "b": "{{b}}", "n": {n}}}' for n in range(5)]
+    for content in versions:
+        for a in engine.rules["a"].values:
+            for b in engine.rules["b"].values:
+                engine.apply(content, {"a": a, "b": b})
+                engine.is_json_safe(content, {"a": a, "b": b})
+                engine.render_key(content, {"a": a, "b": b})
+    current = versions[-1]
+    assert engine.retain_texts([current]) > 0
+    cached = [*engine._plans, *(k for k in engine._digests if isinstance(k, str)),
+              *(k[0] for k in engine._json_safe), *(k[0] for k in engine._factorized), *(k[0] for k in engine._live)]
+    assert cached and all(text in current for text in cached)
+    # 当前版本的分解计划保留，渲染结果不变
+    assert engine._factorized[(current, ("a", "b"))] is not None
+    assert engine.apply(current, {"a": "v1", "b": "w2"}) == '{"a": "v1_y", "b": "w2", "n": 4}'
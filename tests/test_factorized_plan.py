@@ -0,0 +1,52 @@
+import itertools
+
+import pytest
+
+from src.core.engine import ReplacementEngine
+from src.model.config import ReplacementRule
+
+
+def test_factorized_template_counts_extra_hits():
+    woods = ["bamboo"] + [f"wood{i}" for i in range(19)]
+    colors = [f"color{i}" for i in range(21)]
+    engine = ReplacementEngine("minecraft:", [
+        ReplacementRule.create({"type": "wood", "values": woods, "extra": {"bamboo": {"_planks": "_mosaic"}}}),
+        ReplacementRule.create({"type": "color", "values": colors}),
+    ])
+    content = '{"item": "{wood}_planks", "color": "{color}"}'
+    combos = [{"wood": w, "color": c} for w in woods for c in colors]
+    rendered = [engine.apply(content, combo) for combo in combos]
+    
+    assert engine._factorized[(content, ("wood", "color"))] is not None
+    assert rendered[0] == '{"item": "bamboo_mosaic", "color": "color0"}'
+    assert engine.take_rule_hits() == {("wood", "bamboo", "_planks"): len(colors)}
+    assert engine.take_rule_hits() == {}
+
+
+WOODS = ["oak", "mod:bamboo", "birch", "spruce", "mod:fir"]
+COLORS = ["red", "blue", "green", "white", "black"]
+SIZES = ["s", "m", "l", "xl", "xxl"]
+
+
+@pytest.mark.parametrize("content", [
+    '{"item": "{modid}{wood}_planks", "color": "{color}", "size": "{size}"}',
+    # 额外替换模式跨越槽位：red_ 由 {color} 和字面量拼成
+    '{"key": {"#": {"item": "{wood}_log"}}, "result": "{color}_{wood}", "n": "{size}"}',
+    '{"a": "{size}", "b": ["{modid_safe}", "{color}{size}"], "c": 1}',
+])
+def test_factorized_render_matches_full_render(content):
+    engine = ReplacementEngine("minecraft:", [
+        ReplacementRule.create({"type": "wood", "values": WOODS,
+                                "extra": {"bamboo": {"_planks": "_mosaic"}, "*": {"_log": "_stem"}}}),
+        ReplacementRule.create({"type": "color", "values": COLORS, "extra": {"red": {"red_": "crimson_"}}}),
+        ReplacementRule.create({"type": "size", "values": SIZES}),
+    ])
+    combos = [dict(zip(("wood", "color", "size"), values))
+              for values in itertools.product(WOODS, COLORS, SIZES)]
+    # 传入 trace 时走完整渲染，作为逐字节对照
+    expected = [engine.apply(content, combo, []) for combo in combos]
+    expected_hits = engine.take_rule_hits()
+    
+    assert [engine.apply(content, combo) for combo in combos] == expected
+    assert engine._factorized[(content, ("wood", "color", "size"))] is not None
+    assert engine.take_rule_hits() == expected_hits
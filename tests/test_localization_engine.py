@@ -0,0 +1,37 @@
+import json
+import sys
+
+from src.core.localization_engine import LocalizationEngine
+from src.model.batch_item import BatchItem
+from src.model.config import ReplacementRule
+
+
+def make_engine(tmp_path, count=300):
+    items = {f"m:wood{i}": BatchItem(f"m:wood{i}", f"木材{i}", "m:") for i in range(count)}
+    rule = ReplacementRule.create({
+        "type": "material_id",
+        "values": [f"wood{i}" for i in range(count)],
+        "extra": {"*": {"木椅": "木制椅"}, "wood7": {"木材": "原木"}},
+    })
+    engine = LocalizationEngine("minecraft:", [rule], items)
+    content = {f"block.m.{{material_id}}_chair{n}": f"{{material_zh_cn}}木椅{n}" for n in range(20)}
+    (tmp_path / "chairs.json").write_text(json.dumps(content, ensure_ascii=False), encoding="utf-8")
+    engine.load_templates(tmp_path, "chairs.json")
+    return engine
+
+
+def test_parallel_generation_matches_serial(tmp_path):
+    engine = make_engine(tmp_path)
+    # 缩短线程切换间隔，放大共享计数上的竞争
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    runs = []
+    for workers, executor in [(1, "thread"), (4, "thread"), (4, "process")]:
+        results = engine.generate_batch("chairs.json", workers, executor)
+        runs.append((results, list(engine.errors), engine.take_rule_hits()))
+    sys.setswitchinterval(interval)
+    
+    serial = runs[0]
+    assert serial[0]["m:wood7"]["block.m.wood7_chair0"] == "原木7木制椅0"
+    assert serial[2][("material_id", "wood7", "木材")] == 20
+    assert all(run == serial for run in runs[1:])
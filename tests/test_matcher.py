@@ -0,0 +1,44 @@
+import pytest
+
+from src.core.matcher import MultiReplacer
+
+
+@pytest.mark.parametrize("tables, text, expected", [
+    # 同名模式以高优先级的表为准
+    ([("full_value", {"ab": "X"}), ("wildcard", {"ab": "Y"})], "ab", "X"),
+    # 同一位置高优先级的表先匹配，即使低优先级的模式更长
+    ([("full_value", {"ab": "X"}), ("name", {"abc": "Y"})], "abcv", "Xcv"),
+    ([("full_value", {"abc": "Y"}), ("name", {"ab": "X"})], "abcv", "Yv"),
+    # 更早开始的匹配优先，与优先级无关
+    ([("full_value", {"bc": "X"}), ("wildcard", {"ab": "Y"})], "abc", "Yc"),
+])
+def test_tier_precedence(tables, text, expected):
+    assert MultiReplacer(tables).apply(text) == expected
+
+
+@pytest.mark.parametrize("table, text, expected", [
+    # 同一优先级内较长的模式先匹配（逐个 str.replace 时 "木" 先删会留下 "原"）
+    ({"木": "", "原木": ""}, "原木桌", "桌"),
+    ({"_log": "_wood", "_log_top": "_top"}, "oak_log_top oak_log", "oak_top oak_wood"),
+    # 重叠的匹配不会重复替换
+    ({"aa": "b"}, "aaa", "ba"),
+])
+def test_overlapping_patterns(table, text, expected):
+    assert MultiReplacer([("wildcard", table)]).apply(text) == expected
+
+
+def test_replacements_do_not_chain():
+    # 替换进来的新串不会再被其他模式命中
+    matcher = MultiReplacer([("name", {"a": "b"}), ("wildcard", {"b": "c"})])
+    assert matcher.apply("ab") == "bc"
+    assert matcher.hits == {"a": 1, "b": 1}
+
+
+def test_subset_keeps_priority_and_log_order():
+    matcher = MultiReplacer([("full_value", {"ab": "X"}), ("name", {"abc": "Y", "c": "Z"})])
+    subset = matcher.subset(["ab", "abc"])
+    assert subset.signature() == [("full_value", "ab", "X"), ("name", "abc", "Y")]
+    assert matcher.subset(matcher.entries) is matcher
+    log = []
+    assert matcher.apply("cabc", log) == "ZXZ"
+    assert log == [("name", "c", "Z"), ("full_value", "ab", "X")]
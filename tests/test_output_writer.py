@@ -0,0 +1,72 @@
+import json
+
+from src.dao.async_output_writer import AsyncOutputWriter
+from src.dao.output_writer import OutputWriter
+from src.dao.zip_output_writer import ZipOutputWriter
+
+
+def test_prune_removes_only_previous_outputs(tmp_path):
+    # 输出目录中已有本工具未写入过的文件
+    (tmp_path / "config.json").write_text("{}", encoding="utf-8")
+    (tmp_path / "notes.json").write_text("[]", encoding="utf-8")
+    
+    writer = OutputWriter(tmp_path, prune=True)
+    writer.begin_run()
+    writer.write("a.json", json.dumps({"v": 1}))
+    writer.write("b.json", json.dumps({"v": 2}))
+    writer.finish()
+    assert writer.get_stats()["pruned"] == 0
+    
+    writer.begin_run()
+    writer.write("a.json", json.dumps({"v": 1}))
+    writer.finish()
+    assert writer.get_stats()["pruned"] == 1
+    assert sorted(path.name for path in tmp_path.iterdir()) == [".recipe_manifest.json", "a.json", "config.json", "notes.json"]
+
+
+def test_zip_archive_bytes_do_not_depend_on_writer_order(tmp_path):
+    def build(archive, entry_dirs):
+        for entry_dir in entry_dirs:
+            writer = ZipOutputWriter(archive, entry_dir)
+            writer.begin_run()
+            writer.write(f"{entry_dir.rsplit('/', 1)[-1]}.json", json.dumps({"dir": entry_dir}))
+            writer.finish()
+        return archive.read_bytes()
+    
+    # 语言文件和配方哪个先写入，得到的压缩包都逐字节相同
+    dirs = ["data/m/recipes", "assets/m/lang"]
+    assert build(tmp_path / "a.zip", dirs) == build(tmp_path / "b.zip", dirs[::-1])
+
+
+def test_async_writer_records_failed_writes(tmp_path):
+    # 与输出同名的目录使写入失败
+    (tmp_path / "bad.json").mkdir()
+    writer = AsyncOutputWriter(tmp_path, threads=2, queue_size=2, incremental=True)
+    writer.begin_run()
+    for i in range(10):
+        writer.write(f"ok{i}.json", json.dumps({"v": i}), input_hash=f"h{i}")
+    writer.write("bad.json", json.dumps({"v": -1}), input_hash="bad")
+    writer.finish()
+    
+    stats = writer.get_stats()
+    assert [error["filename"] for error in stats["errors"]] == ["bad.json"]
+    assert stats["regenerated"] == 11
+    assert all(json.loads((tmp_path / f"ok{i}.json").read_text(encoding="utf-8")) == {"v": i} for i in range(10))
+    # 写入失败的文件不进入清单，下次增量运行会重新生成
+    fresh = writer.begin_run()
+    assert "bad.json" not in fresh and fresh["ok3.json"] == ("h3",)
+
+
+def test_async_writer_failure_discards_staged_output(tmp_path):
+    target = tmp_path / "output"
+    target.mkdir()
+    (target / "keep.json").write_text("{}", encoding="utf-8")
+    writer = AsyncOutputWriter(target, threads=1, staged=True)
+    writer.begin_run()
+    (writer.output_dir / "bad.json").mkdir()
+    writer.write("new.json", json.dumps({"v": 1}))
+    writer.write("bad.json", json.dumps({"v": 2}))
+    writer.finish()
+    
+    assert writer.get_stats()["committed"] is False
+    assert sorted(path.name for path in target.iterdir()) == ["keep.json"]
@@ -0,0 +1,64 @@
+import itertools
+import random
+
+import pytest
+
+from src.core.pattern_reach import can_occur, overlaps
+
+
+def occurs_brute_force(pattern, segments):
+    return any(pattern in "".join(choice) for choice in itertools.product(*segments))
+
+
+def overlaps_brute_force(pattern, inserted):
+    """把模式放在插入文本的每个相对位置上，重叠部分逐字相同即可能重叠"""
+    if not inserted:
+        return True
+    for offset in range(-len(pattern) + 1, len(inserted)):
+        pairs = [(pattern[i], inserted[offset + i]) for i in range(len(pattern))
+                 if 0 <= offset + i < len(inserted)]
+        if all(a == b for a, b in pairs):
+            return True
+    return False
+
+
+@pytest.mark.parametrize("pattern, segments, expected", [
+    ("_log", [["oak", "birch"], ["_log"]], True),
+    # 跨越多段拼出
+    ("原木", [["原"], ["", "x"], ["木桌"]], True),
+    ("原木", [["原"], ["x"], ["木桌"]], False),
+    # 模式前缀跨越一个完整的段
+    ("abcd", [["a"], ["bc"], ["d", "e"]], True),
+    ("abcd", [["xa"], ["bc"], ["e"]], False),
+    ("", [["a"]], False),
+])
+def test_can_occur(pattern, segments, expected):
+    assert can_occur(pattern, segments) is expected
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_can_occur_matches_brute_force(seed):
+    rng = random.Random(seed)
+    words = ["", "a", "b", "ab", "ba", "aab", "bab"]
+    for _ in range(200):
+        segments = [rng.sample(words, rng.randint(1, 3)) for _ in range(rng.randint(1, 4))]
+        pattern = "".join(rng.choice("ab") for _ in range(rng.randint(1, 4)))
+        assert can_occur(pattern, segments) == occurs_brute_force(pattern, segments), (pattern, segments)
+
+
+@pytest.mark.parametrize("pattern, inserted, expected", [
+    ("木", "原木", True),       # 被包含
+    ("原木桌", "木", True),     # 包含
+    ("_log", "g_", True),       # 模式结尾与插入文本开头相接
+    ("_log", "x_l", True),      # 插入文本结尾与模式开头相接
+    ("_log", "xyz", False),
+    ("ab", "", True),           # 删除文本可能拼出新命中
+])
+def test_overlaps(pattern, inserted, expected):
+    assert overlaps(pattern, inserted) is expected
+
+
+def test_overlaps_matches_brute_force():
+    strings = ["".join(p) for n in range(1, 5) for p in itertools.product("ab", repeat=n)]
+    for pattern, inserted in itertools.product(strings, ["", *strings]):
+        assert overlaps(pattern, inserted) == overlaps_brute_force(pattern, inserted), (pattern, inserted)
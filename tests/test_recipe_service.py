@@ -0,0 +1,199 @@
+import json
+import time
+import zipfile
+
+import pytest
+
+from src.service.recipe_service import RecipeService
+
+
+def make_service(tmp_path, replacements, templates, **settings):
+    """在临时目录中写入模板和配置，返回已加载配置的服务"""
+    template_dir = tmp_path / "templates"
+    template_dir.mkdir(exist_ok=True)
+    for name, content in templates.items():
+        (template_dir / name).write_text(content, encoding="utf-8")
+    config = {
+        "output_dir": str(tmp_path / "output"),
+        "template_dir": str(template_dir),
+        "template_files": list(templates),
+        "replacements": replacements,
+        **settings,
+    }
+    config_path = tmp_path / "config.json"
+    config_path.write_text(json.dumps(config, ensure_ascii=False), encoding="utf-8")
+    service = RecipeService()
+    service._log = lambda message, is_error=False: None
+    assert service.load_config_from_file(str(config_path))
+    return service
+
+
+def read_output(tmp_path, filename):
+    return json.loads((tmp_path / "output" / filename).read_text(encoding="utf-8"))
+
+
+@pytest.mark.parametrize("values_again", [
+    ["birch", "spruce"],   # 不变：同名文件仍以 spruce 为准
+    ["spruce", "birch"],   # 顺序颠倒：改以 birch 为准
+    ["birch"],             # 上次的最后产出者被移除
+    ["birch", "oak"],      # 最后产出者换成新值
+])
+def test_incremental_colliding_filenames_keep_last_write(tmp_path, values_again):
+    templates = {"same.json": '{"tree": "{tree}"}'}
+    rule = {"type": "tree", "values": ["birch", "spruce"]}
+    service = make_service(tmp_path, [rule], templates, incremental=True)
+    assert service.run()
+    assert read_output(tmp_path, "same.json") == {"tree": "spruce"}
+    
+    rule["values"] = values_again
+    service = make_service(tmp_path, [rule], templates, incremental=True)
+    assert service.run()
+    assert read_output(tmp_path, "same.json") == {"tree": values_again[-1]}
+    
+    # 再次运行时全部沿用，内容不变
+    assert service.run()
+    assert service.output_writer.get_stats()["regenerated"] == 0
+    assert read_output(tmp_path, "same.json") == {"tree": values_again[-1]}
+
+
+def test_normalized_output_is_written_without_parsing(tmp_path):
+    templates = {"{tree}.json": '{"item":"{modid}{tree}_planks","count":4}'}
+    rule = {"type": "tree", "values": ["birch", "mod:fir"]}
+    service = make_service(tmp_path, [rule], templates)
+    assert service.run()
+    assert service.output_writer.get_stats()["parsed"] == 0
+    text = (tmp_path / "output" / "fir.json").read_text(encoding="utf-8")
+    assert text == json.dumps({"item": "mod:fir_planks", "count": 4}, indent=2)
+
+
+def test_incremental_rule_report_lists_only_unreachable_entries(tmp_path):
+    templates = {"{tree}.json": '{"item":"{modid}{tree}_planks"}'}
+    rule = {"type": "tree", "values": ["birch", "spruce"],
+            "extra": {"birch": {"_planks": "_boards", "_slab": "_step"}}}
+    service = make_service(tmp_path, [rule], templates, incremental=True)
+    reports = []
+    service.on_complete = lambda stats: reports.append(stats["rule_hits"])
+    assert service.run()
+    assert service.run()
+    
+    full, partial = reports
+    assert not full["partial"]
+    assert [entry["old"] for entry in full["dead"]] == ["_slab"]
+    # 第二次运行全部沿用：_planks 未被渲染但仍可能命中，不列为从未命中
+    assert partial["partial"] and partial["fired"] == 0
+    assert [entry["old"] for entry in partial["dead"]] == ["_slab"]
+
+
+def test_watch_with_archive_keeps_carried_forward_entries(tmp_path):
+    templates = {"{tree}_planks.json": '{"item":"{tree}_planks"}',
+                 "{tree}_slab.json": '{"item":"{tree}_slab"}'}
+    rule = {"type": "tree", "values": ["birch", "spruce"]}
+    archive = tmp_path / "pack.zip"
+    service = make_service(tmp_path, [rule], templates, output_archive=str(archive))
+    runs = []
+    service.on_complete = runs.append
+    
+    def wait_runs(count):
+        deadline = time.time() + 10
+        while len(runs) < count and time.time() < deadline:
+            time.sleep(0.02)
+        assert len(runs) == count
+    
+    assert service.start_watch()
+    try:
+        wait_runs(1)
+        (tmp_path / "templates" / "{tree}_slab.json").write_text('{"item":"{tree}_step"}', encoding="utf-8")
+        wait_runs(2)
+    finally:
+        service.stop_watch()
+        deadline = time.time() + 10
+        while service.is_watching and time.time() < deadline:
+            time.sleep(0.02)
+    
+    assert runs[1]["unchanged"] == 2
+    with zipfile.ZipFile(archive) as packed:
+        entries = {name.rsplit("/", 1)[-1]: json.loads(packed.read(name)) for name in packed.namelist()}
+    assert entries == {"birch_planks.json": {"item": "birch_planks"}, "spruce_planks.json": {"item": "spruce_planks"},
+                       "birch_slab.json": {"item": "birch_step"}, "spruce_slab.json": {"item": "spruce_step"}}
+
+
+def test_watch_restores_incremental_setting(tmp_path):
+    templates = {"{tree}.json": '{"item":"{tree}_planks"}'}
+    service = make_service(tmp_path, [{"type": "tree", "values": ["birch"]}], templates)
+    service.override_config(explain_every=7)
+    runs = []
+    service.on_complete = lambda stats: runs.append((service.output_writer.incremental, stats["unchanged"]))
+    
+    def wait_runs(count):
+        deadline = time.time() + 10
+        while len(runs) < count and time.time() < deadline:
+            time.sleep(0.02)
+        assert len(runs) == count
+    
+    assert service.start_watch(str(tmp_path / "config.json"))
+    try:
+        wait_runs(1)
+        config = json.loads((tmp_path / "config.json").read_text(encoding="utf-8"))
+        config["replacements"][0]["values"].append("spruce")
+        (tmp_path / "config.json").write_text(json.dumps(config), encoding="utf-8")
+        wait_runs(2)
+    finally:
+        service.stop_watch()
+        deadline = time.time() + 10
+        while service.is_watching and time.time() < deadline:
+            time.sleep(0.02)
+    
+    # 监视期间临时启用增量生成（清单只在内存中），结束后恢复配置中的设置
+    assert runs == [(True, 0), (True, 1)]
+    assert not service.config.incremental
+    assert not service.output_writer.incremental
+    assert sorted(path.name for path in (tmp_path / "output").iterdir()) == ["birch.json", "spruce.json"]
+    # 重新加载配置后命令行覆盖仍然生效
+    assert service.config.explain_every == 7
+
+
+def test_partial_runs_keep_other_archive_entries(tmp_path):
+    templates = {"{tree}.json": '{"item":"{tree}_planks"}'}
+    rule = {"type": "tree", "values": ["a", "b", "c", "d"]}
+    archive = tmp_path / "pack.zip"
+    service = make_service(tmp_path, [rule], templates, output_archive=str(archive))
+    
+    def archived():
+        with zipfile.ZipFile(archive) as packed:
+            return [name.rsplit("/", 1)[-1] for name in packed.namelist()]
+    
+    assert service.run()
+    assert archived() == ["a.json", "b.json", "c.json", "d.json"]
+    # 分片和续跑只重写自己负责的组合，其余条目保留
+    assert service.run(shard=(1, 2))
+    assert archived() == ["a.json", "b.json", "c.json", "d.json"]
+    assert service.run(start_index=3)
+    assert archived() == ["a.json", "b.json", "c.json", "d.json"]
+
+
+def test_process_pool_output_matches_serial(tmp_path):
+    templates = {"{wood}_{color}.json": '{"item":"{modid}{wood}_planks","color":"{color}_{wood}"}',
+                 "{color}_dye.json": '{"dye":"{color}"}'}
+    replacements = [
+        {"type": "wood", "values": [f"mod:wood{i}" for i in range(12)] + ["oak"],
+         "extra": {"*": {"_planks": "_boards"}, "oak": {"oak_": "oaken_"}}},
+        {"type": "color", "values": [f"c{i}" for i in range(9)], "extra": {"c3": {"c3_": "grey_"}}},
+    ]
+    outputs = []
+    for jobs in (1, 2):
+        run_dir = tmp_path / f"jobs{jobs}"
+        run_dir.mkdir()
+        service = make_service(run_dir, replacements, templates, incremental=True)
+        logs = []
+        service._log = lambda message, is_error=False: logs.append(message)
+        reports = []
+        service.on_complete = lambda stats: reports.append(stats["rule_hits"])
+        assert service.run(jobs=jobs)
+        assert any("并行渲染" in line for line in logs) == (jobs > 1)
+        files = {path.name: path.read_bytes() for path in sorted((run_dir / "output").iterdir())}
+        outputs.append((files, reports[0]))
+    
+    # 并行渲染的输出、构建清单和命中报告与串行逐字节一致
+    assert outputs[0] == outputs[1]
+    assert len(outputs[0][0]) == 13 * 9 + 9 + 1
+    assert outputs[0][1]["fired"] == 3
@@ -0,0 +1,52 @@
+from src.core.engine import ReplacementEngine
+from src.core.rule_index import build_rule_index
+from src.model.config import ReplacementRule
+from src.model.template import Template
+
+
+def rules(*data):
+    return [ReplacementRule.create(rule) for rule in data]
+
+
+def test_rules_of_one_type_are_merged_in_order():
+    first, second = rules(
+        {"type": "wood", "values": ["oak", "birch"], "extra": {"*": {"a": "1"}}},
+        {"type": "wood", "values": ["birch", "mod:fir"], "extra": {"*": {"a": "2"}}},
+    )
+    index = build_rule_index([first, second])
+    wood = index["wood"]
+    assert wood.values == ["oak", "birch", "mod:fir"]
+    # 重复列出的值保留首个规则为来源
+    assert wood.sources["birch"] is first and wood.sources["mod:fir"] is second
+    assert wood.extra_for("mod:fir") == {"*": {"a": "2"}}
+    # 未列出的值取首个启用规则的额外替换表
+    assert wood.extra_for("mod:unknown") == {"*": {"a": "1"}}
+    assert wood.rules == [first, second]
+
+
+def test_disabled_rules_are_ignored():
+    index = build_rule_index(rules(
+        {"type": "color", "values": ["red"], "enabled": False},
+        {"type": "wood", "values": ["oak"], "enabled": False},
+        {"type": "wood", "values": ["birch"], "extra": {"*": {"b": "2"}}},
+        {"type": "color", "values": ["blue"]},
+        {"type": "size", "values": ["s"], "enabled": False},
+    ))
+    # 类型顺序为首个启用规则的出现顺序；全部未启用的类型不出现
+    assert list(index) == ["wood", "color"]
+    assert index["wood"].values == ["birch"] and index["color"].values == ["blue"]
+    assert index["wood"].extra_for("oak") == {"*": {"b": "2"}}
+
+
+def test_disabled_type_placeholder_does_not_multiply_combinations(tmp_path):
+    path = tmp_path / "{wood}_{size}.json"
+    path.write_text('{"v": "{wood}{size}"}', encoding="utf-8")
+    engine = ReplacementEngine("minecraft:", rules(
+        {"type": "wood", "values": ["oak", "birch"]},
+        {"type": "wood", "values": ["spruce"]},
+        {"type": "size", "values": ["s", "m"], "enabled": False},
+    ))
+    template = Template(path)
+    assert engine.count_combinations(template) == 3
+    assert list(engine.iter_combinations(template)) == [
+        {"wood": "oak"}, {"wood": "birch"}, {"wood": "spruce"}]
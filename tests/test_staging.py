@@ -0,0 +1,44 @@
+import os
+
+from src.dao import staging as staging_module
+from src.dao.staging import StagingDirectory
+
+
+def test_interrupted_commit_keeps_previous_output(tmp_path, monkeypatch):
+    target = tmp_path / "output"
+    target.mkdir()
+    (target / "a.json").write_text("old", encoding="utf-8")
+    
+    staging = StagingDirectory(target)
+    staged = staging.stage()
+    (staged / "a.json").unlink()
+    (staged / "a.json").write_text("new", encoding="utf-8")
+    
+    # 在 目标→备份 与 暂存→目标 两次重命名之间中断
+    rename = os.rename
+    calls = []
+    
+    def interrupted(src, dst):
+        calls.append(src)
+        if len(calls) == 2:
+            raise KeyboardInterrupt
+        rename(src, dst)
+    
+    monkeypatch.setattr(staging_module.os, "rename", interrupted)
+    try:
+        staging.commit([staged / "a.json"])
+    except KeyboardInterrupt:
+        pass
+    monkeypatch.setattr(staging_module.os, "rename", rename)
+    assert not target.exists() and staging.backup.is_dir()
+    
+    # 下次运行先恢复备份，暂存目录基于旧输出
+    staging = StagingDirectory(target)
+    staged = staging.stage()
+    assert (target / "a.json").read_text(encoding="utf-8") == "old"
+    assert (staged / "a.json").read_text(encoding="utf-8") == "old"
+    (staged / "b.json").write_text("b", encoding="utf-8")
+    staging.commit([staged / "b.json"])
+    assert sorted(path.name for path in target.iterdir()) == ["a.json", "b.json"]
+    assert not staging.backup.exists()
+
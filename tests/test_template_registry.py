@@ -0,0 +1,53 @@
+import os
+
+from src.dao.template_registry import TemplateRegistry
+
+
+def write(path, text, mtime_ns):
+    path.write_text(text, encoding="utf-8")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_unchanged_template_is_reused(tmp_path):
+    path = tmp_path / "{tree}.json"
+    write(path, '{"v": "{tree}"}', 1_000_000_000)
+    registry = TemplateRegistry()
+    first = registry.get(path)
+    # 相对路径与绝对路径指向同一条目
+    assert registry.get(tmp_path / "." / "{tree}.json") is first
+    assert registry.stats == {"reads": 1, "reuses": 1}
+    assert first.placeholders == ["tree"]
+
+
+def test_changed_signature_reloads_template(tmp_path):
+    path = tmp_path / "t.json"
+    write(path, '{"v": "{a}"}', 1_000_000_000)
+    registry = TemplateRegistry()
+    first = registry.get(path)
+    parsed = registry.get_parsed(path)
+    assert parsed.content == {"v": "{a}"} and registry.get_parsed(path) is parsed
+    
+    # 大小不变、只有修改时间变化时同样重新读取
+    write(path, '{"v": "{b}"}', 2_000_000_000)
+    second = registry.get(path)
+    assert second is not first and second.placeholders == ["b"]
+    assert registry.get_parsed(path).content == {"v": "{b}"}
+    
+    # 修改时间不变、大小变化
+    write(path, '{"v": "{bc}"}', 2_000_000_000)
+    assert registry.get(path).placeholders == ["bc"]
+    assert registry.stats["reads"] == 3
+
+
+def test_invalidate_forces_reload(tmp_path):
+    path = tmp_path / "t.json"
+    write(path, '{"v": "{a}"}', 1_000_000_000)
+    registry = TemplateRegistry()
+    first = registry.get(path)
+    # 签名相同的修改（如粗粒度时间戳的文件系统）只能通过 invalidate 发现
+    write(path, '{"v": "{b}"}', 1_000_000_000)
+    assert registry.get(path) is first
+    registry.invalidate(path)
+    assert registry.get(path).placeholders == ["b"]
+    registry.invalidate()
+    assert registry.get(path) is not first and registry.stats["reads"] == 3